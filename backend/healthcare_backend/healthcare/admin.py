@@ -2,7 +2,8 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from .models import (
     User, Doctor, Department, Appointment, MedicalRecord,
-    FamilyMember, DoctorAvailability, Admin as AdminModel, QueueStatus,DoctorReview
+    FamilyMember, DoctorAvailability, Admin as AdminModel, QueueStatus,DoctorReview,
+    RequestProfile, ArchivedAppointment
 )
 
 @admin.register(User)
@@ -65,6 +66,14 @@ class AppointmentAdmin(admin.ModelAdmin):
     date_hierarchy = 'appointment_date'
 
 
+@admin.register(ArchivedAppointment)
+class ArchivedAppointmentAdmin(admin.ModelAdmin):
+    list_display = ['token_number', 'patient', 'doctor', 'appointment_date', 'status', 'archived_at']
+    list_filter = ['status', 'department']
+    search_fields = ['token_number', 'patient__full_name', 'doctor__user__full_name']
+    date_hierarchy = 'appointment_date'
+
+
 @admin.register(MedicalRecord)
 class MedicalRecordAdmin(admin.ModelAdmin):
     list_display = ['patient', 'doctor', 'visit_date', 'diagnosis']
@@ -72,6 +81,13 @@ class MedicalRecordAdmin(admin.ModelAdmin):
     search_fields = ['patient__full_name', 'doctor__user__full_name', 'diagnosis']
 
 
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ['endpoint', 'method', 'status_code', 'user_role', 'duration_ms', 'query_count', 'created_at']
+    list_filter = ['endpoint', 'trigger', 'user_role']
+    exclude = ['stats']
+
+
 # Register remaining models
 admin.site.register(DoctorAvailability)
 admin.site.register(FamilyMember)
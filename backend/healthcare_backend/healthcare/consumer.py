@@ -1,12 +1,158 @@
+import asyncio
 import json
+import time
+import weakref
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from .models import Doctor, Appointment, QueueStatus
+from django.conf import settings
+from .models import Doctor, Appointment, QueueStatus, Notification
 from django.utils import timezone
 from .models import User # Make sure User is imported if you plan to auth
+from .utils.metrics import WS_CONNECTIONS, WS_MESSAGES_SENT, WS_SEND_OVERFLOWS, WS_EVICTIONS
+from .utils.loop_lag import ensure_loop_monitor
+from .utils.board import boards
+from .utils.presence import presence
+from .utils.queue_feed import (
+    department_group, appointment_group, doctor_snapshot, events_since, current_seq,
+    notification_payload
+)
+from .utils import compact
+
+RESYNC_NOTIFICATIONS = 20
+RESYNC = object()
+
+# Every accepted connection of this process (for diagnostics and load tests)
+open_connections = weakref.WeakSet()
+
+
+class InstrumentedConsumer(AsyncWebsocketConsumer):
+    """
+    Counts open connections per group and frames sent, and puts a bounded
+    outbound queue in front of the socket. Frames are written by one writer
+    task; when the queue fills up, the pending frames are dropped and
+    replaced by a single resync() (the latest snapshot supersedes them).
+    A connection that keeps overflowing, or whose write doesn't complete
+    within WS_SEND_TIMEOUT, is closed with code 4008.
+    """
+    metrics_label = ''
+    _counted_group = None
+    _outbox = None
+    _writer = None
+    _resync_pending = False
+    _present = False
+
+    async def accept(self, subprotocol=None):
+        await super().accept(subprotocol)
+        self._counted_group = self.room_group_name
+        WS_CONNECTIONS.inc(consumer=self.metrics_label, group=self._counted_group)
+        ensure_loop_monitor()
+        self._overflows = []
+        self._outbox = asyncio.Queue(maxsize=settings.WS_SEND_QUEUE_SIZE)
+        self._writer = asyncio.ensure_future(self._write_frames())
+        open_connections.add(self)
+
+    async def websocket_disconnect(self, message):
+        if self._writer is not None:
+            self._writer.cancel()
+            self._writer = None
+        if self._counted_group is not None:
+            WS_CONNECTIONS.dec(consumer=self.metrics_label, group=self._counted_group)
+            self._counted_group = None
+        await super().websocket_disconnect(message)
+
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        if self._outbox is None or close:
+            await self._write(text_data, bytes_data, close)
+            return
+        if self._resync_pending:
+            return  # superseded by the resync already queued
+        try:
+            self._outbox.put_nowait((text_data, bytes_data))
+        except asyncio.QueueFull:
+            await self._overflow()
+
+    async def resync(self):
+        """Send whatever replaces the dropped frames; consumers override this."""
+        await self.evict('overflow')
+
+    async def evict(self, reason):
+        WS_EVICTIONS.inc(consumer=self.metrics_label, reason=reason)
+        self._outbox = None
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        self._writer = None
+        await self.close(code=4008)
+
+    async def _overflow(self):
+        WS_SEND_OVERFLOWS.inc(consumer=self.metrics_label)
+        now = time.monotonic()
+        window = settings.WS_EVICT_WINDOW
+        self._overflows = [t for t in self._overflows if now - t < window] + [now]
+        if len(self._overflows) >= settings.WS_EVICT_OVERFLOWS:
+            await self.evict('slow')
+            return
+        while not self._outbox.empty():
+            self._outbox.get_nowait()
+        self._resync_pending = True
+        self._outbox.put_nowait(RESYNC)
+
+    async def _write_frames(self):
+        while self._outbox is not None:
+            frame = await self._outbox.get()
+            if frame is RESYNC:
+                self._resync_pending = False
+                await self.resync()
+                continue
+            try:
+                await asyncio.wait_for(self._write(*frame), settings.WS_SEND_TIMEOUT)
+            except asyncio.TimeoutError:
+                await self.evict('timeout')
+                return
 
-class QueueConsumer(AsyncWebsocketConsumer):
-    """WebSocket consumer for live queue updates"""
+    async def _write(self, text_data=None, bytes_data=None, close=False):
+        await super().send(text_data=text_data, bytes_data=bytes_data, close=close)
+        if text_data is not None or bytes_data is not None:
+            WS_MESSAGES_SENT.inc(consumer=self.metrics_label)
+
+    def outbox_size(self):
+        return self._outbox.qsize() if self._outbox is not None else 0
+
+    async def join_presence(self):
+        """Register as a subscriber of room_group_name so broadcasts to it aren't skipped"""
+        await sync_to_async(presence.join, thread_sensitive=False)(self.room_group_name)
+        self._present = True
+
+    async def leave_presence(self):
+        if self._present:
+            self._present = False
+            await sync_to_async(presence.leave, thread_sensitive=False)(self.room_group_name)
+
+
+def _last_seq(scope):
+    """Sequence number a reconnecting client already has (?last_seq=N), if any"""
+    values = parse_qs(scope.get('query_string', b'').decode()).get('last_seq')
+    if values and values[0].isdigit():
+        return int(values[0])
+    return None
+
+
+class QueueConsumer(InstrumentedConsumer):
+    """
+    WebSocket consumer for live queue updates. Reconnect with ?last_seq=N to
+    get only the deltas missed since N (from the feed's ring buffer); the
+    snapshot is sent only when the gap is too large. Both come from the
+    cache, so a reconnect storm doesn't reach the database. Compact clients
+    always resume from a snapshot: their deltas are encoded against the token
+    prefix of the client's last snapshot, which this connection never saw.
+    """
+    metrics_label = 'queue'
+
+    compact = False
+    sent_seq = 0
+    token_prefix = ''
 
     async def connect(self):
         self.doctor_id = self.scope['url_route']['kwargs']['doctor_id']
@@ -17,11 +163,18 @@ class QueueConsumer(AsyncWebsocketConsumer):
             self.room_group_name,
             self.channel_name
         )
-        await self.accept()
+        await self.join_presence()
 
-        # Send initial queue status
-        queue_data = await self.get_queue_status()
-        await self.send(text_data=json.dumps(queue_data))
+        # Opt-in binary protocol: snapshot + sequence-numbered deltas (utils/compact.py)
+        if compact.SUBPROTOCOL in self.scope.get('subprotocols', ()) and self.doctor_id.isdigit():
+            self.compact = True
+            await self.accept(compact.SUBPROTOCOL)
+        else:
+            await self.accept()
+
+        last_seq = None if self.compact else _last_seq(self.scope)
+        if last_seq is None or not await self.catch_up(last_seq):
+            await self.send_snapshot()
 
     async def disconnect(self, close_code):
         # Leave room group
@@ -29,80 +182,200 @@ class QueueConsumer(AsyncWebsocketConsumer):
             self.room_group_name,
             self.channel_name
         )
+        await self.leave_presence()
 
-    async def receive(self, text_data):
+    async def receive(self, text_data=None, bytes_data=None):
         """Handle incoming messages (e.g., manual refresh request)"""
-        queue_data = await self.get_queue_status()
-        await self.send(text_data=json.dumps(queue_data))
+        await self.send_snapshot()
 
-    async def queue_update(self, event):
-        """Send message to WebSocket when a queue_update is received"""
-        await self.send(text_data=json.dumps(event['data']))
+    async def resync(self):
+        """Dropped deltas are superseded by the current snapshot"""
+        await self.send_snapshot()
 
-    @database_sync_to_async
-    def get_queue_status(self):
-        """Fetches the current queue status from the database"""
-        try:
-            doctor = Doctor.objects.get(id=self.doctor_id)
-            today = timezone.now().date()
-
-            # Get today's appointments that are in the queue
-            appointments = Appointment.objects.filter(
-                doctor=doctor,
-                appointment_date=today,
-                status__in=['scheduled', 'confirmed', 'in_progress']
-            ).order_by('queue_position')
-
-            # Get the single QueueStatus object for the day
-            queue_status = QueueStatus.objects.filter(
-                doctor=doctor,
-                appointment_date=today
-            ).first()
-
-            return {
-                'type': 'queue_status',
-                'doctor_id': doctor.id,
-                'doctor_name': doctor.full_name,
-                'current_token': queue_status.current_token if queue_status else None,
-                'total_tokens': queue_status.total_tokens if queue_status else 0,
-                'completed_tokens': queue_status.completed_tokens if queue_status else 0,
-                'queue': [
-                    {
-                        'token_number': apt.token_number,
-                        'patient_name': apt.patient.full_name,
-                        'status': apt.status,
-                        'queue_position': apt.queue_position,
-                        'estimated_time': str(apt.estimated_time) if apt.estimated_time else None,
-                    }
-                    for apt in appointments
-                ]
-            }
-        except Doctor.DoesNotExist:
-            return {'type': 'error', 'message': 'Doctor not found'}
-
-
-class AppointmentConsumer(AsyncWebsocketConsumer):
-    """WebSocket consumer for patient-specific appointment updates"""
+    async def feed_event(self, event):
+        """Forward a live-feed delta (see utils/queue_feed.py)"""
+        if event['seq'] <= self.sent_seq:
+            return
+        if event['event'] == 'queue_delta' and event['seq'] == self.sent_seq + 1:
+            await self.send_event(event['seq'], event['event'], event['data'])
+        elif event['event'] != 'queue_delta' or not await self.catch_up(self.sent_seq):
+            # Reset, or missed more than the buffer holds
+            await self.send_snapshot()
+
+    async def catch_up(self, last_seq):
+        """Replay buffered events after last_seq; False if they are gone."""
+        backlog = await sync_to_async(events_since)(self.room_group_name, last_seq)
+        if backlog is None:
+            return False
+        self.sent_seq = last_seq
+        for ev in backlog:
+            await self.send_event(ev['seq'], ev['event'], ev['data'])
+        return True
+
+    async def send_event(self, seq, event, data):
+        self.sent_seq = seq
+        if self.compact:
+            await self.send(bytes_data=compact.encode_delta(seq, data, self.token_prefix))
+        else:
+            await self.send(text_data=json.dumps({'type': event, 'seq': seq, **data}))
+
+    async def send_snapshot(self):
+        snapshot = await self.get_snapshot()
+        if snapshot is None:
+            if self.compact:
+                await self.close(code=4404)
+            else:
+                await self.send(text_data=json.dumps({'type': 'error', 'message': 'Doctor not found'}))
+            return
+        self.sent_seq = snapshot['seq']
+        if self.compact:
+            self.token_prefix = compact.token_prefix(snapshot)
+            await self.send(bytes_data=compact.encode_snapshot(snapshot))
+        else:
+            await self.send(text_data=json.dumps(self.queue_status(snapshot)))
+
+    async def get_snapshot(self):
+        if not self.doctor_id.isdigit():
+            return None
+        return await database_sync_to_async(doctor_snapshot)(int(self.doctor_id))
+
+    @staticmethod
+    def queue_status(snapshot):
+        """The feed snapshot in the JSON shape this consumer has always sent"""
+        return {
+            'type': 'queue_status',
+            'seq': snapshot['seq'],
+            'doctor_id': snapshot['doctor_id'],
+            'doctor_name': snapshot['doctor_name'],
+            'current_token': snapshot['current_token'] or None,
+            'total_tokens': snapshot['total_tokens'],
+            'completed_tokens': snapshot['completed_tokens'],
+            'queue': [
+                {
+                    'token_number': e['token_number'],
+                    'patient_name': e['patient_name'],
+                    'status': e['status'],
+                    'queue_position': e['queue_position'],
+                    'estimated_time': e['estimated_time'],
+                }
+                for e in snapshot['queue']
+            ]
+        }
+
+
+class AppointmentConsumer(InstrumentedConsumer):
+    """
+    WebSocket consumer for patient-specific appointment updates. Connect
+    with the user's access token (?token=<access>); the socket is closed
+    with 4401 without one and 4403 for another user's id. Every push
+    is sequence-numbered and buffered; reconnect with ?last_seq=N to receive
+    what was sent while offline, or the latest unread notifications when the
+    gap is larger than the buffer.
+    """
+    metrics_label = 'appointments'
+    sent_seq = 0
 
     async def connect(self):
         self.user_id = self.scope['url_route']['kwargs']['user_id']
-        self.room_group_name = f'appointments_{self.user_id}'
+        self.room_group_name = appointment_group(self.user_id)
 
-        # Note: In a real app, you'd check `self.scope['user']` here
-        # to ensure the user is authenticated and matches `user_id`.
+        # scope['user'] comes from the access token (utils/ws_auth.py); a
+        # socket may only follow the appointments of the token's own user
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close(code=4401)
+            return
+        if str(user.id) != self.user_id:
+            await self.close(code=4403)
+            return
 
         await self.channel_layer.group_add(
             self.room_group_name,
             self.channel_name
         )
+        await self.join_presence()
         await self.accept()
 
+        last_seq = _last_seq(self.scope)
+        if last_seq is None:
+            # Tell the client where the stream is so it can resume from here later
+            self.sent_seq = await sync_to_async(current_seq)(self.room_group_name)
+            await self.send(text_data=json.dumps({'type': 'sync', 'seq': self.sent_seq}))
+        elif not await self.catch_up(last_seq):
+            await self.send_snapshot()
+
     async def disconnect(self, close_code):
         await self.channel_layer.group_discard(
             self.room_group_name,
             self.channel_name
         )
+        await self.leave_presence()
+
+    async def resync(self):
+        """Dropped notifications are replaced by the unread list"""
+        await self.send_snapshot()
+
+    async def feed_event(self, event):
+        """Forward a buffered push (see utils/queue_feed.py)"""
+        if event['seq'] <= self.sent_seq:
+            return
+        if event['seq'] == self.sent_seq + 1 or not await self.catch_up(self.sent_seq):
+            await self.send_event(event['seq'], event['event'], event['data'])
+
+    async def catch_up(self, last_seq):
+        backlog = await sync_to_async(events_since)(self.room_group_name, last_seq)
+        if backlog is None:
+            return False
+        self.sent_seq = last_seq
+        for ev in backlog:
+            await self.send_event(ev['seq'], ev['event'], ev['data'])
+        return True
+
+    async def send_event(self, seq, event, data):
+        self.sent_seq = seq
+        await self.send(text_data=json.dumps({'type': event, 'seq': seq, **data}))
+
+    async def send_snapshot(self):
+        seq = await sync_to_async(current_seq)(self.room_group_name)
+        unread = await self.get_unread_notifications()
+        self.sent_seq = seq
+        await self.send(text_data=json.dumps({'type': 'snapshot', 'seq': seq, 'notifications': unread}))
+
+    @database_sync_to_async
+    def get_unread_notifications(self):
+        if not self.user_id.isdigit():
+            return []
+        return [
+            notification_payload(n)
+            for n in Notification.objects.filter(user_id=self.user_id, is_read=False)
+            .select_related('appointment', 'archived_appointment').order_by('-created_at')[:RESYNC_NOTIFICATIONS]
+        ]
+
+
+class DepartmentBoardConsumer(InstrumentedConsumer):
+    """Display-board feed for a department's waiting area: every doctor's current and next tokens"""
+    metrics_label = 'board'
+    _attached = False
+
+    async def connect(self):
+        self.department_id = int(self.scope['url_route']['kwargs']['department_id'])
+        self.room_group_name = department_group(self.department_id)
+
+        await self.accept()
+        self.board = await boards.attach(self.department_id, self)
+        self._attached = True
+        await self.send_board(self.board.as_dict())
+
+    async def disconnect(self, close_code):
+        if self._attached:
+            await boards.detach(self.department_id, self)
+
+    async def resync(self):
+        """Repaint from the in-memory board instead of the dropped rows"""
+        await self.send_board(self.board.as_dict())
+
+    async def send_board(self, board):
+        await self.send(text_data=json.dumps({'type': 'board_snapshot', **board}, separators=(',', ':')))
 
-    async def appointment_update(self, event):
-        """Send message to WebSocket when an appointment_update is received"""
-        await self.send(text_data=json.dumps(event['data']))
+    async def send_board_row(self, seq, row):
+        await self.send(text_data=json.dumps({'type': 'board_row', 'seq': seq, **row}, separators=(',', ':')))
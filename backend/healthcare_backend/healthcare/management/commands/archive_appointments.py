@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from healthcare.utils.archiver import archive_appointments
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Move finished appointments older than the archive horizon into the history table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horizon-days', type=int, help='Defaults to APPOINTMENT_ARCHIVE_HORIZON_DAYS')
+        parser.add_argument('--batch-size', type=int, help='Defaults to APPOINTMENT_ARCHIVE_BATCH_SIZE')
+        parser.add_argument('--max-batches', type=int)
+        parser.add_argument('--pause', type=float, default=0.05,
+                            help='Seconds to sleep between batches to let other writers in')
+
+    def handle(self, *args, **options):
+        logger.info("Running appointment archiver...")
+        result = archive_appointments(
+            horizon_days=options['horizon_days'],
+            batch_size=options['batch_size'],
+            max_batches=options['max_batches'],
+            pause=options['pause'],
+        )
+        logger.info(f"Archiving complete: {result}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {result['moved']} appointments in {result['batches']} batches "
+            f"(older than {result['cutoff']})."
+        ))
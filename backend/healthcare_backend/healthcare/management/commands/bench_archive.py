@@ -0,0 +1,82 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from healthcare.models import Appointment, ArchivedAppointment
+from healthcare.utils.archiver import archive_appointments, appointment_history
+from healthcare.utils.benchmarking import require_benchmark_database, time_call, print_table
+from healthcare.utils.dataset import DATASET_EMAIL_DOMAIN, generate_dataset, flush_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        "Regenerate the dataset with more appointment history each round and show "
+        "hot-table query latency before and after archiving it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, default=5)
+        parser.add_argument('--rows-per-round', type=int, default=500_000,
+                            help='Appointments added to the generated dataset each round')
+        parser.add_argument('--doctors', type=int, default=200)
+        parser.add_argument('--patients', type=int, default=50_000)
+        parser.add_argument('--months', type=int, default=24, help='History to spread appointments over')
+        parser.add_argument('--horizon-days', type=int, default=90)
+        parser.add_argument('--repeat', type=int, default=30)
+        parser.add_argument('--json', dest='json_path', help='Also write results to this file')
+        parser.add_argument('--force', action='store_true',
+                            help="Run even though BENCHMARK_DATABASE is off (archives every department's history)")
+
+    def handle(self, *args, **options):
+        require_benchmark_database('seed and archive appointments in', force=options['force'])
+        results = []
+        for round_no in range(1, options['rounds'] + 1):
+            # The same seed each round, so every round is the same hospital with more history
+            flush_dataset()
+            generate_dataset(
+                patients=options['patients'], doctors=options['doctors'], months=options['months'],
+                appointments=round_no * options['rows_per_round'],
+            )
+            generated = Appointment.objects.filter(doctor__user__email__endswith=f'@{DATASET_EMAIL_DOMAIN}')
+            doctor_id, patient_id = generated.values_list('doctor_id', 'patient_id').first()
+
+            grown = self._measure(doctor_id, patient_id, options['repeat'])
+            archive_appointments(horizon_days=options['horizon_days'])
+            archived = self._measure(doctor_id, patient_id, options['repeat'])
+
+            history = time_call(
+                lambda: list(appointment_history(patient_id=patient_id)[:20]),
+                repeat=options['repeat']
+            )
+            row = {
+                'round': round_no,
+                'hot rows': generated.count(),
+                'archived rows': ArchivedAppointment.objects.count(),
+                **{f'{k} unarchived': v for k, v in grown.items()},
+                **{f'{k} archived': v for k, v in archived.items()},
+                'history p50': history['p50_ms'],
+            }
+            results.append(row)
+            self.stdout.write(f"round {round_no} done")
+
+        self.stdout.write('')
+        print_table(self.stdout, results, list(results[0]))
+        if options['json_path']:
+            with open(options['json_path'], 'w') as fh:
+                json.dump(results, fh, indent=2)
+
+    def _measure(self, doctor_id, patient_id, repeat):
+        """p50 (ms) of the hot queries that scale with the appointments table."""
+        today = timezone.localdate()
+        cases = {
+            'doctor-day': lambda: list(
+                Appointment.objects.filter(doctor_id=doctor_id, appointment_date=today)
+                .order_by('queue_position')
+            ),
+            'admin list': lambda: (
+                Appointment.objects.count(), list(Appointment.objects.all()[:20])
+            ),
+            'patient count': lambda: Appointment.objects.filter(patient_id=patient_id).count(),
+        }
+        return {name: time_call(fn, repeat=repeat)['p50_ms'] for name, fn in cases.items()}
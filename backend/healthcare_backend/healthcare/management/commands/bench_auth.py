@@ -0,0 +1,79 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from healthcare.models import User, Appointment, Doctor
+from healthcare.utils.benchmarking import time_call, count_queries, print_table
+from healthcare.utils.dataset import DATASET_EMAIL_DOMAIN, generate_dataset
+from healthcare.utils.jwt_claims import ClaimsRefreshToken
+
+# (role, path) of the endpoints every dashboard hits
+ENDPOINTS = [
+    ('doctor', '/api/doctor/appointments/'),
+    ('doctor', '/api/doctor/history/'),
+    ('doctor', '/api/doctor/dashboard/'),
+    ('doctor', '/api/appointments/'),
+    ('patient', '/api/appointments/'),
+    ('patient', '/api/notifications/'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Count queries and time the doctor and appointment endpoints with "
+        "request.user loaded from the database versus built from JWT claims."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000,
+                            help='Appointments of the dataset to generate when none exists (see generate_dataset)')
+        parser.add_argument('--repeat', type=int, default=30)
+        parser.add_argument('--json', dest='json_path', help='Also write results to this file')
+
+    def handle(self, *args, **options):
+        if not User.objects.filter(email__endswith=f'@{DATASET_EMAIL_DOMAIN}').exists():
+            self.stdout.write("No generated dataset, generating one...")
+            generate_dataset(patients=500, doctors=20, appointments=options['rows'], stdout=self.stdout)
+
+        sample = Appointment.objects.filter(doctor__user__email__endswith=f'@{DATASET_EMAIL_DOMAIN}').values(
+            'doctor_id', 'patient_id'
+        ).first()
+        users = {
+            'doctor': Doctor.objects.select_related('user').get(id=sample['doctor_id']).user,
+            'patient': Appointment.objects.filter(patient_id=sample['patient_id']).first().patient,
+        }
+        clients = {}
+        for role, user in users.items():
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {ClaimsRefreshToken.for_user(user).access_token}')
+            clients[role] = client
+
+        rows, results = [], {}
+        for role, path in ENDPOINTS:
+            client = clients[role]
+            modes = {}
+            for mode, claims in (('user row', False), ('claims', True)):
+                with override_settings(JWT_CLAIMS_AUTH=claims):
+                    with count_queries() as queries:
+                        response = client.get(path)
+                    timing = time_call(lambda: client.get(path), repeat=options['repeat'])
+                modes[mode] = {'status': response.status_code, 'queries': len(queries), **timing}
+            results[f'{role} {path}'] = modes
+            before, after = modes['user row'], modes['claims']
+            rows.append({
+                'endpoint': path,
+                'as': role,
+                'status': after['status'],
+                'queries (user row)': before['queries'],
+                'queries (claims)': after['queries'],
+                'saved': before['queries'] - after['queries'],
+                'p50 user row': before['p50_ms'],
+                'p50 claims': after['p50_ms'],
+            })
+
+        print_table(self.stdout, rows, list(rows[0]))
+        if options['json_path']:
+            with open(options['json_path'], 'w') as fh:
+                json.dump(results, fh, indent=2)
@@ -0,0 +1,64 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from healthcare.utils.benchmarking import percentile, print_table
+from healthcare.utils.cache import cache, versioned_key
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure per-lookup latency of the two-tier cache: tier-1 (in-process) "
+        "hit, tier-2 (Redis) hit and full miss."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--samples', type=int, default=30)
+        parser.add_argument('--ops', type=int, default=2000, help='Lookups timed per sample')
+        parser.add_argument('--json', dest='json_path', help='Also write results to this file')
+
+    def handle(self, *args, **options):
+        ops = options['ops']
+        # A realistic payload: the cached doctor list entry shape
+        payload = ([{'id': i, 'name': f'Dr. {i}', 'specialty': 'General'} for i in range(50)], time.time() + 300)
+        keys = [versioned_key('bench', f'k{i}') for i in range(ops)]
+        for key in keys:
+            cache.backend.set(key, payload, 600)
+
+        def tier1():
+            for key in keys:
+                cache.get(key)
+
+        def tier2():
+            cache.local.delete(*keys)
+            for key in keys:
+                cache.get(key)
+
+        def miss():
+            for key in keys:
+                cache.get(f'{key}:missing')
+
+        rows = []
+        for name, fn in (('tier-1 hit', tier1), ('tier-2 hit', tier2), ('miss', miss)):
+            tier1()  # warm both tiers
+            samples = []
+            for _ in range(options['samples']):
+                start = time.perf_counter()
+                fn()
+                samples.append((time.perf_counter() - start) / ops * 1e6)
+            samples.sort()
+            rows.append({
+                'case': name,
+                'p50_us': round(percentile(samples, 50), 2),
+                'p95_us': round(percentile(samples, 95), 2),
+                'p99_us': round(percentile(samples, 99), 2),
+                'mean_us': round(sum(samples) / len(samples), 2),
+            })
+
+        cache.backend.delete_many(keys)
+        cache.local.delete(*keys)
+        print_table(self.stdout, rows, list(rows[0]))
+        if options['json_path']:
+            with open(options['json_path'], 'w') as fh:
+                json.dump(rows, fh, indent=2)
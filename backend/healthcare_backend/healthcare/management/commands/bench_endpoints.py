@@ -0,0 +1,222 @@
+import json
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from healthcare.models import User, Doctor, Appointment
+from healthcare.utils.benchmarking import (
+    time_call, count_queries, measure_allocations, compare_to_baseline, print_table
+)
+from healthcare.utils.dataset import DATASET_EMAIL_DOMAIN, DATASET_PASSWORD, generate_dataset
+from healthcare.utils.jwt_claims import ClaimsRefreshToken
+
+BENCH_REASON = 'Benchmark run'
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive the key API flows through the DRF test client against a generated dataset, "
+        "record p50/p95/p99 latency, query counts and allocations, and fail on regressions "
+        "against a stored baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patients', type=int, default=5000,
+                            help='Dataset to generate when none exists (see generate_dataset)')
+        parser.add_argument('--doctors', type=int, default=60)
+        parser.add_argument('--appointments', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--only', nargs='+', metavar='FLOW', help='Run just these flows')
+        parser.add_argument('--baseline', default=getattr(
+            settings, 'BENCH_BASELINE_PATH', os.path.join(settings.BASE_DIR, 'bench_baseline.json')
+        ))
+        parser.add_argument('--update-baseline', action='store_true',
+                            help='Write this run as the new baseline instead of comparing')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed p95/allocation growth over the baseline (fraction)')
+        parser.add_argument('--json', dest='json_path', help='Also write results to this file')
+
+    def handle(self, *args, **options):
+        if not User.objects.filter(email__endswith=f'@{DATASET_EMAIL_DOMAIN}').exists():
+            self.stdout.write("No generated dataset, generating one...")
+            generate_dataset(
+                patients=options['patients'], doctors=options['doctors'],
+                appointments=options['appointments'], stdout=self.stdout,
+            )
+
+        flows = self._flows(options['repeat'] + options['warmup'] + 2)
+        if options['only']:
+            unknown = set(options['only']) - set(flows)
+            if unknown:
+                raise CommandError(f"Unknown flows: {', '.join(sorted(unknown))}. Known: {', '.join(flows)}")
+            flows = {name: flows[name] for name in options['only']}
+
+        results = {}
+        try:
+            for name, (call, setup) in flows.items():
+                timing = time_call(call, repeat=options['repeat'], warmup=options['warmup'], setup=setup)
+                arg = setup(options['repeat'] + options['warmup']) if setup else None
+                with count_queries() as queries:
+                    response = call(arg) if setup else call()
+                arg = setup(options['repeat'] + options['warmup'] + 1) if setup else None
+                allocations = measure_allocations(lambda: call(arg) if setup else call())
+                results[name] = {
+                    'status': response.status_code, **timing, 'queries': len(queries), **allocations,
+                }
+        finally:
+            deleted, _ = Appointment.objects.filter(reason=BENCH_REASON).delete()
+            self.stdout.write(f"Cleaned up {deleted} benchmark rows")
+
+        meta = self._meta()
+        failed = [name for name, r in results.items() if not 200 <= r['status'] < 300]
+        baseline = self._load_baseline(options['baseline'])
+        regressions = {}
+        if baseline and not options['update_baseline']:
+            if baseline['meta'] != meta:
+                self.stdout.write(self.style.WARNING(
+                    f"Baseline was recorded against {baseline['meta']}, this run is {meta}"
+                ))
+            regressions = compare_to_baseline(results, baseline['flows'], tolerance=options['tolerance'])
+
+        rows = []
+        for name, r in results.items():
+            before = (baseline or {}).get('flows', {}).get(name)
+            rows.append({
+                'flow': name,
+                'status': r['status'],
+                'p50 ms': r['p50_ms'],
+                'p95 ms': r['p95_ms'],
+                'p99 ms': r['p99_ms'],
+                'queries': r['queries'],
+                'alloc KiB': r['alloc_peak_kb'],
+                'base p95': before['p95_ms'] if before else '-',
+                'base queries': before['queries'] if before else '-',
+                'verdict': 'REGRESSED' if name in regressions else ('new' if baseline and not before else 'ok'),
+            })
+        print_table(self.stdout, rows, list(rows[0]))
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as fh:
+                json.dump({'meta': meta, 'flows': results, 'regressions': regressions}, fh, indent=2)
+        if failed:
+            raise CommandError(f"Flows returned errors: {', '.join(failed)}")
+        if options['update_baseline'] or baseline is None:
+            with open(options['baseline'], 'w') as fh:
+                json.dump({'meta': meta, 'flows': results}, fh, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {options['baseline']}"))
+            return
+        if regressions:
+            for name, reasons in regressions.items():
+                self.stderr.write(f"  {name}: {'; '.join(reasons)}")
+            raise CommandError(f"{len(regressions)} flow(s) regressed against {options['baseline']}")
+        self.stdout.write(self.style.SUCCESS(f"No regressions against {options['baseline']}"))
+
+    # ------------------------------------------------------------
+
+    def _meta(self):
+        return {
+            'database': connection.vendor,
+            'users': User.objects.count(),
+            'appointments': Appointment.objects.count(),
+        }
+
+    def _load_baseline(self, path):
+        try:
+            with open(path) as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            return None
+
+    def _client(self, user=None):
+        client = APIClient()
+        if user is not None:
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {ClaimsRefreshToken.for_user(user).access_token}')
+        return client
+
+    def _flows(self, bookings):
+        """{name: (call, setup)}; call(setup(i)) when setup is given, else call()."""
+        today = timezone.localdate()
+        generated = Doctor.objects.filter(user__email__endswith=f'@{DATASET_EMAIL_DOMAIN}')
+        busiest = (
+            Appointment.objects.filter(doctor__in=generated, appointment_date=today)
+            .values('doctor').annotate(n=Count('id')).order_by('-n').first()
+        )
+        doctor = (
+            Doctor.objects.select_related('user').get(id=busiest['doctor'])
+            if busiest else generated.select_related('user').first()
+        )
+        patient = User.objects.get(id=(
+            Appointment.objects.filter(doctor=doctor).values('patient')
+            .annotate(n=Count('id')).order_by('-n').first()['patient']
+        ))
+        admin, created = User.objects.get_or_create(
+            email=f'bench-admin@{DATASET_EMAIL_DOMAIN}',
+            defaults={'full_name': 'Benchmark Admin', 'phone': '+400000000001', 'role': 'admin'},
+        )
+        if created:
+            admin.set_password(DATASET_PASSWORD)
+            admin.save()
+        anon, as_patient, as_doctor, as_admin = (
+            self._client(), self._client(patient), self._client(doctor.user), self._client(admin)
+        )
+
+        # Free (date, slot) pairs for booking: working days past the generated horizon
+        hours = {a.day_of_week: (a.start_time, a.end_time) for a in doctor.availabilities.all()}
+        slots = []
+        day = today + timedelta(days=30)
+        while len(slots) < bookings:
+            window = hours.get(day.strftime('%A').lower())
+            if window:
+                minute, end = window[0].hour * 60 + window[0].minute, window[1].hour * 60 + window[1].minute
+                slots += [(day, f'{m // 60:02d}:{m % 60:02d}') for m in range(minute, end, 10)]
+            day += timedelta(days=1)
+
+        def book(i):
+            return {
+                'doctor': doctor.id, 'department': doctor.department_id,
+                'appointment_date': slots[i][0].isoformat(), 'time_slot': slots[i][1],
+                'reason': BENCH_REASON, 'booking_type': 'doctor',
+            }
+
+        def todays(status):
+            def setup(i):
+                appt = Appointment(
+                    patient=patient, doctor=doctor, department_id=doctor.department_id,
+                    appointment_date=today, time_slot=f'{8 + i // 6 % 12:02d}:{i % 6 * 10:02d}',
+                    status=status, reason=BENCH_REASON, booking_type='doctor',
+                    consultation_started_at=timezone.now() if status == 'in_progress' else None,
+                )
+                appt.save()
+                return appt.id
+            return setup
+
+        slot_day = slots[0][0].isoformat()
+        return {
+            'login': (lambda: anon.post(
+                '/api/auth/login/', {'email': patient.email, 'password': DATASET_PASSWORD}, format='json'
+            ), None),
+            'doctor_list': (lambda: as_patient.get('/api/doctor/'), None),
+            'available_slots': (lambda: as_patient.get(
+                f'/api/appointments/available_slots/?doctor_id={doctor.id}&date={slot_day}'
+            ), None),
+            'booking': (lambda data: as_patient.post('/api/appointments/', data, format='json'), book),
+            'start_consultation': (
+                lambda pk: as_doctor.post(f'/api/appointments/{pk}/start_consultation/'), todays('scheduled')
+            ),
+            'end_consultation': (
+                lambda pk: as_doctor.post(f'/api/appointments/{pk}/end_consultation/', {}, format='json'),
+                todays('in_progress'),
+            ),
+            'patient_dashboard': (lambda: as_patient.get('/api/patient/dashboard/'), None),
+            'doctor_dashboard': (lambda: as_doctor.get('/api/doctor/dashboard/'), None),
+            'admin_dashboard': (lambda: as_admin.get('/api/admin/dashboard/'), None),
+            'live_queue': (lambda: as_patient.get(f'/api/queue/live/?doctor={doctor.id}'), None),
+            'notifications': (lambda: as_patient.get('/api/notifications/'), None),
+        }
@@ -0,0 +1,135 @@
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Avg, F, ExpressionWrapper, DurationField
+from django.utils import timezone
+
+from healthcare.models import User, Appointment, Notification
+from healthcare.utils.benchmarking import require_benchmark_database, time_call, print_table
+from healthcare.utils.dataset import DATASET_EMAIL_DOMAIN, generate_dataset
+
+# Indexes added in 0007_query_pattern_indexes
+TUNED_INDEXES = {
+    Appointment: ['appt_doctor_day_status_slot', 'appt_patient_day_status', 'appt_doctor_status_duration'],
+    Notification: ['notif_user_read_created'],
+}
+ACTIVE = ['scheduled', 'confirmed', 'in_progress']
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the hot appointment/notification queries with and without "
+        "the composite indexes, printing EXPLAIN plans and latency percentiles."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2_000_000,
+                            help='Appointments of the dataset to generate when none exists (see generate_dataset)')
+        parser.add_argument('--doctors', type=int, default=200)
+        parser.add_argument('--patients', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--json', dest='json_path', help='Also write results to this file')
+        parser.add_argument('--force', action='store_true',
+                            help='Run even though BENCHMARK_DATABASE is off (drops production indexes meanwhile)')
+
+    def handle(self, *args, **options):
+        require_benchmark_database('drop indexes on', force=options['force'])
+
+        if not User.objects.filter(email__endswith=f'@{DATASET_EMAIL_DOMAIN}').exists():
+            self.stdout.write("No generated dataset, generating one...")
+            generate_dataset(
+                patients=options['patients'], doctors=options['doctors'],
+                appointments=options['rows'], stdout=self.stdout,
+            )
+
+        cases = self._cases()
+        results = {}
+        try:
+            for phase in ('before', 'after'):
+                self._set_indexes(present=(phase == 'after'))
+                for name, qs, run in cases:
+                    timing = time_call(run, repeat=options['repeat'])
+                    results.setdefault(name, {})[phase] = {**timing, 'explain': qs.explain()}
+        finally:
+            # Never leave the database without its indexes, whatever interrupted the run
+            self._set_indexes(present=True)
+
+        rows = []
+        for name, phases in results.items():
+            before, after = phases['before'], phases['after']
+            rows.append({
+                'query': name,
+                'p50 before': before['p50_ms'], 'p50 after': after['p50_ms'],
+                'p95 before': before['p95_ms'], 'p95 after': after['p95_ms'],
+                'speedup': round(before['p50_ms'] / after['p50_ms'], 1) if after['p50_ms'] else '-',
+            })
+            for phase in ('before', 'after'):
+                self.stdout.write(f"\n--- {name} [{phase}] ---\n{phases[phase]['explain']}")
+
+        self.stdout.write('')
+        print_table(self.stdout, rows, list(rows[0]))
+        if options['json_path']:
+            with open(options['json_path'], 'w') as fh:
+                json.dump(results, fh, indent=2)
+
+    def _cases(self):
+        """(name, queryset for EXPLAIN, callable to time) mirroring the real call sites."""
+        sample = Appointment.objects.filter(
+            doctor__user__email__endswith=f'@{DATASET_EMAIL_DOMAIN}', status='scheduled'
+        ).order_by('-appointment_date').values('doctor_id', 'patient_id', 'appointment_date', 'time_slot').first()
+        doctor_id, patient_id = sample['doctor_id'], sample['patient_id']
+        day, slot = sample['appointment_date'], sample['time_slot']
+        today = timezone.localdate()
+
+        slots_qs = Appointment.objects.filter(
+            doctor_id=doctor_id, appointment_date=day, status__in=ACTIVE
+        ).values_list('time_slot', flat=True)
+        booking_qs = Appointment.objects.filter(
+            doctor_id=doctor_id, appointment_date=day, time_slot=slot, status__in=ACTIVE
+        )
+        dashboard_qs = Appointment.objects.filter(
+            patient_id=patient_id, appointment_date__gte=today - timedelta(days=30),
+            status__in=['scheduled', 'confirmed']
+        ).order_by('appointment_date', 'time_slot')[:5]
+        notif_qs = Notification.objects.filter(
+            user_id=patient_id, is_read=False
+        ).order_by('-created_at')[:20]
+        duration_qs = Appointment.objects.filter(
+            doctor_id=doctor_id, status='completed',
+            consultation_started_at__isnull=False, consultation_ended_at__isnull=False
+        ).annotate(duration=ExpressionWrapper(
+            F('consultation_ended_at') - F('consultation_started_at'), output_field=DurationField()
+        ))
+
+        return [
+            ('available_slots', slots_qs, lambda: list(slots_qs)),
+            ('booking_validate', booking_qs, lambda: booking_qs.first()),
+            ('patient_dashboard', dashboard_qs, lambda: list(dashboard_qs)),
+            ('unread_notifications', notif_qs, lambda: list(notif_qs)),
+            ('queue_duration_avg', duration_qs.order_by().values('duration'),
+             lambda: duration_qs.aggregate(avg=Avg('duration'))),
+        ]
+
+    def _set_indexes(self, present):
+        """Drop or (re)create the tuned indexes so both phases run on the same data."""
+        with connection.cursor() as cursor:
+            for model in TUNED_INDEXES:
+                table = model._meta.db_table
+                existing = connection.introspection.get_constraints(cursor, table)
+                with connection.schema_editor() as editor:
+                    for index in model._meta.indexes:
+                        if index.name not in TUNED_INDEXES[model]:
+                            continue
+                        if present and index.name not in existing:
+                            editor.add_index(model, index)
+                        elif not present and index.name in existing:
+                            editor.remove_index(model, index)
+        with connection.cursor() as cursor:
+            if connection.vendor == 'mysql':
+                for model in TUNED_INDEXES:
+                    cursor.execute(f'ANALYZE TABLE {model._meta.db_table}')
+                    cursor.fetchall()
+            elif connection.vendor == 'sqlite':
+                cursor.execute('ANALYZE')
@@ -0,0 +1,120 @@
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from healthcare.utils import compact
+from healthcare.utils.benchmarking import print_table
+
+
+def _snapshot(entries, seed):
+    rng = random.Random(seed)
+    statuses = ['in_progress'] + ['confirmed', 'scheduled'] * entries
+    return {
+        'seq': 1200,
+        'doctor_id': 17,
+        'doctor_name': 'Dr. Ananya Sharma',
+        'department_id': 3,
+        'date': '2025-10-19',
+        'current_token': 'CARD-20251019-0041',
+        'total_tokens': entries + 40,
+        'completed_tokens': 40,
+        'queue': [
+            {
+                'token_number': f'CARD-20251019-{41 + i:04d}',
+                'patient_name': f'{rng.choice(["Rahul", "Priya", "Amit", "Sneha", "Vikram"])} '
+                                f'{rng.choice(["Verma", "Iyer", "Khan", "Patel", "Reddy"])}',
+                'status': statuses[i],
+                'queue_position': 41 + i,
+                'eta_minutes': i * 12,
+                'estimated_time': f'{10 + i * 12 // 60 % 14:02d}:{i * 12 % 60:02d}',
+            }
+            for i in range(entries)
+        ],
+    }
+
+
+def _legacy_json(snapshot):
+    """What QueueConsumer sends today: the full queue on every update."""
+    return json.dumps({
+        'type': 'queue_status',
+        'doctor_id': snapshot['doctor_id'],
+        'doctor_name': snapshot['doctor_name'],
+        'current_token': snapshot['current_token'],
+        'total_tokens': snapshot['total_tokens'],
+        'completed_tokens': snapshot['completed_tokens'],
+        'queue': [
+            {
+                'token_number': e['token_number'],
+                'patient_name': e['patient_name'],
+                'status': e['status'],
+                'queue_position': e['queue_position'],
+                'estimated_time': f"{e['estimated_time']}:00",
+            }
+            for e in snapshot['queue']
+        ],
+    })
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare bytes on the wire and encode CPU per message of the JSON queue "
+        "messages against the msgpack snapshot/delta protocol."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10,50,200', help='Queue lengths to test')
+        parser.add_argument('--loops', type=int, default=2000)
+        parser.add_argument('--json', dest='json_path', help='Also write results to this file')
+
+    def handle(self, *args, **options):
+        rows = []
+        for size in [int(n) for n in options['sizes'].split(',')]:
+            snapshot = _snapshot(size, seed=size)
+            prefix = compact.token_prefix(snapshot)
+            waiting = snapshot['queue'][1:]
+            call_next = {
+                'doctor_id': 17, 'department_id': 3, 'date': snapshot['date'],
+                'header': {'current_token': waiting[0]['token_number'] if waiting else '',
+                           'completed_tokens': 41},
+                'upsert': [{**e, 'status': 'in_progress'} for e in waiting[:1]],
+                'remove': [snapshot['queue'][0]['token_number']],
+            }
+            eta_refresh = {
+                'doctor_id': 17, 'department_id': 3, 'date': snapshot['date'],
+                'upsert': [{**e, 'eta_minutes': e['eta_minutes'] + 1} for e in waiting],
+            }
+            cases = [
+                ('snapshot', lambda: _legacy_json(snapshot), lambda: compact.encode_snapshot(snapshot)),
+                ('next patient', lambda: _legacy_json(snapshot),
+                 lambda: compact.encode_delta(1201, call_next, prefix)),
+                ('eta refresh', lambda: _legacy_json(snapshot),
+                 lambda: compact.encode_delta(1202, eta_refresh, prefix)),
+            ]
+            for name, legacy, binary in cases:
+                json_bytes, json_us = self._measure(legacy, options['loops'])
+                compact_bytes, compact_us = self._measure(binary, options['loops'])
+                rows.append({
+                    'queue': size,
+                    'message': name,
+                    'json_bytes': json_bytes,
+                    'compact_bytes': compact_bytes,
+                    'bytes_saved_%': round(100 * (1 - compact_bytes / json_bytes), 1),
+                    'json_us': json_us,
+                    'compact_us': compact_us,
+                })
+
+        print_table(self.stdout, rows, list(rows[0]))
+        if options['json_path']:
+            with open(options['json_path'], 'w') as fh:
+                json.dump(rows, fh, indent=2)
+
+    def _measure(self, encode, loops):
+        """(frame size in bytes, mean encode time in microseconds)."""
+        frame = encode()
+        size = len(frame.encode() if isinstance(frame, str) else frame)
+        start = time.perf_counter()
+        for _ in range(loops):
+            encode()
+        return size, round((time.perf_counter() - start) / loops * 1e6, 2)
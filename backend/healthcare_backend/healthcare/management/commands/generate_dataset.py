@@ -0,0 +1,64 @@
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+from healthcare.utils.benchmarking import print_table
+from healthcare.utils.dataset import DEPARTMENTS, generate_dataset, flush_dataset
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a deterministic synthetic hospital (patients, doctors, availability, "
+        "appointments, records, reviews, notifications) with bulk inserts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patients', type=int, default=100_000)
+        parser.add_argument('--doctors', type=int, default=500)
+        parser.add_argument('--appointments', type=int, default=1_000_000)
+        parser.add_argument('--months', type=int, default=6, help='History to spread appointments over')
+        parser.add_argument('--departments', type=int, default=len(DEPARTMENTS),
+                            choices=range(1, len(DEPARTMENTS) + 1), metavar=f'1-{len(DEPARTMENTS)}')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--record-rate', type=float, default=0.6,
+                            help='Share of completed appointments with a medical record')
+        parser.add_argument('--review-rate', type=float, default=0.08,
+                            help='Share of completed appointments with a review')
+        parser.add_argument('--notification-rate', type=float, default=1.0,
+                            help='Share of appointments with a booking notification')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per INSERT transaction')
+        parser.add_argument('--flush', action='store_true',
+                            help='Delete a previously generated dataset first')
+        parser.add_argument('--flush-only', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['flush'] or options['flush_only']:
+            deleted = flush_dataset()
+            self.stdout.write(f"Flushed previous dataset: {deleted}")
+            if options['flush_only']:
+                return
+
+        try:
+            counts = generate_dataset(
+                patients=options['patients'],
+                doctors=options['doctors'],
+                appointments=options['appointments'],
+                months=options['months'],
+                departments=options['departments'],
+                seed=options['seed'],
+                record_rate=options['record_rate'],
+                review_rate=options['review_rate'],
+                notification_rate=options['notification_rate'],
+                batch_size=options['batch_size'],
+                stdout=self.stdout,
+            )
+        except ValueError as exc:
+            raise CommandError(f"{exc} (use --flush)")
+
+        seconds = counts.pop('seconds')
+        print_table(self.stdout, [{'table': k, 'rows': v} for k, v in counts.items()], ['table', 'rows'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated dataset (seed {options['seed']}) in {seconds}s, "
+            f"{counts['appointments'] / max(seconds, 0.001):,.0f} appointments/s."
+        ))
@@ -0,0 +1,204 @@
+import asyncio
+import itertools
+import json
+import re
+import time
+
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from healthcare.models import User, Doctor
+from healthcare.routing import websocket_urlpatterns
+from healthcare.utils.benchmarking import summarize, percentile, print_table
+from healthcare.utils.jwt_claims import ClaimsRefreshToken
+from healthcare.utils.queue_feed import doctor_group, appointment_group, publish
+from healthcare.utils.ws_auth import JWTAuthMiddlewareStack
+from healthcare.utils.ws_loadtest import SimulatedClient, isolated_backends, rss_mb, watch_lag
+
+# Publish time carried in each synthetic payload, read back without parsing the frame
+SENT_AT_RE = re.compile(r'"sent_at":\s*([0-9.]+)')
+
+
+class Command(BaseCommand):
+    help = (
+        "Connect thousands of simulated QueueConsumer and AppointmentConsumer clients "
+        "across many doctor groups, publish queue and notification updates at a fixed "
+        "rate and report fan-out latency, messages per second, memory per connection "
+        "and event-loop lag."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=2000, help='Queue watchers, spread over --groups')
+        parser.add_argument('--groups', type=int, default=50, help='Doctors whose queues are watched')
+        parser.add_argument('--appointment-clients', type=int, default=500,
+                            help='Patients following their own appointments (one socket each)')
+        parser.add_argument('--rate', type=float, default=100, help='Queue updates per second (all groups)')
+        parser.add_argument('--notification-rate', type=float, default=20, help='Notifications per second')
+        parser.add_argument('--duration', type=float, default=30, help='Seconds to publish for')
+        parser.add_argument('--drain', type=float, default=2, help='Seconds to wait for stragglers')
+        parser.add_argument('--report', help='Write the report to this JSON file')
+        parser.add_argument('--history', help='Append the report as one line to this JSONL file')
+        parser.add_argument('--force', action='store_true',
+                            help='Use the configured channel layer and cache (e.g. Redis) instead of in-memory '
+                                 'stand-ins; live subscribers of the tested streams receive the synthetic events')
+
+    def handle(self, *args, **options):
+        doctors = list(Doctor.objects.order_by('id').values_list('id', flat=True)[:options['groups']])
+        if not doctors:
+            raise CommandError("No doctors to load-test; run generate_dataset first")
+        patients = list(User.objects.filter(role='patient', is_active=True).order_by('id')
+                        [:options['appointment_clients']])
+        if len(doctors) < options['groups'] or len(patients) < options['appointment_clients']:
+            self.stdout.write(self.style.WARNING(
+                f"Only {len(doctors)} doctors and {len(patients)} patients available; using those"
+            ))
+        tokens = {p.id: str(ClaimsRefreshToken.for_user(p).access_token) for p in patients}
+
+        with isolated_backends(force=options['force']):
+            report = asyncio.run(self._run(doctors, tokens, options))
+
+        print_table(self.stdout, [
+            {'stream': kind, **{k: v for k, v in r.items() if k != 'latency'}, **r['latency']}
+            for kind, r in report['streams'].items()
+        ], ['stream', 'published', 'expected', 'delivered', 'runs', 'p50_ms', 'p95_ms', 'p99_ms', 'mean_ms'])
+        self.stdout.write('')
+        for key, value in report['totals'].items():
+            self.stdout.write(f'{key}: {value}')
+
+        if options['report']:
+            with open(options['report'], 'w') as fh:
+                json.dump(report, fh, indent=2)
+        if options['history']:
+            with open(options['history'], 'a') as fh:
+                fh.write(json.dumps(report, sort_keys=True) + '\n')
+
+        lost = report['totals']['delivery_ratio'] < 1
+        self.stdout.write(self.style.WARNING('some updates were not delivered') if lost
+                          else self.style.SUCCESS('every update reached every client'))
+
+    async def _run(self, doctors, tokens, options):
+        latencies = {'queue': [], 'notification': []}
+
+        def on_frame(client, message, received_at):
+            match = SENT_AT_RE.search(message.get('text') or '')
+            if match:
+                latencies[client.kind].append(received_at - float(match.group(1)))
+
+        app = JWTAuthMiddlewareStack(URLRouter(websocket_urlpatterns))
+        watchers = {doctor_id: 0 for doctor_id in doctors}
+        clients = []
+        for i in range(options['clients']):
+            doctor_id = doctors[i % len(doctors)]
+            watchers[doctor_id] += 1
+            client = SimulatedClient(app, f'/ws/queue/{doctor_id}/', on_frame=on_frame)
+            client.kind = 'queue'
+            clients.append(client)
+        for user_id, token in tokens.items():
+            client = SimulatedClient(
+                app, f'/ws/appointments/{user_id}/', query_string=f'token={token}'.encode(), on_frame=on_frame
+            )
+            client.kind = 'notification'
+            clients.append(client)
+
+        # Connect in waves so the baseline doesn't include a thundering herd of snapshots
+        before = rss_mb()
+        started = time.perf_counter()
+        tasks = []
+        for start in range(0, len(clients), 200):
+            wave = clients[start:start + 200]
+            tasks += [asyncio.ensure_future(c.run()) for c in wave]
+            await asyncio.gather(*(c.accepted.wait() for c in wave))
+        connect_s = time.perf_counter() - started
+        rejected = sum(c.close_code is not None for c in clients)
+        connected = len(clients) - rejected
+        per_connection_kb = (rss_mb() - before) * 1024 / max(1, connected)
+        self.stdout.write(
+            f"{connected} clients connected in {connect_s:.1f}s "
+            f"({options['clients']} queue over {len(doctors)} groups, {len(tokens)} appointment)"
+        )
+        frames_before = sum(c.frames for c in clients)
+
+        lags = []
+        lag_task = asyncio.ensure_future(watch_lag(lags))
+        published = {'queue': 0, 'notification': 0}
+        expected = {'queue': 0, 'notification': 0}
+        schedule = self._schedule(doctors, list(tokens), options)
+        today = timezone.localdate().isoformat()
+        started = time.perf_counter()
+        for at, kind, target in schedule:
+            await asyncio.sleep(max(0.0, started + at - time.perf_counter()))
+            if kind == 'queue':
+                stream = doctor_group(target)
+                data = {
+                    'doctor_id': target, 'date': today,
+                    'header': {'total_tokens': published[kind]}, 'sent_at': time.perf_counter(),
+                }
+                expected[kind] += watchers[target]
+                await sync_to_async(publish)(stream, 'queue_delta', data)
+            else:
+                stream = appointment_group(target)
+                data = {
+                    'id': None, 'title': 'Load test', 'message': 'Synthetic notification',
+                    'category': 'system', 'sent_at': time.perf_counter(),
+                }
+                expected[kind] += 1
+                await sync_to_async(publish)(stream, 'notification', data)
+            published[kind] += 1
+        publish_s = time.perf_counter() - started
+        await asyncio.sleep(options['drain'])
+        lag_task.cancel()
+        frames = sum(c.frames for c in clients) - frames_before
+
+        evicted = sum(c.close_code == 4008 for c in clients)
+        for c in clients:
+            if c.close_code is None:
+                c.disconnect()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        lag_ms = sorted(lag * 1000 for lag in lags)
+        delivered = sum(len(v) for v in latencies.values())
+        return {
+            'timestamp': timezone.now().isoformat(),
+            'config': {
+                'clients': options['clients'], 'groups': len(doctors), 'appointment_clients': len(tokens),
+                'rate': options['rate'], 'notification_rate': options['notification_rate'],
+                'duration': options['duration'], 'channel_layer': type(get_channel_layer()).__name__,
+            },
+            'streams': {
+                kind: {
+                    'published': published[kind],
+                    'expected': expected[kind],
+                    'delivered': len(latencies[kind]),
+                    'latency': summarize(latencies[kind]),
+                }
+                for kind in latencies
+            },
+            'totals': {
+                'connected': connected,
+                'rejected': rejected,
+                'evicted': evicted,
+                'connect_s': round(connect_s, 2),
+                'publish_rate': round(sum(published.values()) / publish_s, 1) if publish_s else 0.0,
+                'messages_per_s': round(frames / (publish_s + options['drain']), 1),
+                'delivery_ratio': round(delivered / max(1, sum(expected.values())), 4),
+                'rss_per_connection_kb': round(per_connection_kb, 1),
+                'loop_lag_p50_ms': round(percentile(lag_ms, 50), 1),
+                'loop_lag_p99_ms': round(percentile(lag_ms, 99), 1),
+                'loop_lag_max_ms': round(max(lag_ms, default=0.0), 1),
+            },
+        }
+
+    def _schedule(self, doctors, users, options):
+        """(offset seconds, kind, target) for every publish, merged in time order."""
+        def stream(kind, rate, targets):
+            if not rate or not targets:
+                return []
+            count = int(rate * options['duration'])
+            return [(i / rate, kind, target) for i, target in zip(range(count), itertools.cycle(targets))]
+        return sorted(
+            stream('queue', options['rate'], doctors) + stream('notification', options['notification_rate'], users),
+            key=lambda item: item[0],
+        )
@@ -0,0 +1,123 @@
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from healthcare.consumer import open_connections
+from healthcare.models import Doctor
+from healthcare.routing import websocket_urlpatterns
+from healthcare.utils.benchmarking import print_table
+from healthcare.utils.queue_feed import doctor_group, append_event
+from healthcare.utils.metrics import WS_SEND_OVERFLOWS
+from healthcare.utils.ws_loadtest import SimulatedClient, isolated_backends, rss_mb, watch_lag
+
+
+class Command(BaseCommand):
+    help = (
+        "Connect thousands of simulated queue clients (some deliberately slow), "
+        "publish queue updates at a fixed rate and report outbound-queue depth, "
+        "memory, evictions and event-loop lag."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=500)
+        parser.add_argument('--slow-fraction', type=float, default=0.1)
+        parser.add_argument('--slow-delay', type=float, default=0.5, help='Seconds a slow client takes per frame')
+        parser.add_argument('--updates', type=int, default=300)
+        parser.add_argument('--rate', type=float, default=50, help='Updates per second')
+        parser.add_argument('--doctor', type=int, help='Doctor whose queue to load (default: first doctor)')
+        parser.add_argument('--force', action='store_true',
+                            help="Use the configured channel layer and cache (e.g. Redis) instead of in-memory "
+                                 "stand-ins; live subscribers of the doctor's queue receive the synthetic updates")
+
+    def handle(self, *args, **options):
+        doctor = (
+            Doctor.objects.filter(id=options['doctor']).first() if options['doctor']
+            else Doctor.objects.order_by('id').first()
+        )
+        if doctor is None:
+            raise CommandError("No doctor to load-test; create one or seed data first")
+        with isolated_backends(force=options['force']):
+            asyncio.run(self._run(doctor, options))
+
+    async def _run(self, doctor, options):
+        app = URLRouter(websocket_urlpatterns)
+        layer = get_channel_layer()
+        group = doctor_group(doctor.id)
+        n_slow = int(options['clients'] * options['slow_fraction'])
+        clients = [
+            SimulatedClient(app, f'/ws/queue/{doctor.id}/', options['slow_delay'] if i < n_slow else 0.0)
+            for i in range(options['clients'])
+        ]
+
+        tasks = [asyncio.ensure_future(c.run()) for c in clients]
+        await asyncio.gather(*(c.accepted.wait() for c in clients))
+        baseline = rss_mb()
+        self.stdout.write(f"{len(clients)} clients connected ({n_slow} slow)")
+
+        lags = []
+        lag_task = asyncio.ensure_future(watch_lag(lags))
+        overflows_before = self._overflows()
+        samples = []
+        interval = 1 / options['rate']
+        started = time.monotonic()
+        for i in range(options['updates']):
+            delta = {
+                'doctor_id': doctor.id, 'department_id': doctor.department_id,
+                'date': timezone.localdate().isoformat(), 'header': {'total_tokens': i},
+            }
+            seq = await sync_to_async(append_event)(group, 'queue_delta', delta)
+            await layer.group_send(group, {
+                'type': 'feed.event', 'stream': group, 'seq': seq, 'event': 'queue_delta', 'data': delta,
+            })
+            if i % max(1, options['updates'] // 5) == 0:
+                samples.append(self._sample(i, baseline))
+            await asyncio.sleep(max(0.0, started + (i + 1) * interval - time.monotonic()))
+        await asyncio.sleep(2)  # let fast clients drain
+        samples.append(self._sample(options['updates'], baseline))
+
+        lag_task.cancel()
+        for c in clients:
+            if c.close_code is None:
+                c.disconnect()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        print_table(self.stdout, samples, list(samples[0]))
+        fast = clients[n_slow:]
+        slow = clients[:n_slow]
+        summary = {
+            'fast frames (min)': min((c.frames for c in fast), default=0),
+            'fast evicted': sum(c.close_code == 4008 for c in fast),
+            'slow evicted': sum(c.close_code == 4008 for c in slow),
+            'coalesced overflows': self._overflows() - overflows_before,
+            'max loop lag ms': round(max(lags, default=0.0) * 1000, 1),
+        }
+        self.stdout.write('')
+        for key, value in summary.items():
+            self.stdout.write(f'{key}: {value}')
+
+        # Slow readers must be coalesced into resyncs and then evicted, without touching fast ones
+        if summary['fast evicted']:
+            raise CommandError(f"{summary['fast evicted']} fast clients were evicted")
+        if slow and not (summary['coalesced overflows'] and summary['slow evicted']):
+            raise CommandError('Slow clients were not coalesced into resyncs and evicted')
+        self.stdout.write(self.style.SUCCESS('slow clients were coalesced and evicted, fast ones kept up'))
+
+    @staticmethod
+    def _overflows():
+        return sum(value for _, value in WS_SEND_OVERFLOWS.samples())
+
+    def _sample(self, published, baseline):
+        consumers = list(open_connections)
+        depths = [c.outbox_size() for c in consumers]
+        return {
+            'published': published,
+            'open': len(consumers),
+            'queued frames': sum(depths),
+            'max outbox': max(depths, default=0),
+            'rss growth MB': round(rss_mb() - baseline, 1),
+        }
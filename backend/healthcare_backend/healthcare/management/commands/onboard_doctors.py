@@ -0,0 +1,54 @@
+import json
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+from healthcare.models import User
+from healthcare.utils.benchmarking import print_table
+from healthcare.utils.onboarding import onboard_doctors, read_records
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Register doctors in bulk from a CSV or JSON file and print a per-row report."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV with a header row, or a JSON array of doctor records')
+        parser.add_argument('--registered-by', help='Email of the admin recorded as registering them')
+        parser.add_argument('--batch-size', type=int, help='Defaults to ONBOARDING_BATCH_SIZE')
+        parser.add_argument('--workers', type=int, help='Hashing processes; defaults to ONBOARDING_HASH_WORKERS')
+        parser.add_argument('--report', dest='report_path', help='Also write the full report to this JSON file')
+
+    def handle(self, *args, **options):
+        registered_by = None
+        if options['registered_by']:
+            registered_by = User.objects.filter(email=options['registered_by'], role='admin').first()
+            if registered_by is None:
+                raise CommandError(f"No admin with email {options['registered_by']}")
+        try:
+            with open(options['path'], 'rb') as fh:
+                records = read_records(fh, options['path'])
+        except (OSError, ValueError, KeyError) as exc:
+            raise CommandError(f"Can't read {options['path']}: {exc}")
+
+        logger.info(f"Onboarding {len(records)} doctors from {options['path']}...")
+        result = onboard_doctors(
+            records,
+            registered_by=registered_by,
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+        )
+
+        failures = [
+            {'row': row['row'], 'email': row['email'], 'status': row['status'],
+             'errors': '; '.join(f"{field}: {' '.join(map(str, errs))}" for field, errs in row['errors'].items())}
+            for row in result['rows'] if row['status'] != 'created'
+        ]
+        if failures:
+            print_table(self.stdout, failures, ['row', 'email', 'status', 'errors'])
+        if options['report_path']:
+            with open(options['report_path'], 'w') as fh:
+                json.dump(result, fh, indent=2, default=str)
+        self.stdout.write(self.style.SUCCESS(
+            f"Onboarded {result['created']} doctors; {result['failed']} rows failed."
+        ))
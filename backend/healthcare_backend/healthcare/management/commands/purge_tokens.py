@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from healthcare.utils.token_blacklist import purge_expired_tokens
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Delete expired outstanding refresh tokens and their blacklist entries in small batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Defaults to TOKEN_PURGE_BATCH_SIZE')
+        parser.add_argument('--max-batches', type=int)
+        parser.add_argument('--pause', type=float, default=0.05,
+                            help='Seconds to sleep between batches to let other writers in')
+
+    def handle(self, *args, **options):
+        logger.info("Purging expired tokens...")
+        result = purge_expired_tokens(
+            batch_size=options['batch_size'],
+            max_batches=options['max_batches'],
+            pause=options['pause'],
+        )
+        logger.info(f"Token purge complete: {result}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Purged {result['outstanding']} outstanding and {result['blacklisted']} blacklisted "
+            f"tokens in {result['batches']} batches."
+        ))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from healthcare.utils.eta_refresh import refresh_etas, run_refresh_loop
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-quote the ETAs of every active queue of the day on a timer, writing only "
+        "the appointments whose quote changed and publishing the queue deltas. Run it "
+        "as a long-lived worker next to the web processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, help='Seconds between ticks (default ETA_REFRESH_INTERVAL)')
+        parser.add_argument('--once', action='store_true', help='Run a single tick and exit')
+        parser.add_argument('--ticks', type=int, help='Stop after this many ticks')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            result = refresh_etas()
+            self.stdout.write(self.style.SUCCESS(
+                f"Refreshed {result['queues']} queues ({result['appointments']} appointments): "
+                f"{result['updated']} updated, {result['published']} published in {result['seconds']}s"
+            ))
+            return
+        logger.info("Starting ETA refresh loop")
+        run_refresh_loop(interval=options['interval'], max_ticks=options['ticks'], stdout=self.stdout)
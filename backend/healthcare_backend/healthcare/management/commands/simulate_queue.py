@@ -0,0 +1,93 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from healthcare.utils.benchmarking import print_table
+from healthcare.utils.db_routing import use_replica
+from healthcare.utils.queue_sim import doctor_parameters, fit_parameters, simulate
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate clinic-days of doctor queues (arrivals, no-shows, consultation times) "
+        "and report waits, overtime and the error of the ETAs _update_queue quotes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--from-history', action='store_true',
+                            help="Fit each doctor's bookings, no-shows and durations from the database")
+        parser.add_argument('--doctor', type=int, nargs='+', dest='doctor_ids',
+                            help='Only these doctors (implies --from-history)')
+        parser.add_argument('--history-days', type=int, default=180)
+        parser.add_argument('--doctors', type=int, default=200, help='Synthetic doctors without --from-history')
+        parser.add_argument('--bookings-per-day', type=float, default=25)
+        parser.add_argument('--mean-minutes', type=float, default=10, help='Mean consultation time')
+        parser.add_argument('--cv', type=float, default=0.5, help='Spread of consultation times (std / mean)')
+        parser.add_argument('--no-show-rate', type=float, default=0.1)
+        parser.add_argument('--eta-average', type=float,
+                            help='Average the ETA quotes use (default: the mean consultation time)')
+        parser.add_argument('--duration-scale', type=float, default=1.0,
+                            help='What-if: stretch true consultation times, e.g. 1.4 for 10 -> 14 minutes')
+        parser.add_argument('--eta-model', choices=['flat', 'predicted'], default='flat',
+                            help='ETA to score: flat average per patient, or the p50/p90 predictor '
+                                 '(re-quotes every queue at every event; minutes rather than seconds per year)')
+        parser.add_argument('--slot-minutes', type=int, default=10)
+        parser.add_argument('--arrival-early', type=float, default=10, help='Minutes patients arrive before the slot')
+        parser.add_argument('--arrival-sd', type=float, default=10)
+        parser.add_argument('--json', dest='json_path', help='Also write the results to this file')
+
+    def handle(self, *args, **options):
+        if options['from_history'] or options['doctor_ids']:
+            try:
+                # Read-only history scan: keep it off the primary when a replica is configured
+                with use_replica():
+                    params = fit_parameters(options['doctor_ids'], days=options['history_days'])
+            except ValueError as exc:
+                raise CommandError(str(exc))
+        else:
+            params = doctor_parameters(
+                options['doctors'],
+                bookings_per_day=options['bookings_per_day'],
+                mean_minutes=options['mean_minutes'],
+                cv=options['cv'],
+                no_show_rate=options['no_show_rate'],
+                eta_average=options['eta_average'],
+            )
+
+        result = simulate(
+            params,
+            days=options['days'],
+            seed=options['seed'],
+            slot_minutes=options['slot_minutes'],
+            arrival_early=options['arrival_early'],
+            arrival_sd=options['arrival_sd'],
+            duration_scale=options['duration_scale'],
+            eta_model=options['eta_model'],
+        )
+
+        self.stdout.write(
+            f"{result['clinic_days']} clinic-days of {len(params['doctor_id'])} doctors: "
+            f"{result['booked']} booked, {result['no_shows']} no-shows, {result['seconds']}s"
+        )
+        rows = [
+            {'minutes': label, **result[key]}
+            for key, label in [
+                ('wait', 'arrival to consultation'),
+                ('delay', 'consultation after slot'),
+                ('overtime', 'overtime per day'),
+                ('eta_error', 'ETA error (quoted - actual)'),
+                ('next_in_line_error', 'ETA error, next in line'),
+            ]
+        ]
+        print_table(self.stdout, rows, ['minutes', 'n', 'mean', 'p50', 'p90', 'p99'])
+        accuracy = result['eta_abs_error']
+        self.stdout.write(
+            f"|ETA error| p50 {accuracy['p50']:.0f} min, p90 {accuracy['p90']:.0f} min, "
+            f"{accuracy['within_10_min']:.1%} of quotes within 10 minutes, "
+            f"{accuracy['p90_coverage']:.1%} seen by the quoted p90"
+        )
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as fh:
+                json.dump(result, fh, indent=2)
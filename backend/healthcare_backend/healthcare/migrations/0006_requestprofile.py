@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-19 00:11
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healthcare', '0005_appointment_estimated_wait_minutes_notification'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('endpoint', models.CharField(max_length=200)),
+                ('path', models.CharField(max_length=255)),
+                ('method', models.CharField(max_length=10)),
+                ('status_code', models.PositiveSmallIntegerField()),
+                ('user_role', models.CharField(blank=True, max_length=10)),
+                ('trigger', models.CharField(choices=[('token', 'Signed Token'), ('sampled', 'Sampled')], max_length=10)),
+                ('duration_ms', models.FloatField()),
+                ('query_count', models.PositiveIntegerField(default=0)),
+                ('query_time_ms', models.FloatField(default=0)),
+                ('stats', models.BinaryField(help_text='marshal-encoded pstats data')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='request_profiles', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'request_profiles',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['endpoint', 'created_at'], name='request_pro_endpoin_cac300_idx')],
+            },
+        ),
+    ]
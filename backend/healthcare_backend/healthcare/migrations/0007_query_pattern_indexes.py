@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-19 00:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healthcare', '0006_requestprofile'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['doctor', 'appointment_date', 'status', 'time_slot'], name='appt_doctor_day_status_slot'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['patient', 'appointment_date', 'status'], name='appt_patient_day_status'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['doctor', 'status', 'consultation_started_at', 'consultation_ended_at'], name='appt_doctor_status_duration'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'is_read', '-created_at'], name='notif_user_read_created'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.7 on 2026-10-19 00:14
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healthcare', '0007_query_pattern_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAppointment',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('appointment_date', models.DateField()),
+                ('time_slot', models.TimeField()),
+                ('status', models.CharField(choices=[('scheduled', 'Scheduled'), ('confirmed', 'Confirmed'), ('in_progress', 'In Progress'), ('completed', 'Completed'), ('cancelled', 'Cancelled'), ('no_show', 'No Show')], max_length=15)),
+                ('token_number', models.CharField(blank=True, max_length=20)),
+                ('queue_position', models.IntegerField(default=0)),
+                ('estimated_time', models.TimeField(blank=True, null=True)),
+                ('estimated_wait_minutes', models.PositiveIntegerField(default=0)),
+                ('reason', models.TextField()),
+                ('booking_type', models.CharField(choices=[('disease', 'By Disease/Department'), ('doctor', 'By Doctor')], max_length=10)),
+                ('is_for_self', models.BooleanField(default=True)),
+                ('patient_relation', models.CharField(blank=True, max_length=50)),
+                ('consultation_started_at', models.DateTimeField(blank=True, null=True)),
+                ('consultation_ended_at', models.DateTimeField(blank=True, null=True)),
+                ('notes', models.TextField(blank=True)),
+                ('prescription', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('department', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='healthcare.department')),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_appointments', to='healthcare.doctor')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_appointments', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Archived Appointment',
+                'verbose_name_plural': 'Archived Appointments',
+                'db_table': 'appointments_archive',
+                'ordering': ['-appointment_date', 'queue_position'],
+                'indexes': [models.Index(fields=['patient', 'appointment_date'], name='appt_archive_patient_day'), models.Index(fields=['doctor', 'appointment_date'], name='appt_archive_doctor_day')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healthcare', '0008_archivedappointment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='estimated_wait_p90_minutes',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='archivedappointment',
+            name='estimated_wait_p90_minutes',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('healthcare', '0009_appointment_eta_p90'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctorreview',
+            name='archived_appointment',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='appointment_review', to='healthcare.archivedappointment'),
+        ),
+        migrations.AddField(
+            model_name='medicalrecord',
+            name='archived_appointment',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='medical_record', to='healthcare.archivedappointment'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='archived_appointment',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='notifications', to='healthcare.archivedappointment'),
+        ),
+    ]
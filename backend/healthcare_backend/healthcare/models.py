@@ -1,10 +1,15 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.core.validators import RegexValidator
 from django.utils import timezone
 from decimal import Decimal
 import uuid
 
+from .utils.metrics import TOKEN_CONFLICTS
+
+# Suffixes Appointment.save tries before giving up on a token
+TOKEN_ATTEMPTS = 50
+
 class UserManager(BaseUserManager):
     """Custom user manager for the User model"""
     
@@ -319,6 +324,8 @@ class Appointment(models.Model):
     queue_position = models.IntegerField(default=0)
     estimated_time = models.TimeField(null=True, blank=True)
     estimated_wait_minutes = models.PositiveIntegerField(default=0)
+    # 90th-percentile wait (utils/eta_predictor.py); estimated_wait_minutes is the median
+    estimated_wait_p90_minutes = models.PositiveIntegerField(default=0)
 
     # Booking Details
     reason = models.TextField()
@@ -347,27 +354,111 @@ class Appointment(models.Model):
             models.Index(fields=['appointment_date', 'doctor']),
             models.Index(fields=['status']),
             models.Index(fields=['token_number']),
+            # available_slots, booking validation and the rescheduler
+            models.Index(
+                fields=['doctor', 'appointment_date', 'status', 'time_slot'],
+                name='appt_doctor_day_status_slot'
+            ),
+            # patient dashboard
+            models.Index(
+                fields=['patient', 'appointment_date', 'status'],
+                name='appt_patient_day_status'
+            ),
+            # consultation duration average in _update_queue (covers both timestamps)
+            models.Index(
+                fields=['doctor', 'status', 'consultation_started_at', 'consultation_ended_at'],
+                name='appt_doctor_status_duration'
+            ),
         ]
         # Note: Serializer validation ensures only one patient per time slot
 
     def save(self, *args, **kwargs):
-        if not self.token_number:
-            # Generate unique token: DEPT-YYYYMMDD-NNNN
-            date_str = self.appointment_date.strftime('%Y%m%d')
-            dept_prefix = self.department.code
-            count = Appointment.objects.filter(
-                doctor=self.doctor,
-                appointment_date=self.appointment_date
-            ).count() + 1
-            self.token_number = f"{dept_prefix}-{date_str}-{count:04d}"
-            # Set queue position
-            self.queue_position = count
-        super().save(*args, **kwargs)
+        if self.token_number:
+            return super().save(*args, **kwargs)
+
+        # Generate unique token: DEPT-YYYYMMDD-NNNN
+        date_str = self.appointment_date.strftime('%Y%m%d')
+        dept_prefix = self.department.code
+        count = Appointment.objects.filter(
+            doctor=self.doctor,
+            appointment_date=self.appointment_date
+        ).count() + 1
+        # Set queue position
+        self.queue_position = count
+        # Doctors of one department share the prefix, and concurrent bookings the
+        # count, so a token can already be taken: let the unique constraint decide
+        # and take the next suffix
+        for suffix in range(count, count + TOKEN_ATTEMPTS):
+            self.token_number = f"{dept_prefix}-{date_str}-{suffix:04d}"
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError as exc:
+                if 'token_number' not in str(exc):
+                    raise
+                TOKEN_CONFLICTS.inc()
+        self.token_number = ''
+        raise IntegrityError(f"No free token for {dept_prefix}-{date_str} after {TOKEN_ATTEMPTS} attempts")
 
     def __str__(self):
         return f"{self.token_number}: {self.patient.full_name} with {self.doctor.full_name}"
 
 
+class ArchivedAppointment(models.Model):
+    """History tier for finished appointments moved out of the hot appointments table"""
+    # Same primary key as the original Appointment row
+    id = models.BigIntegerField(primary_key=True)
+    patient = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='archived_appointments'
+    )
+    doctor = models.ForeignKey(
+        Doctor,
+        on_delete=models.CASCADE,
+        related_name='archived_appointments'
+    )
+    department = models.ForeignKey(Department, on_delete=models.CASCADE, related_name='+')
+
+    appointment_date = models.DateField()
+    time_slot = models.TimeField()
+    status = models.CharField(max_length=15, choices=Appointment.STATUS_CHOICES)
+
+    token_number = models.CharField(max_length=20, blank=True)
+    queue_position = models.IntegerField(default=0)
+    estimated_time = models.TimeField(null=True, blank=True)
+    estimated_wait_minutes = models.PositiveIntegerField(default=0)
+    estimated_wait_p90_minutes = models.PositiveIntegerField(default=0)
+
+    reason = models.TextField()
+    booking_type = models.CharField(max_length=10, choices=Appointment.BOOKING_TYPE_CHOICES)
+    is_for_self = models.BooleanField(default=True)
+    patient_relation = models.CharField(max_length=50, blank=True)
+
+    consultation_started_at = models.DateTimeField(null=True, blank=True)
+    consultation_ended_at = models.DateTimeField(null=True, blank=True)
+
+    notes = models.TextField(blank=True)
+    prescription = models.TextField(blank=True)
+
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'appointments_archive'
+        verbose_name = 'Archived Appointment'
+        verbose_name_plural = 'Archived Appointments'
+        ordering = ['-appointment_date', 'queue_position']
+        indexes = [
+            models.Index(fields=['patient', 'appointment_date'], name='appt_archive_patient_day'),
+            models.Index(fields=['doctor', 'appointment_date'], name='appt_archive_doctor_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.token_number} (archived, {self.appointment_date})"
+
+
 class QueueStatus(models.Model):
     """Real-time queue status for doctors"""
     doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='queue_statuses')
@@ -407,6 +498,14 @@ class MedicalRecord(models.Model):
         null=True,
         blank=True
     )
+    # Set instead of `appointment` once the visit moves to the archive
+    archived_appointment = models.OneToOneField(
+        'ArchivedAppointment',
+        on_delete=models.SET_NULL,
+        related_name='medical_record',
+        null=True,
+        blank=True
+    )
 
     # Medical Information
     diagnosis = models.TextField()
@@ -532,6 +631,13 @@ class DoctorReview(models.Model):
         blank=True,
         related_name="appointment_review"
     )
+    archived_appointment = models.ForeignKey(
+        'ArchivedAppointment',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="appointment_review"
+    )
 
     rating = models.IntegerField()  # 1–5 stars
     comment = models.TextField(blank=True)
@@ -566,6 +672,13 @@ class Notification(models.Model):
         blank=True,
         related_name='notifications'
     )
+    archived_appointment = models.ForeignKey(
+        'ArchivedAppointment',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='notifications'
+    )
     title = models.CharField(max_length=150)
     message = models.TextField()
     category = models.CharField(max_length=20, choices=CATEGORY_CHOICES, default='general')
@@ -577,6 +690,12 @@ class Notification(models.Model):
     class Meta:
         db_table = 'notifications'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(
+                fields=['user', 'is_read', '-created_at'],
+                name='notif_user_read_created'
+            ),
+        ]
 
     def __str__(self):
         return f"{self.title} → {self.user.full_name}"
@@ -586,3 +705,40 @@ class Notification(models.Model):
             self.is_read = True
             self.read_at = timezone.now()
             self.save(update_fields=['is_read', 'read_at'])
+
+
+class RequestProfile(models.Model):
+    """cProfile capture of a single API request, stored for later download"""
+    TRIGGER_CHOICES = [
+        ('token', 'Signed Token'),
+        ('sampled', 'Sampled'),
+    ]
+
+    endpoint = models.CharField(max_length=200)
+    path = models.CharField(max_length=255)
+    method = models.CharField(max_length=10)
+    status_code = models.PositiveSmallIntegerField()
+    user = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='request_profiles'
+    )
+    user_role = models.CharField(max_length=10, blank=True)
+    trigger = models.CharField(max_length=10, choices=TRIGGER_CHOICES)
+    duration_ms = models.FloatField()
+    query_count = models.PositiveIntegerField(default=0)
+    query_time_ms = models.FloatField(default=0)
+    stats = models.BinaryField(help_text='marshal-encoded pstats data')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'request_profiles'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['endpoint', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.method} {self.endpoint} ({self.duration_ms:.0f} ms)"
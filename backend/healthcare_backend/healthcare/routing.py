@@ -6,4 +6,6 @@ websocket_urlpatterns = [
     re_path(r'ws/queue/(?P<doctor_id>\w+)/$', consumer.QueueConsumer.as_asgi()),
     # Regex for user-specific appointment updates
     re_path(r'ws/appointments/(?P<user_id>\w+)/$', consumer.AppointmentConsumer.as_asgi()),
+    # Department display board (all doctors' current and next tokens)
+    re_path(r'ws/department/(?P<department_id>\d+)/$', consumer.DepartmentBoardConsumer.as_asgi()),
 ]
\ No newline at end of file
@@ -5,8 +5,9 @@ from django.utils import timezone
 from .models import (
     User, Doctor, Department, Appointment, MedicalRecord,
     FamilyMember, DoctorAvailability, Admin, QueueStatus, DoctorReview,
-    Notification
+    Notification, RequestProfile
 )
+from .utils.cache import doctor_availability
 
 # ==================== Authentication Serializers ====================
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -191,6 +192,17 @@ class DoctorRegistrationSerializer(serializers.Serializer):
         return doctor
 
 
+class DoctorOnboardingRowSerializer(DoctorRegistrationSerializer):
+    """One row of a bulk onboarding file; departments come from context['departments']"""
+    department = serializers.IntegerField()
+
+    def validate_department(self, value):
+        department = self.context['departments'].get(value)
+        if department is None:
+            raise serializers.ValidationError(f'Invalid pk "{value}" - object does not exist.')
+        return department
+
+
 # ==================== Appointment Serializers ====================
 class AppointmentSerializer(serializers.ModelSerializer):
     """Appointment serializer with detailed information"""
@@ -200,6 +212,7 @@ class AppointmentSerializer(serializers.ModelSerializer):
     doctor_specialty = serializers.CharField(source='doctor.specialty', read_only=True)
     department_name = serializers.CharField(source='department.name', read_only=True)
     eta_minutes = serializers.IntegerField(source='estimated_wait_minutes', read_only=True)
+    eta_p90_minutes = serializers.IntegerField(source='estimated_wait_p90_minutes', read_only=True)
 
     class Meta:
         model = Appointment
@@ -208,7 +221,7 @@ class AppointmentSerializer(serializers.ModelSerializer):
             'doctor', 'doctor_name', 'doctor_specialty',
             'department', 'department_name',
             'appointment_date', 'time_slot', 'status',
-            'token_number', 'queue_position', 'estimated_time', 'eta_minutes',
+            'token_number', 'queue_position', 'estimated_time', 'eta_minutes', 'eta_p90_minutes',
             'reason', 'booking_type', 'is_for_self', 'patient_relation',
             'notes', 'prescription',
             'consultation_started_at', 'consultation_ended_at',
@@ -255,17 +268,14 @@ class AppointmentCreateSerializer(serializers.ModelSerializer):
         
         # Check doctor availability (optional - only if set up)
         day_name = appointment_date.strftime('%A').lower()
-        availability = DoctorAvailability.objects.filter(
-            doctor=doctor,
-            day_of_week=day_name,
-            is_available=True
-        ).first()
+        availability = doctor_availability(doctor.id, day_name)
         
         # Only check availability if it's been set up
-        if availability and availability.start_time and availability.end_time:
-            if not (availability.start_time <= time_slot <= availability.end_time):
+        if availability and availability['start_time'] and availability['end_time']:
+            start_time, end_time = availability['start_time'], availability['end_time']
+            if not (start_time <= time_slot <= end_time):
                 raise serializers.ValidationError(
-                    f"Selected time is outside doctor's available hours ({availability.start_time} - {availability.end_time})."
+                    f"Selected time is outside doctor's available hours ({start_time} - {end_time})."
                 )
         
         return attrs
@@ -313,31 +323,40 @@ class QueueStatusSerializer(serializers.ModelSerializer):
                 "queue_position": ap.queue_position,
                 "status": ap.status,
                 "eta_minutes": ap.estimated_wait_minutes,
+                "eta_p90_minutes": ap.estimated_wait_p90_minutes,
                 "estimated_time": ap.estimated_time.strftime("%H:%M") if ap.estimated_time else None,
             })
 
         return pending_list
 
 
+def _appointment_token(obj):
+    """Token of the visit a record hangs off, whether it is live or archived"""
+    appointment = obj.appointment or obj.archived_appointment
+    return appointment.token_number if appointment else None
+
 
 # ==================== Medical Record Serializers ====================
 class MedicalRecordSerializer(serializers.ModelSerializer):
     """Medical record serializer"""
     patient_name = serializers.CharField(source='patient.full_name', read_only=True)
     doctor_name = serializers.CharField(source='doctor.full_name', read_only=True)
-    appointment_token = serializers.CharField(source='appointment.token_number', read_only=True, allow_null=True)
+    appointment_token = serializers.SerializerMethodField()
 
     class Meta:
         model = MedicalRecord
         fields = [
             'id', 'patient', 'patient_name', 'doctor', 'doctor_name',
-            'appointment', 'appointment_token',
+            'appointment', 'archived_appointment', 'appointment_token',
             'diagnosis', 'symptoms', 'treatment_plan',
             'prescriptions', 'procedures', 'vitals',
             'follow_up_required', 'follow_up_date',
             'notes', 'visit_date', 'created_at'
         ]
-        read_only_fields = ['visit_date', 'created_at']
+        read_only_fields = ['archived_appointment', 'visit_date', 'created_at']
+
+    def get_appointment_token(self, obj):
+        return _appointment_token(obj)
 
 
 # ==================== Family Member Serializers ====================
@@ -392,15 +411,16 @@ class DoctorReviewSerializer(serializers.ModelSerializer):
             "patient",
             "patient_name",
             "appointment",
+            "archived_appointment",
             "rating",
             "comment",
             "created_at"
         ]
-        read_only_fields = ["doctor", "patient", "created_at"]
+        read_only_fields = ["doctor", "patient", "archived_appointment", "created_at"]
 
 
 class NotificationSerializer(serializers.ModelSerializer):
-    appointment_token = serializers.CharField(source='appointment.token_number', read_only=True)
+    appointment_token = serializers.SerializerMethodField()
 
     class Meta:
         model = Notification
@@ -410,6 +430,7 @@ class NotificationSerializer(serializers.ModelSerializer):
             'message',
             'category',
             'appointment',
+            'archived_appointment',
             'appointment_token',
             'data',
             'is_read',
@@ -419,7 +440,22 @@ class NotificationSerializer(serializers.ModelSerializer):
         read_only_fields = [
             'id',
             'appointment',
+            'archived_appointment',
             'appointment_token',
             'created_at',
             'read_at',
         ]
+
+    def get_appointment_token(self, obj):
+        return _appointment_token(obj)
+
+
+class RequestProfileSerializer(serializers.ModelSerializer):
+    """Request profile metadata (the raw stats are downloaded separately)"""
+    class Meta:
+        model = RequestProfile
+        fields = [
+            'id', 'endpoint', 'path', 'method', 'status_code',
+            'user', 'user_role', 'trigger', 'duration_ms',
+            'query_count', 'query_time_ms', 'created_at'
+        ]
@@ -0,0 +1,79 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from .models import User, Department, Doctor, DoctorAvailability, Appointment, QueueStatus
+from .utils.cache import bump_version
+from .utils.ws_auth import forget_user
+from .utils.jwt_claims import mark_claims_stale
+from .utils.token_blacklist import token_blacklisted
+
+# Fields that change often but never appear in the cached payloads
+UNCACHED_DOCTOR_FIELDS = {'average_time_per_patient', 'waiting_time_estimate', 'updated_at'}
+UNCACHED_USER_FIELDS = {'last_login', 'last_login_at', 'updated_at'}
+
+
+def _only_touches(update_fields, fields):
+    return update_fields is not None and set(update_fields) <= fields
+
+
+# ==================== Reference-data cache invalidation ====================
+@receiver([post_save, post_delete], sender=Department)
+def department_changed(sender, instance, **kwargs):
+    bump_version('departments')
+    bump_version('doctors')  # doctors embed their department
+
+
+@receiver([post_save, post_delete], sender=Doctor)
+def doctor_changed(sender, instance, update_fields=None, **kwargs):
+    if _only_touches(update_fields, UNCACHED_DOCTOR_FIELDS):
+        return
+    bump_version('doctors')
+    bump_version('departments')  # doctor_count
+
+
+@receiver([post_save, post_delete], sender=User)
+def doctor_user_changed(sender, instance, update_fields=None, **kwargs):
+    if _only_touches(update_fields, UNCACHED_USER_FIELDS):
+        return
+    if instance.role == 'doctor':
+        bump_version('doctors')
+    bump_version('queue')  # queue payloads embed patient and doctor names
+
+
+@receiver([post_save, post_delete], sender=DoctorAvailability)
+def availability_changed(sender, instance, **kwargs):
+    bump_version('availability')
+    bump_version('doctors')  # doctors embed their availabilities
+
+
+# ==================== Auth caches and token claims ====================
+@receiver([post_save, post_delete], sender=User)
+def auth_user_changed(sender, instance, update_fields=None, **kwargs):
+    if _only_touches(update_fields, UNCACHED_USER_FIELDS):
+        return
+    forget_user(instance.id)  # role or is_active may have changed
+    mark_claims_stale(instance.id)
+
+
+@receiver([post_save, post_delete], sender=Doctor)
+def auth_doctor_changed(sender, instance, update_fields=None, **kwargs):
+    if _only_touches(update_fields, UNCACHED_DOCTOR_FIELDS):
+        return
+    mark_claims_stale(instance.user_id)  # doctor_id claim
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def refresh_token_blacklisted(sender, instance, created, **kwargs):
+    if created:
+        token_blacklisted(instance.token.jti)  # into this worker's Bloom filter, and the others'
+
+
+# ==================== Live queue (conditional GET validators) ====================
+# Appointments are cancelled rather than deleted, and the archiver only removes
+# finished past-day rows, so post_delete is deliberately not hooked here: it
+# would force per-row delete signals on every archive batch.
+@receiver(post_save, sender=Appointment)
+@receiver(post_save, sender=QueueStatus)
+def queue_changed(sender, instance, **kwargs):
+    bump_version('queue')
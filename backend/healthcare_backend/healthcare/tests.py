@@ -1,3 +1,352 @@
-from django.test import TestCase
+import time as clock
+import uuid
+from datetime import time, timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache as backend_cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken, BlacklistedToken
+
+from healthcare.models import (
+    User, Department, Doctor, Appointment, ArchivedAppointment,
+    MedicalRecord, Notification, DoctorReview,
+)
+from healthcare.utils.archiver import archive_appointments, appointment_history
+from healthcare.utils.benchmarking import compare_to_baseline
+from healthcare.routing import websocket_urlpatterns
+from healthcare.utils.cache import cache, bump_version
+from healthcare.utils.eta_refresh import refresh_etas
+from healthcare.utils.jwt_claims import ClaimsRefreshToken
+from healthcare.utils.queue_feed import doctor_group, append_event, publish
+from healthcare.utils.token_blacklist import blacklist_filter, is_blacklisted
+from healthcare.utils.ws_auth import JWTAuthMiddlewareStack
+
+# The websocket half of asgi.application
+websocket_application = JWTAuthMiddlewareStack(URLRouter(websocket_urlpatterns))
+
+
+def make_user(name, role, n):
+    return User.objects.create_user(
+        f'{name}@example.com', 'test-password',
+        username=name, full_name=name.title(), phone=f'+9110000000{n:02d}', role=role,
+    )
+
+
+def make_doctor(department, n=1):
+    return Doctor.objects.create(
+        user=make_user(f'doctor{n}', 'doctor', n), department=department, specialty='General',
+        qualification='MBBS', experience='5 years', license_number=f'LIC-{n}', consultation_fee=500,
+    )
+
+
+def book(doctor, patient, day, slot, status='scheduled', **fields):
+    return Appointment.objects.create(
+        patient=patient, doctor=doctor, department=doctor.department, appointment_date=day,
+        time_slot=slot, status=status, reason='Checkup', booking_type='doctor', **fields
+    )
+
+
+class HospitalTestCase(TestCase):
+    """One department, one doctor and one patient"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.department = Department.objects.create(name='General Medicine', code='GEN', description='OPD')
+        cls.doctor = make_doctor(cls.department)
+        cls.patient = make_user('patient', 'patient', 50)
+        cls.today = timezone.localdate()
+
+    def setUp(self):
+        # Sequence numbers, snapshots and versions outlive the rolled-back rows
+        backend_cache.clear()
+        cache.local.clear()
+
+
+# ============================================================
+#                  ARCHIVING (utils/archiver.py)
+# ============================================================
+
+class ArchiverTests(HospitalTestCase):
+    def test_moves_old_finished_appointments_and_relinks_dependents(self):
+        old = book(self.doctor, self.patient, self.today - timedelta(days=200), time(9, 0), 'completed')
+        recent = book(self.doctor, self.patient, self.today - timedelta(days=10), time(9, 0), 'completed')
+        upcoming = book(self.doctor, self.patient, self.today - timedelta(days=200), time(9, 10), 'scheduled')
+        record = MedicalRecord.objects.create(
+            patient=self.patient, doctor=self.doctor, appointment=old,
+            diagnosis='Flu', symptoms='Fever', treatment_plan='Rest',
+        )
+        notification = Notification.objects.create(
+            user=self.patient, appointment=old, title='Appointment Completed', message='Done'
+        )
+        review = DoctorReview.objects.create(doctor=self.doctor, patient=self.patient, appointment=old, rating=5)
+
+        result = archive_appointments(horizon_days=90)
+
+        self.assertEqual(result['moved'], 1)
+        self.assertFalse(Appointment.objects.filter(id=old.id).exists())
+        self.assertEqual(
+            set(Appointment.objects.values_list('id', flat=True)), {recent.id, upcoming.id}
+        )
+        archived = ArchivedAppointment.objects.get(id=old.id)
+        self.assertEqual(archived.token_number, old.token_number)
+        for dependent in (record, notification, review):
+            dependent.refresh_from_db()
+            self.assertIsNone(dependent.appointment_id)
+            self.assertEqual(dependent.archived_appointment_id, old.id)
+
+        history = list(appointment_history(patient_id=self.patient.id))
+        self.assertEqual([row['id'] for row in history], [recent.id, upcoming.id, old.id])
+        self.assertEqual([row['archived'] for row in history], [False, False, True])
+        self.assertEqual(history[2]['medical_record_id'], record.id)
+
+    def test_rerun_moves_nothing(self):
+        book(self.doctor, self.patient, self.today - timedelta(days=200), time(9, 0), 'no_show')
+        self.assertEqual(archive_appointments(horizon_days=90)['moved'], 1)
+        self.assertEqual(archive_appointments(horizon_days=90)['moved'], 0)
+
+
+# ============================================================
+#                  TOKEN BLACKLIST (utils/token_blacklist.py)
+# ============================================================
+
+class TokenBlacklistTests(HospitalTestCase):
+    def test_blacklisted_refresh_token_is_rejected(self):
+        token = ClaimsRefreshToken.for_user(self.patient)
+        ClaimsRefreshToken(str(token))  # valid until blacklisted
+        token.blacklist()
+        with self.assertRaises(TokenError):
+            ClaimsRefreshToken(str(token))
+
+    def test_filter_answers_unknown_jti_without_a_query(self):
+        an_hour_ago = clock.time() - 3600
+        is_blacklisted(uuid.uuid4().hex, an_hour_ago)  # builds the filter
+        with self.assertNumQueries(0):
+            self.assertFalse(is_blacklisted(uuid.uuid4().hex, an_hour_ago))
+
+    def test_young_token_is_looked_up_even_if_the_filter_missed_it(self):
+        token = ClaimsRefreshToken.for_user(self.patient)
+        token.blacklist()
+        # As on a worker the publish hasn't reached yet
+        with mock.patch.object(blacklist_filter, 'might_contain', return_value=False):
+            self.assertTrue(is_blacklisted(token['jti'], token['iat']))
+            self.assertFalse(is_blacklisted(token['jti'], token['iat'] - 3600))
+
+    def test_purge_deletes_only_expired_tokens(self):
+        expired, live = ClaimsRefreshToken.for_user(self.patient), ClaimsRefreshToken.for_user(self.patient)
+        expired.blacklist()
+        live.blacklist()
+        OutstandingToken.objects.filter(jti=expired['jti']).update(expires_at=timezone.now() - timedelta(days=1))
+
+        call_command('purge_tokens', batch_size=1, pause=0, stdout=StringIO())
+
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), [live['jti']])
+        self.assertEqual(list(BlacklistedToken.objects.values_list('token__jti', flat=True)), [live['jti']])
+
+
+# ============================================================
+#                  CONDITIONAL GET (utils/conditional.py)
+# ============================================================
+
+class ConditionalGetTests(HospitalTestCase):
+    url = '/api/departments/'
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.patient)
+
+    def test_matching_if_none_match_gets_304(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_bump_version_changes_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        bump_version('departments')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_saving_a_department_invalidates(self):
+        etag = self.client.get(self.url)['ETag']
+        self.department.description = 'Outpatients'
+        self.department.save()  # signals.py bumps the namespace
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Outpatients')
+
+
+# ============================================================
+#                  FEED RESUME (consumer.py, utils/queue_feed.py)
+# ============================================================
+
+class QueueFeedResumeTests(HospitalTestCase):
+    async def connect(self, path):
+        communicator = WebsocketCommunicator(websocket_application, path)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def append(self, *payloads):
+        for payload in payloads:
+            await sync_to_async(append_event)(doctor_group(self.doctor.id), 'queue_delta', payload)
+
+    async def test_last_seq_replays_only_the_missed_deltas(self):
+        await self.append({'n': 1}, {'n': 2}, {'n': 3})
+        ws = await self.connect(f'/ws/queue/{self.doctor.id}/?last_seq=1')
+        self.assertEqual(await ws.receive_json_from(), {'type': 'queue_delta', 'seq': 2, 'n': 2})
+        self.assertEqual(await ws.receive_json_from(), {'type': 'queue_delta', 'seq': 3, 'n': 3})
+        self.assertTrue(await ws.receive_nothing())
+        await ws.disconnect()
+
+    @override_settings(QUEUE_FEED_BUFFER_SIZE=2)
+    async def test_gap_larger_than_the_buffer_gets_the_snapshot(self):
+        await self.append({'n': 1}, {'n': 2}, {'n': 3}, {'n': 4})
+        ws = await self.connect(f'/ws/queue/{self.doctor.id}/?last_seq=1')
+        snapshot = await ws.receive_json_from()
+        self.assertEqual((snapshot['type'], snapshot['seq'], snapshot['doctor_id']), ('queue_status', 4, self.doctor.id))
+        self.assertTrue(await ws.receive_nothing())
+        await ws.disconnect()
+
+    async def test_live_gap_is_filled_from_the_buffer(self):
+        ws = await self.connect(f'/ws/queue/{self.doctor.id}/')
+        self.assertEqual((await ws.receive_json_from())['seq'], 0)
+        await self.append({'n': 1})  # buffered, never sent to this socket
+        await sync_to_async(publish)(doctor_group(self.doctor.id), 'queue_delta', {'n': 2})
+        self.assertEqual(await ws.receive_json_from(), {'type': 'queue_delta', 'seq': 1, 'n': 1})
+        self.assertEqual(await ws.receive_json_from(), {'type': 'queue_delta', 'seq': 2, 'n': 2})
+        await ws.disconnect()
+
+    async def test_reset_event_resyncs_from_the_snapshot(self):
+        ws = await self.connect(f'/ws/queue/{self.doctor.id}/')
+        await ws.receive_json_from()
+        await sync_to_async(publish)(doctor_group(self.doctor.id), 'queue_reset', {})
+        self.assertEqual((await ws.receive_json_from())['type'], 'queue_status')
+        await ws.disconnect()
+
+
+# ============================================================
+#                  WEBSOCKET AUTH (consumer.py, utils/ws_auth.py)
+# ============================================================
+
+class AppointmentSocketAuthTests(HospitalTestCase):
+    async def connect(self, user_id, token=None):
+        query = f'?token={token}' if token else ''
+        communicator = WebsocketCommunicator(websocket_application, f'/ws/appointments/{user_id}/{query}')
+        return communicator, await communicator.connect()
+
+    def access_token(self, user):
+        return str(ClaimsRefreshToken.for_user(user).access_token)
+
+    async def test_without_a_token_closes_4401(self):
+        _, (connected, code) = await self.connect(self.patient.id)
+        self.assertFalse(connected)
+        self.assertEqual(code, 4401)
+
+    async def test_invalid_token_closes_4401(self):
+        _, (connected, code) = await self.connect(self.patient.id, 'not-a-jwt')
+        self.assertFalse(connected)
+        self.assertEqual(code, 4401)
+
+    async def test_another_users_stream_closes_4403(self):
+        token = await sync_to_async(self.access_token)(self.doctor.user)
+        _, (connected, code) = await self.connect(self.patient.id, token)
+        self.assertFalse(connected)
+        self.assertEqual(code, 4403)
+
+    async def test_own_stream_connects(self):
+        token = await sync_to_async(self.access_token)(self.patient)
+        ws, (connected, _) = await self.connect(self.patient.id, token)
+        self.assertTrue(connected)
+        self.assertEqual(await ws.receive_json_from(), {'type': 'sync', 'seq': 0})
+        await ws.disconnect()
+
+
+# ============================================================
+#                  ETA REFRESH (utils/eta_refresh.py)
+# ============================================================
+
+@override_settings(ETA_PREDICTOR=False)
+class EtaRefreshTests(HospitalTestCase):
+    def setUp(self):
+        super().setUp()
+        self.now = timezone.localtime().replace(hour=10, minute=0, second=0, microsecond=0)
+        self.finished = book(self.doctor, self.patient, self.today, time(9, 0), 'completed')
+        self.waiting = [
+            book(self.doctor, self.patient, self.today, time(10, 10 * n), status)
+            for n, status in enumerate(['in_progress', 'scheduled', 'confirmed', 'scheduled'])
+        ][1:]
+
+    def refresh(self, now):
+        with CaptureQueriesContext(connection) as queries:
+            result = refresh_etas(now=now, publish=False)
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE')]
+        return result, updates
+
+    def test_only_moved_quotes_are_written(self):
+        result, updates = self.refresh(self.now)
+        self.assertEqual((result['queues'], result['updated']), (1, 3))
+        self.assertEqual(len(updates), 1)  # one bulk_update
+        times = [Appointment.objects.get(id=a.id).estimated_time for a in self.waiting]
+        self.assertEqual(times, [time(10, 10), time(10, 20), time(10, 30)])
+
+        # Same minute: nothing moved, nothing written
+        result, updates = self.refresh(self.now + timedelta(seconds=30))
+        self.assertEqual((result['appointments'], result['updated']), (5, 0))
+        self.assertEqual(updates, [])
+
+        # The clock moved on: every waiting quote moves with it
+        result, _ = self.refresh(self.now + timedelta(minutes=5))
+        self.assertEqual(result['updated'], 3)
+
+    def test_finished_and_in_progress_rows_are_left_alone(self):
+        self.refresh(self.now)
+        for appointment in (self.finished, Appointment.objects.get(status='in_progress')):
+            appointment.refresh_from_db()
+            self.assertIsNone(appointment.estimated_time)
+
+
+# ============================================================
+#                  BENCHMARK BASELINES (utils/benchmarking.py)
+# ============================================================
+
+class CompareToBaselineTests(SimpleTestCase):
+    baseline = {
+        'doctor_dashboard': {'p95_ms': 20.0, 'queries': 6, 'alloc_peak_kb': 200.0},
+        'book_appointment': {'p95_ms': 0.4, 'queries': 12, 'alloc_peak_kb': 40.0},
+    }
+
+    def test_unchanged_run_passes(self):
+        self.assertEqual(compare_to_baseline(self.baseline, self.baseline), {})
+
+    def test_an_extra_query_is_a_regression(self):
+        current = {**self.baseline, 'book_appointment': {**self.baseline['book_appointment'], 'queries': 13}}
+        self.assertEqual(compare_to_baseline(current, self.baseline), {'book_appointment': ['queries 12 -> 13']})
+
+    def test_latency_and_allocations_over_tolerance_regress(self):
+        current = {'doctor_dashboard': {'p95_ms': 30.0, 'queries': 6, 'alloc_peak_kb': 300.0}}
+        self.assertEqual(compare_to_baseline(current, self.baseline), {'doctor_dashboard': [
+            'p95_ms 20.0 -> 30.0 (+50%)', 'alloc_peak_kb 200.0 -> 300.0 (+50%)',
+        ]})
+        self.assertEqual(compare_to_baseline(current, self.baseline, tolerance=0.6), {})
+
+    def test_growth_below_the_noise_floor_passes(self):
+        # +150% on a sub-millisecond flow is timer noise, not a regression
+        current = {'book_appointment': {'p95_ms': 1.0, 'queries': 12, 'alloc_peak_kb': 50.0}}
+        self.assertEqual(compare_to_baseline(current, self.baseline), {})
+
+    def test_flows_missing_from_the_baseline_are_skipped(self):
+        current = {'new_flow': {'p95_ms': 999.0, 'queries': 99, 'alloc_peak_kb': 999.0}}
+        self.assertEqual(compare_to_baseline(current, self.baseline), {})
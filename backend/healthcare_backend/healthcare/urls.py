@@ -11,10 +11,13 @@ from .views import (
     MedicalRecordViewSet,
     FamilyMemberViewSet,
     live_queue_status,
+    queue_stream,
+    department_board_status,
     QueueStatusViewSet,
     get_doctor_reviews,
     add_doctor_review,
     NotificationViewSet,
+    metrics,
 
 )
 router = DefaultRouter()
@@ -35,6 +38,10 @@ router.register(r'notifications', NotificationViewSet, basename='notification')
 
 urlpatterns = [
     path("queue/live/", live_queue_status),
+    path("queue/board/<int:department_id>/", department_board_status, name='queue-board'),
+    path("queue/stream/doctor/<int:object_id>/", queue_stream, {'kind': 'doctor'}, name='queue-stream-doctor'),
+    path("queue/stream/department/<int:object_id>/", queue_stream, {'kind': 'department'}, name='queue-stream-department'),
+    path("metrics/", metrics, name='metrics'),
       path("doctors/<int:doctor_id>/reviews/", get_doctor_reviews),
     path('doctor/<int:doctor_id>/reviews/add/', add_doctor_review, name='doctor-review-add'),
     path('', include(router.urls)),
@@ -0,0 +1,119 @@
+# healthcare/utils/archiver.py
+"""
+Moves finished appointments older than a horizon out of the hot
+`appointments` table into `appointments_archive`, and reads history
+across both tables.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Value, BooleanField, CharField
+from django.db.models.functions import Concat
+from django.utils import timezone
+
+from healthcare.models import (
+    Appointment,
+    ArchivedAppointment,
+    MedicalRecord,
+    Notification,
+    DoctorReview,
+)
+
+logger = logging.getLogger(__name__)
+
+ARCHIVABLE_STATUSES = ['completed', 'cancelled', 'no_show']
+COPIED_FIELDS = [f.attname for f in Appointment._meta.concrete_fields]
+
+HISTORY_FIELDS = [
+    'id', 'patient_id', 'doctor_id', 'department_id',
+    'appointment_date', 'time_slot', 'status', 'token_number',
+    'reason', 'booking_type', 'notes', 'prescription',
+    'consultation_started_at', 'consultation_ended_at', 'created_at',
+]
+
+
+def archive_appointments(horizon_days=None, batch_size=None, max_batches=None, pause=0.0):
+    """
+    Move archivable appointments in primary-key order, one short transaction
+    per batch, so row locks are only held for `batch_size` rows at a time.
+
+    Medical records, notifications and reviews that pointed at a moved row
+    are re-linked to it through `archived_appointment`; the archived row
+    keeps the original id. Returns {"moved": n, "batches": n, "cutoff": date}.
+    """
+    horizon_days = horizon_days or getattr(settings, 'APPOINTMENT_ARCHIVE_HORIZON_DAYS', 90)
+    batch_size = batch_size or getattr(settings, 'APPOINTMENT_ARCHIVE_BATCH_SIZE', 1000)
+    cutoff = timezone.localdate() - timedelta(days=horizon_days)
+
+    candidates = Appointment.objects.filter(
+        appointment_date__lt=cutoff,
+        status__in=ARCHIVABLE_STATUSES
+    ).order_by('id')
+
+    moved = 0
+    batches = 0
+    last_id = 0
+    while max_batches is None or batches < max_batches:
+        ids = list(candidates.filter(id__gt=last_id).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+
+        with transaction.atomic():
+            rows = list(
+                Appointment.objects.select_for_update()
+                .filter(id__in=ids, status__in=ARCHIVABLE_STATUSES)
+                .order_by()
+                .values(*COPIED_FIELDS)
+            )
+            row_ids = [row['id'] for row in rows]
+            ArchivedAppointment.objects.bulk_create(
+                [ArchivedAppointment(**row) for row in rows],
+                ignore_conflicts=True
+            )
+            # Point dependents at the archived row before the live one goes
+            for model in (MedicalRecord, Notification, DoctorReview):
+                linked = model.objects.filter(appointment_id__in=row_ids)
+                linked.update(archived_appointment_id=F('appointment_id'))
+                linked.update(appointment=None)
+            Appointment.objects.filter(id__in=row_ids).delete()
+
+        moved += len(row_ids)
+        batches += 1
+        last_id = ids[-1]
+        logger.debug(f"Archived batch {batches}: {len(row_ids)} appointments (up to id {last_id})")
+        if pause:
+            time.sleep(pause)
+
+    return {"moved": moved, "batches": batches, "cutoff": cutoff}
+
+
+def _history_values(queryset, archived, filters):
+    return queryset.order_by().filter(**filters).annotate(
+        patient_name=F('patient__full_name'),
+        doctor_name=Concat(Value('Dr. '), F('doctor__user__full_name'), output_field=CharField()),
+        department_name=F('department__name'),
+        archived=Value(archived, output_field=BooleanField()),
+        medical_record_id=F('medical_record__id'),
+    ).values(*HISTORY_FIELDS, 'patient_name', 'doctor_name', 'department_name', 'archived', 'medical_record_id')
+
+
+def appointment_history(**filters):
+    """
+    Appointments matching `filters` from both the hot and the archive table,
+    newest first, as a single UNION ALL queryset of dicts (paginate it), with
+    the id of the visit's medical record in either tier.
+    """
+    hot = _history_values(Appointment.objects.all(), False, filters)
+    archived = _history_values(ArchivedAppointment.objects.all(), True, filters)
+    return hot.union(archived, all=True).order_by('-appointment_date', '-time_slot')
+
+
+def count_across_tiers(**filters):
+    """Count appointments matching `filters` in both tables."""
+    return (
+        Appointment.objects.filter(**filters).count()
+        + ArchivedAppointment.objects.filter(**filters).count()
+    )
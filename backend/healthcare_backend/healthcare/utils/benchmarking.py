@@ -0,0 +1,141 @@
+# healthcare/utils/benchmarking.py
+"""
+Shared helpers for the bench_* management commands: latency percentiles,
+query counting, allocation tracking and baseline comparison. Benchmark data
+comes from healthcare.utils.dataset.generate_dataset.
+"""
+import time
+import tracemalloc
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db import connection, connections
+
+
+def require_benchmark_database(action, force=False):
+    """Stop a command that would `action` (e.g. "drop indexes on") a database not marked BENCHMARK_DATABASE."""
+    if not (getattr(settings, 'BENCHMARK_DATABASE', False) or force):
+        raise CommandError(
+            f"Refusing to {action} {connection.settings_dict['NAME']!r}: "
+            "set BENCHMARK_DATABASE=True on a scratch database or pass --force"
+        )
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def summarize(samples):
+    """Return p50/p95/p99/mean (milliseconds) for a list of durations in seconds."""
+    ordered = sorted(s * 1000 for s in samples)
+    return {
+        'runs': len(ordered),
+        'p50_ms': round(percentile(ordered, 50), 3),
+        'p95_ms': round(percentile(ordered, 95), 3),
+        'p99_ms': round(percentile(ordered, 99), 3),
+        'mean_ms': round(sum(ordered) / len(ordered), 3) if ordered else 0.0,
+    }
+
+
+def time_call(fn, repeat=20, warmup=2, setup=None):
+    """
+    Call fn repeatedly and summarize its wall-clock latency. With `setup`,
+    each call is fn(setup(i)) and only fn is timed.
+    """
+    def run(i):
+        if setup is None:
+            return lambda: fn()
+        arg = setup(i)
+        return lambda: fn(arg)
+
+    for i in range(warmup):
+        run(i)()
+    samples = []
+    for i in range(warmup, warmup + repeat):
+        call = run(i)
+        start = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def measure_allocations(fn):
+    """
+    Run fn once under tracemalloc. Returns the peak memory it allocated on
+    top of what was live before (KiB) and the allocation blocks it left live.
+    """
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+    retained = sum(stat.count_diff for stat in after.compare_to(before, 'filename') if stat.count_diff > 0)
+    return {'alloc_peak_kb': round((peak - current) / 1024, 1), 'retained_blocks': retained}
+
+
+@contextmanager
+def count_queries():
+    """
+    Collect the SQL run on any database connection inside the block. Unlike
+    CaptureQueriesContext this survives the query log reset at request start.
+    """
+    statements = []
+
+    def record(execute, sql, params, many, context):
+        statements.append(sql)
+        return execute(sql, params, many, context)
+
+    with ExitStack() as stack:
+        for conn in connections.all():
+            stack.enter_context(conn.execute_wrapper(record))
+        yield statements
+
+
+def print_table(stdout, rows, columns):
+    """Write a fixed-width table of dict rows to a management command's stdout."""
+    widths = {c: max(len(c), *(len(str(r.get(c, ''))) for r in rows)) for c in columns}
+    stdout.write('  '.join(c.ljust(widths[c]) for c in columns))
+    for r in rows:
+        stdout.write('  '.join(str(r.get(c, '')).ljust(widths[c]) for c in columns))
+
+
+# ------------------------------------------------------------
+#  Baselines
+# ------------------------------------------------------------
+
+def compare_to_baseline(current, baseline, tolerance=0.25, min_ms=1.0, min_kb=16.0):
+    """
+    Regressions of `current` against `baseline`, both {name: {p95_ms,
+    queries, alloc_peak_kb, ...}}: any extra query, or p95 latency / peak
+    allocation more than `tolerance` (fraction) above the baseline and by at
+    least min_ms / min_kb so timer noise on fast endpoints doesn't trip it.
+    Returns {name: [reason, ...]} for the regressed entries.
+    """
+    regressions = {}
+    for name, now in current.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        reasons = []
+        if now['queries'] > before['queries']:
+            reasons.append(f"queries {before['queries']} -> {now['queries']}")
+        for key, floor in (('p95_ms', min_ms), ('alloc_peak_kb', min_kb)):
+            if key in before and now[key] > before[key] * (1 + tolerance) and now[key] - before[key] >= floor:
+                reasons.append(f"{key} {before[key]} -> {now[key]} (+{(now[key] / before[key] - 1) * 100:.0f}%)"
+                               if before[key] else f"{key} {before[key]} -> {now[key]}")
+        if reasons:
+            regressions[name] = reasons
+    return regressions
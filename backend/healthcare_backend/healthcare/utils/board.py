@@ -0,0 +1,101 @@
+# healthcare/utils/board.py
+"""
+In-memory department display boards for the WebSocket board consumers.
+
+The first screen of a department in a process loads the board once and
+subscribes to `department_{id}` through the shared GroupFanout; every
+board_row event then updates the in-memory rows and is relayed to all local
+screens of that department. New screens get their initial board from memory,
+so a waiting room full of TVs reconnecting costs no queries.
+"""
+import asyncio
+import logging
+
+from channels.db import database_sync_to_async
+
+from .queue_feed import department_group, department_board
+from .sse import hub, RESYNC
+
+logger = logging.getLogger(__name__)
+
+
+class DepartmentBoard:
+    """Rows of one department's board plus the stream seq they are current to"""
+
+    def __init__(self, department_id):
+        self.department_id = department_id
+        self.rows = {}
+        self.seq = 0
+        self.screens = set()
+        self.task = None
+        self.listener = None
+
+    def load(self, board):
+        self.rows = {row['doctor_id']: row for row in board['rows']}
+        self.seq = board['seq']
+
+    def as_dict(self):
+        return {
+            'department_id': self.department_id,
+            'seq': self.seq,
+            'rows': list(self.rows.values()),
+        }
+
+
+class BoardRegistry:
+    """Process-wide boards, kept only while at least one screen is attached"""
+
+    def __init__(self):
+        self.boards = {}
+        self._lock = asyncio.Lock()
+
+    async def attach(self, department_id, screen):
+        """Register a screen (an object with async send_board_row/send_board) and return its board."""
+        async with self._lock:
+            board = self.boards.get(department_id)
+            if board is None:
+                board = DepartmentBoard(department_id)
+                # Subscribe before loading so no row published meanwhile is lost
+                board.listener = await hub.subscribe(department_group(department_id))
+                board.load(await database_sync_to_async(department_board)(department_id))
+                board.task = asyncio.ensure_future(self._follow(board))
+                self.boards[department_id] = board
+            board.screens.add(screen)
+            return board
+
+    async def detach(self, department_id, screen):
+        async with self._lock:
+            board = self.boards.get(department_id)
+            if board is None:
+                return
+            board.screens.discard(screen)
+            if board.screens:
+                return
+            del self.boards[department_id]
+            board.task.cancel()
+            await hub.unsubscribe(department_group(department_id), board.listener)
+
+    async def _follow(self, board):
+        while True:
+            message = await board.listener.get()
+            if message is not RESYNC and message['seq'] <= board.seq:
+                continue
+            if message is RESYNC or message['seq'] != board.seq + 1:
+                # Missed rows: reload the whole board and repaint every screen
+                board.load(await database_sync_to_async(department_board)(board.department_id))
+                await self._each(board, lambda screen: screen.send_board(board.as_dict()))
+                continue
+            row = message['data']
+            board.rows[row['doctor_id']] = row
+            board.seq = message['seq']
+            await self._each(board, lambda screen: screen.send_board_row(board.seq, row))
+
+    async def _each(self, board, send):
+        for screen in list(board.screens):
+            try:
+                await send(screen)
+            except Exception:
+                logger.warning(f"Board update to a screen of department {board.department_id} failed", exc_info=True)
+
+
+boards = BoardRegistry()
@@ -0,0 +1,377 @@
+# healthcare/utils/cache.py
+"""
+Two-tier, versioned read-through cache.
+
+Tier 1 is a per-process LRU (LocalLRU) with size and TTL eviction; tier 2
+is the configured CACHES backend (Redis). Deletes and version bumps
+publish the touched keys on an invalidation bus so other processes drop
+their tier-1 copies: the channel layer group `cache_invalidation` in
+production, or an in-process stand-in when the layer is in-memory. Plain
+writes don't: other processes may keep an older tier-1 copy of an
+overwritten key for up to LOCAL_CACHE_TTL, so a key that must not be
+served stale is deleted before it is rewritten.
+
+Reference-data keys live in namespaces ('departments', 'doctors',
+'availability') whose version number is part of every key; save/delete
+signals bump the version (healthcare/signals.py), so invalidation never
+has to find old keys and only the small version counters ever need
+cross-process invalidation. Entries carry a soft expiry: once it passes,
+the worker that wins a short lock rebuilds the value while every other
+worker keeps serving the stale one.
+"""
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache as backend_cache
+
+from .metrics import CACHE_REQUESTS, LOCAL_CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+LOCK_TIMEOUT = 10
+COLD_WAIT = 0.5
+COLD_POLL = 0.025
+INVALIDATION_GROUP = 'cache_invalidation'
+_MISSING = object()
+
+
+# ------------------------------------------------------------
+#  Tier 1: in-process LRU
+# ------------------------------------------------------------
+
+class LocalLRU:
+    """Thread-safe LRU with a max entry count and per-entry TTL"""
+
+    def __init__(self, max_entries=None, ttl=None):
+        self.max_entries = max_entries or getattr(settings, 'LOCAL_CACHE_MAX_ENTRIES', 10000)
+        self.ttl = ttl or getattr(settings, 'LOCAL_CACHE_TTL', 30)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return _MISSING
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        ttl = self.ttl if timeout is None else min(timeout, self.ttl)
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+# ------------------------------------------------------------
+#  Invalidation bus
+# ------------------------------------------------------------
+
+class LocalInvalidationBus:
+    """In-process stand-in: delivers invalidations to every subscriber in this process"""
+
+    def __init__(self):
+        self.subscribers = []
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def publish(self, origin, keys):
+        for callback in self.subscribers:
+            callback(origin, keys)
+
+
+class ChannelLayerInvalidationBus:
+    """
+    Fan invalidations out through the channel layer. Each process listens on
+    its own channel from a daemon thread with a private event loop and a
+    dedicated layer instance (a layer only receives on one loop).
+    """
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+        self.subscribers = []
+        self._listener = None
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+        if self._listener is None:
+            self._listener = threading.Thread(target=self._listen, name='cache-invalidation', daemon=True)
+            self._listener.start()
+
+    def publish(self, origin, keys):
+        from channels.layers import get_channel_layer
+
+        message = {'type': 'cache.invalidate', 'origin': origin, 'keys': list(keys)}
+        layer = get_channel_layer(self.alias)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        try:
+            if loop is not None:
+                loop.create_task(layer.group_send(INVALIDATION_GROUP, message))
+            else:
+                async_to_sync(layer.group_send)(INVALIDATION_GROUP, message)
+        except Exception:
+            # Tier-1 TTL bounds the staleness if a message is lost
+            logger.warning("Could not publish cache invalidation", exc_info=True)
+
+    def _listen(self):
+        asyncio.run(self._receive_forever())
+
+    async def _receive_forever(self):
+        from channels.layers import channel_layers
+
+        layer = channel_layers.make_backend(self.alias)
+        channel = await layer.new_channel()
+        refresh_every = getattr(layer, 'group_expiry', 86400) / 2
+        joined_at = 0
+        while True:
+            try:
+                if time.monotonic() - joined_at > refresh_every:
+                    await layer.group_add(INVALIDATION_GROUP, channel)
+                    joined_at = time.monotonic()
+                message = await layer.receive(channel)
+                for callback in self.subscribers:
+                    callback(message['origin'], message['keys'])
+            except Exception:
+                logger.warning("Cache invalidation listener error", exc_info=True)
+                joined_at = 0
+                await asyncio.sleep(1)
+
+
+def make_invalidation_bus():
+    kind = getattr(settings, 'CACHE_INVALIDATION_BUS', 'channels')
+    layer_backend = settings.CHANNEL_LAYERS.get('default', {}).get('BACKEND', '')
+    if kind == 'local' or layer_backend.endswith('InMemoryChannelLayer'):
+        return LocalInvalidationBus()
+    return ChannelLayerInvalidationBus()
+
+
+# ------------------------------------------------------------
+#  Two-tier cache
+# ------------------------------------------------------------
+
+class TwoTierCache:
+    """LocalLRU in front of a Django cache backend, kept coherent over a bus"""
+
+    def __init__(self, backend, local=None, bus=None):
+        self.backend = backend
+        self.local = local or LocalLRU()
+        self.origin = uuid.uuid4().hex
+        self._bus = bus
+
+    @property
+    def bus(self):
+        if self._bus is None:
+            self._bus = make_invalidation_bus()
+            self._bus.subscribe(self._on_invalidate)
+        return self._bus
+
+    def _on_invalidate(self, origin, keys):
+        if origin != self.origin:
+            self.local.delete(*keys)
+
+    def _publish(self, *keys):
+        self.bus.publish(self.origin, keys)
+
+    def get(self, key, default=None):
+        value = self.get_many([key]).get(key, _MISSING)
+        return default if value is _MISSING else value
+
+    def get_many(self, keys):
+        found = {}
+        remote = []
+        for key in keys:
+            value = self.local.get(key)
+            if value is _MISSING:
+                remote.append(key)
+            else:
+                found[key] = value
+        if found:
+            LOCAL_CACHE_REQUESTS.inc(len(found), tier='local')
+        if remote:
+            self.bus  # make sure this process listens before relying on tier 1
+            fetched = self.backend.get_many(remote)
+            for key, value in fetched.items():
+                self.local.set(key, value)
+            found.update(fetched)
+            if fetched:
+                LOCAL_CACHE_REQUESTS.inc(len(fetched), tier='backend')
+            if len(fetched) < len(remote):
+                LOCAL_CACHE_REQUESTS.inc(len(remote) - len(fetched), tier='miss')
+        return found
+
+    def set(self, key, value, timeout=None):
+        self.backend.set(key, value, timeout)
+        self.local.set(key, value, timeout)
+
+    def delete(self, key):
+        self.backend.delete(key)
+        self.local.delete(key)
+        self._publish(key)
+
+    def add(self, key, value, timeout=None):
+        added = self.backend.add(key, value, timeout)
+        if added:
+            self.local.delete(key)
+        return added
+
+    def incr(self, key, delta=1):
+        value = self.backend.incr(key, delta)
+        self.local.set(key, value)
+        return value
+
+
+cache = TwoTierCache(backend_cache)
+
+
+def _version_key(namespace):
+    return f'nsver:{namespace}'
+
+
+def _modified_key(namespace):
+    return f'nsmod:{namespace}'
+
+
+def _initial_version():
+    # Start from the clock rather than 1 so a version lost to eviction never
+    # repeats an old one (ETags and versioned keys are built from it)
+    return int(time.time() * 1000)
+
+
+def get_version(namespace):
+    version = cache.get(_version_key(namespace))
+    if version is None:
+        cache.add(_version_key(namespace), _initial_version(), timeout=None)
+        version = cache.get(_version_key(namespace)) or _initial_version()
+    return version
+
+
+def bump_version(namespace):
+    """Invalidate every key of a namespace at once."""
+    cache.set(_modified_key(namespace), time.time(), None)
+    try:
+        version = cache.incr(_version_key(namespace))
+    except ValueError:
+        cache.add(_version_key(namespace), _initial_version(), timeout=None)
+        version = cache.incr(_version_key(namespace))
+    cache._publish(_modified_key(namespace), _version_key(namespace))
+    return version
+
+
+def namespace_state(namespaces):
+    """
+    (versions, last_modified) for several namespaces in one cache round
+    trip: the version numbers in the given order and the newest bump time.
+    """
+    keys = [_version_key(ns) for ns in namespaces] + [_modified_key(ns) for ns in namespaces]
+    found = cache.get_many(keys)
+    versions = []
+    for ns in namespaces:
+        version = found.get(_version_key(ns))
+        versions.append(version if version is not None else get_version(ns))
+    modified = [found.get(_modified_key(ns)) for ns in namespaces]
+    if None in modified:
+        # Never bumped (or evicted): treat "now" as the last change from here on
+        now = time.time()
+        for ns, value in zip(namespaces, modified):
+            if value is None:
+                cache.add(_modified_key(ns), now, None)
+        modified = [cache.get(_modified_key(ns)) or now for ns in namespaces]
+    return versions, max(modified)
+
+
+def versioned_key(namespace, key):
+    return f'{namespace}:v{get_version(namespace)}:{key}'
+
+
+def _rebuild(full_key, lock_key, builder, ttl):
+    try:
+        value = builder()
+        stale_grace = getattr(settings, 'REFERENCE_CACHE_STALE_GRACE', 300)
+        cache.set(full_key, (value, time.time() + ttl), ttl + stale_grace)
+        return value
+    finally:
+        backend_cache.delete(lock_key)
+
+
+def cached(namespace, key, builder, ttl=None):
+    """
+    Return the cached value for (namespace, key), calling builder() to
+    produce it on a miss. None is a valid cached value.
+    """
+    ttl = ttl or getattr(settings, 'REFERENCE_CACHE_TTL', 300)
+    full_key = versioned_key(namespace, key)
+    lock_key = f'lock:{full_key}'
+
+    entry = cache.get(full_key)
+    if entry is not None:
+        value, fresh_until = entry
+        if time.time() < fresh_until:
+            CACHE_REQUESTS.inc(namespace=namespace, result='hit')
+            return value
+        if not backend_cache.add(lock_key, 1, LOCK_TIMEOUT):
+            # Someone else is rebuilding; the stale value is good enough meanwhile
+            CACHE_REQUESTS.inc(namespace=namespace, result='stale')
+            return value
+        CACHE_REQUESTS.inc(namespace=namespace, result='miss')
+        return _rebuild(full_key, lock_key, builder, ttl)
+
+    CACHE_REQUESTS.inc(namespace=namespace, result='miss')
+    if not backend_cache.add(lock_key, 1, LOCK_TIMEOUT):
+        # Cold key with a rebuild in flight: wait briefly for it instead of piling on
+        deadline = time.monotonic() + COLD_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(COLD_POLL)
+            entry = cache.get(full_key)
+            if entry is not None:
+                return entry[0]
+        return builder()
+    return _rebuild(full_key, lock_key, builder, ttl)
+
+
+# ------------------------------------------------------------
+#  Cached lookups
+# ------------------------------------------------------------
+
+def doctor_availability(doctor_id, day_of_week):
+    """
+    The doctor's active availability window for a weekday as a dict with
+    start_time, end_time and max_appointments, or None if none is set up.
+    """
+    from healthcare.models import DoctorAvailability
+
+    def build():
+        return DoctorAvailability.objects.filter(
+            doctor_id=doctor_id,
+            day_of_week=day_of_week,
+            is_available=True
+        ).values('start_time', 'end_time', 'max_appointments').first()
+
+    return cached('availability', f'{doctor_id}:{day_of_week}', build)
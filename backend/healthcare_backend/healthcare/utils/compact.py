@@ -0,0 +1,90 @@
+# healthcare/utils/compact.py
+"""
+Compact binary queue protocol (WebSocket subprotocol `queue.msgpack.v1`).
+
+Frames are MessagePack arrays with positional fields instead of JSON
+objects with repeated key names:
+
+    snapshot  [0, seq, doctor_id, token_prefix, current_token,
+               total_tokens, completed_tokens, [entry, ...]]
+    delta     [1, seq, [current_token, total_tokens, completed_tokens],
+               [entry, ...], [removed_token, ...]]
+
+    entry     [token, patient_name, status, queue_position,
+               eta_minutes, estimated_minute, eta_p90_minutes]
+
+Header fields that did not change are nil. `status` is an index into
+STATUSES, `estimated_minute` is minutes after midnight (nil if unknown) and a
+token that starts with the snapshot's `token_prefix` (e.g. "CARD-20251019-")
+is sent as its integer suffix. A client applies deltas in seq order and
+asks for a new snapshot (any binary frame) when it sees a gap. eta_p90_minutes
+was appended later, so readers that index entries by position still work.
+"""
+import msgpack
+
+SUBPROTOCOL = 'queue.msgpack.v1'
+SNAPSHOT, DELTA = 0, 1
+STATUSES = ('scheduled', 'confirmed', 'in_progress', 'waiting', 'completed', 'cancelled', 'no_show')
+_STATUS_INDEX = {s: i for i, s in enumerate(STATUSES)}
+
+
+def token_prefix(snapshot):
+    """Common 'DEPT-YYYYMMDD-' prefix of the day's tokens, or ''."""
+    for entry in snapshot['queue']:
+        head, sep, tail = entry['token_number'].rpartition('-')
+        if sep and tail.isdigit():
+            return head + sep
+    return ''
+
+
+def _token(token, prefix):
+    if prefix and token and token.startswith(prefix) and token[len(prefix):].isdigit():
+        return int(token[len(prefix):])
+    return token
+
+
+def _entry(e, prefix):
+    at = e['estimated_time']
+    return [
+        _token(e['token_number'], prefix),
+        e['patient_name'],
+        _STATUS_INDEX.get(e['status'], e['status']),
+        e['queue_position'],
+        e['eta_minutes'],
+        int(at[:2]) * 60 + int(at[3:5]) if at else None,
+        e.get('eta_p90_minutes'),
+    ]
+
+
+def encode_snapshot(snapshot):
+    prefix = token_prefix(snapshot)
+    return msgpack.packb([
+        SNAPSHOT,
+        snapshot['seq'],
+        snapshot['doctor_id'],
+        prefix,
+        _token(snapshot['current_token'], prefix),
+        snapshot['total_tokens'],
+        snapshot['completed_tokens'],
+        [_entry(e, prefix) for e in snapshot['queue']],
+    ])
+
+
+def encode_delta(seq, delta, prefix):
+    """`prefix` must be the one the client got with its last snapshot."""
+    header = delta.get('header', {})
+    return msgpack.packb([
+        DELTA,
+        seq,
+        [
+            _token(header['current_token'], prefix) if 'current_token' in header else None,
+            header.get('total_tokens'),
+            header.get('completed_tokens'),
+        ],
+        [_entry(e, prefix) for e in delta.get('upsert', ())],
+        [_token(t, prefix) for t in delta.get('remove', ())],
+    ])
+
+
+def decode(frame):
+    return msgpack.unpackb(frame)
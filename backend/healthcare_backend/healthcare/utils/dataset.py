@@ -0,0 +1,532 @@
+# healthcare/utils/dataset.py
+"""
+Seeded synthetic hospital for measuring the performance work at production
+scale: departments, doctors with weekly availability, patients, months of
+appointments with a realistic status mix and consultation durations, and
+the medical records, reviews and notifications that follow from them.
+
+Everything is drawn with NumPy from streams seeded by (seed, table, chunk)
+so a given seed always produces the same hospital, whatever the insert
+batch size. Rows get explicit primary keys above the current maximum so
+foreign keys are known without reading anything back, and are written with
+executemany() in short transactions; sequences are reset afterwards.
+Generated users share the @dataset.local domain, which flush_dataset()
+uses to remove them and everything hanging off them.
+"""
+import itertools
+import json
+import logging
+import time
+from datetime import datetime, time as dtime
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+from healthcare.models import (
+    User, Department, Doctor, DoctorAvailability, Appointment, ArchivedAppointment,
+    MedicalRecord, DoctorReview, Notification, QueueStatus, FamilyMember, RequestProfile,
+)
+
+logger = logging.getLogger(__name__)
+
+DATASET_EMAIL_DOMAIN = 'dataset.local'
+DATASET_PASSWORD = 'dataset-password'
+# Rows drawn per random stream; fixed so the output doesn't depend on batch_size
+CHUNK = 100_000
+
+# code, name, description, icon, share of appointments, mean consultation minutes
+DEPARTMENTS = [
+    ('GEN', 'General Medicine', 'General health and wellness', 'fas fa-stethoscope', 0.25, 9),
+    ('PED', 'Pediatrics', "Children's healthcare", 'fas fa-child', 0.12, 10),
+    ('ORTHO', 'Orthopedics', 'Bone, joint, and muscle care', 'fas fa-bone', 0.10, 12),
+    ('CARD', 'Cardiology', 'Heart and cardiovascular system care', 'fas fa-heartbeat', 0.09, 15),
+    ('DERM', 'Dermatology', 'Skin, hair, and nail care', 'fas fa-hand-paper', 0.08, 8),
+    ('ENT', 'ENT', 'Ear, nose and throat', 'fas fa-head-side-cough', 0.07, 9),
+    ('GYN', 'Gynecology', "Women's reproductive health", 'fas fa-venus', 0.07, 14),
+    ('OPHTH', 'Ophthalmology', 'Eye care', 'fas fa-eye', 0.06, 10),
+    ('NEURO', 'Neurology', 'Brain and nervous system disorders', 'fas fa-brain', 0.05, 18),
+    ('URO', 'Urology', 'Urinary tract care', 'fas fa-procedures', 0.04, 12),
+    ('PSY', 'Psychiatry', 'Mental health', 'fas fa-comments', 0.04, 30),
+    ('ONCO', 'Oncology', 'Cancer care', 'fas fa-ribbon', 0.03, 22),
+]
+# diagnosis, symptoms, treatment plan
+CONDITIONS = [
+    ('Viral fever', 'Fever, body ache, fatigue', 'Rest, fluids, paracetamol'),
+    ('Hypertension', 'Headache, dizziness', 'Amlodipine, low-salt diet, review in 4 weeks'),
+    ('Type 2 diabetes', 'Polyuria, fatigue', 'Metformin, diet plan, HbA1c in 3 months'),
+    ('Lower back pain', 'Back stiffness, pain on bending', 'Physiotherapy, NSAIDs'),
+    ('Allergic rhinitis', 'Sneezing, nasal congestion', 'Antihistamines, nasal spray'),
+    ('Gastritis', 'Epigastric pain, bloating', 'Pantoprazole, avoid spicy food'),
+    ('Migraine', 'Throbbing headache, photophobia', 'Triptans, sleep hygiene'),
+    ('Contact dermatitis', 'Itchy rash', 'Topical steroid, avoid irritant'),
+    ('Anxiety disorder', 'Restlessness, poor sleep', 'CBT referral, follow-up in 2 weeks'),
+    ('Osteoarthritis knee', 'Knee pain, swelling', 'Weight loss, exercises, analgesics'),
+]
+MEDICINES = ['Paracetamol 500mg', 'Amlodipine 5mg', 'Metformin 500mg', 'Cetirizine 10mg',
+             'Pantoprazole 40mg', 'Ibuprofen 400mg', 'Amoxicillin 500mg', 'Vitamin D3 60K']
+PRESCRIPTIONS = [json.dumps([{'name': m, 'dosage': 'twice daily', 'days': 5}]) for m in MEDICINES]
+FIRST_NAMES = ['Aarav', 'Vivaan', 'Aditya', 'Vihaan', 'Arjun', 'Sai', 'Reyansh', 'Krishna',
+               'Ishaan', 'Rohan', 'Ananya', 'Diya', 'Saanvi', 'Aadhya', 'Pari', 'Anika',
+               'Navya', 'Myra', 'Sara', 'Meera', 'Kavya', 'Priya', 'Neha', 'Rahul']
+LAST_NAMES = ['Sharma', 'Verma', 'Gupta', 'Patel', 'Singh', 'Kumar', 'Reddy', 'Nair',
+              'Iyer', 'Das', 'Joshi', 'Mehta', 'Rao', 'Chopra', 'Bose', 'Khan', 'Trivedi']
+CITIES = ['Mumbai', 'Delhi', 'Bengaluru', 'Hyderabad', 'Ahmedabad', 'Chennai', 'Kolkata', 'Pune']
+BLOOD_GROUPS = ['O+', 'B+', 'A+', 'AB+', 'O-', 'B-', 'A-', 'AB-']
+BLOOD_GROUP_SHARE = [0.37, 0.32, 0.22, 0.05, 0.015, 0.01, 0.01, 0.005]
+REVIEW_COMMENTS = ['', '', 'Very helpful', 'Explained everything clearly', 'Long wait but good care',
+                   'Would recommend', 'Quick consultation', 'Not satisfied with the wait']
+DAYS = [day for day, _ in DoctorAvailability.DAY_CHOICES]  # monday first, like date.weekday()
+STATUSES = np.array(['scheduled', 'confirmed', 'in_progress', 'completed', 'cancelled', 'no_show'])
+SCHEDULED, CONFIRMED, IN_PROGRESS, COMPLETED, CANCELLED, NO_SHOW = range(6)
+# (start minute, end minute, share of doctors)
+SHIFTS = [(9 * 60, 13 * 60, 0.6), (14 * 60, 18 * 60, 0.3), (17 * 60, 21 * 60, 0.1)]
+# Days a booking for a full doctor-day moves forward before it is dropped
+MAX_SPILL_DAYS = 30
+SLOT_TIMES = np.array([f'{m // 60:02d}:{m % 60:02d}:00' for m in range(0, 24 * 60, 10)], dtype=object)
+
+
+def _rng(seed, stream, chunk=0):
+    return np.random.default_rng([seed, stream, chunk])
+
+
+def _next_id(model):
+    return (model.objects.aggregate(top=Max('pk'))['top'] or 0) + 1
+
+
+def _pick(rng, values, n, p=None):
+    return np.asarray(values, dtype=object)[rng.choice(len(values), n, p=p)]
+
+
+def _next_working_day(days, doc, working):
+    """Each day moved forward onto its doctor's next working day (unchanged if it is one)."""
+    days = days.copy()
+    for _ in range(7):
+        weekday = (days.astype('datetime64[D]').view('int64') - 4) % 7  # 1970-01-01 was a Thursday
+        off = ~working[doc, weekday]
+        if not off.any():
+            break
+        days[off] += np.timedelta64(1, 'D')
+    return days
+
+
+def _take_slots(cells, booked):
+    """
+    How many bookings each doctor-day cell already had when each of these
+    arrived, in order (first come, first served); counts them into `booked`.
+    """
+    order = np.argsort(cells, kind='stable')
+    ordered = cells[order]
+    starts = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]])
+    sizes = np.diff(np.r_[starts, len(ordered)])
+    rank = np.empty(len(cells), dtype=np.int64)
+    rank[order] = np.arange(len(ordered)) - np.repeat(starts, sizes)
+    taken = booked[cells] + rank
+    np.add.at(booked, cells, 1)
+    return taken
+
+
+def _insert(model, columns, count, batch_size):
+    """
+    INSERT `count` rows into model's table. `columns` maps attnames to
+    sequences (or NumPy arrays) of database-ready values; other columns get
+    the field default, timestamps get now.
+    """
+    now = timezone.now()
+    fields = model._meta.concrete_fields
+    values = []
+    for field in fields:
+        if field.attname in columns:
+            column = columns[field.attname]
+            if isinstance(column, np.ndarray):
+                column = (_sql_temporal(column) if column.dtype.kind == 'M' else column).tolist()
+            values.append(column)
+        else:
+            auto = getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+            default = field.get_db_prep_save(now if auto else field.get_default(), connection)
+            values.append(itertools.repeat(default, count))
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(model._meta.db_table),
+        ', '.join(quote(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields)),
+    )
+    rows = zip(*values)
+    with connection.cursor() as cursor:
+        while True:
+            batch = list(itertools.islice(rows, batch_size))
+            if not batch:
+                break
+            with transaction.atomic():
+                cursor.executemany(sql, batch)
+
+
+def _sql_temporal(values):
+    """
+    datetime64 values as the 'YYYY-MM-DD[ HH:MM:SS]' literals every backend
+    accepts (naive UTC, as Django stores with USE_TZ), NaT as None. Formatting
+    in NumPy instead of per value through connection.ops is most of the
+    difference at ten million rows.
+    """
+    text = np.datetime_as_string(values)
+    if values.dtype != np.dtype('datetime64[D]'):
+        chars = text.view(np.uint32).reshape(len(text), -1)
+        chars[:, 10] = ord(' ')  # ISO 'T' separator; SQLite compares these as text
+    return np.where(np.isnat(values), None, text.astype(object))
+
+
+def _utc(days, minutes, tz):
+    """Local (day, minute of day) pairs as naive UTC datetime64[s], as stored with USE_TZ."""
+    unique, inverse = np.unique(days, return_inverse=True)
+    offsets = np.array([
+        tz.utcoffset(datetime.combine(day, dtime(12))).total_seconds() // 60 for day in unique.tolist()
+    ], dtype=np.int64)
+    local = days.astype('datetime64[m]') + minutes.astype('timedelta64[m]')
+    return (local - offsets[inverse].astype('timedelta64[m]')).astype('datetime64[s]')
+
+
+class _Progress:
+    def __init__(self, stdout):
+        self.stdout = stdout
+        self.started = time.perf_counter()
+
+    def __call__(self, message):
+        if self.stdout:
+            self.stdout.write(f'  [{time.perf_counter() - self.started:7.1f}s] {message}')
+
+
+def generate_dataset(patients=100_000, doctors=500, appointments=1_000_000, months=6, seed=42,
+                     departments=len(DEPARTMENTS), record_rate=0.6, review_rate=0.08,
+                     notification_rate=1.0, batch_size=5000, stdout=None):
+    """
+    Generate and insert a synthetic hospital. Returns a dict of row counts
+    per table plus the elapsed seconds. Every slot is booked at most once, so
+    bookings that find a doctor fully booked for a month are dropped and
+    `appointments` is an upper bound.
+    """
+    if User.objects.filter(email__endswith=f'@{DATASET_EMAIL_DOMAIN}').exists():
+        raise ValueError('A generated dataset already exists; flush it first')
+    progress = _Progress(stdout)
+    began = time.perf_counter()
+    tz = timezone.get_current_timezone()
+    today = timezone.localdate()
+    now_local = timezone.localtime()
+    now_minute = now_local.hour * 60 + now_local.minute
+    now_utc = np.datetime64(timezone.now().replace(tzinfo=None), 's')
+    password = make_password(DATASET_PASSWORD)
+    counts = {}
+
+    # ---- Departments
+    spec = DEPARTMENTS[:departments]
+    dept_ids = np.array([
+        Department.objects.get_or_create(
+            code=code, defaults={'name': name, 'description': description, 'icon': icon}
+        )[0].id
+        for code, name, description, icon, _, _ in spec
+    ])
+    dept_share = np.array([row[4] for row in spec])
+    dept_share /= dept_share.sum()
+    dept_minutes = np.array([row[5] for row in spec], dtype=float)
+    dept_names = [row[1] for row in spec]
+
+    # ---- Doctors, their users and weekly availability
+    rng = _rng(seed, 1)
+    user_id = _next_id(User)
+    doc_user_ids = np.arange(user_id, user_id + doctors)
+    doc_ids = np.arange(_next_id(Doctor), _next_id(Doctor) + doctors)
+    doc_dept = rng.choice(len(spec), doctors, p=dept_share)
+    shift = rng.choice(len(SHIFTS), doctors, p=[s[2] for s in SHIFTS])
+    shift_start = np.array([s[0] for s in SHIFTS])[shift]
+    shift_slots = (np.array([s[1] - s[0] for s in SHIFTS])[shift]) // 10
+    # Sunday off for everyone, plus one more weekday for about half of them
+    working = np.ones((doctors, 7), dtype=bool)
+    working[:, 6] = False
+    five_day = rng.random(doctors) < 0.5
+    working[np.flatnonzero(five_day), rng.integers(0, 6, five_day.sum())] = False
+    popularity = rng.lognormal(0, 0.6, doctors)
+    quality = rng.normal(0, 0.35, doctors)
+    doc_names = [
+        f'Dr. {first} {last}'
+        for first, last in zip(_pick(rng, FIRST_NAMES, doctors), _pick(rng, LAST_NAMES, doctors))
+    ]
+
+    _insert(User, {
+        'id': doc_user_ids,
+        'password': itertools.repeat(password),
+        'email': [f'gen-doc-{i}@{DATASET_EMAIL_DOMAIN}' for i in range(doctors)],
+        'username': [f'gen-doc-{i}' for i in range(doctors)],
+        'full_name': doc_names,
+        'phone': [f'+5{i:011d}' for i in range(doctors)],
+        'gender': _pick(rng, ['male', 'female'], doctors),
+        'address': _pick(rng, CITIES, doctors),
+        'role': itertools.repeat('doctor'),
+        'is_verified': itertools.repeat(True),
+    }, doctors, batch_size)
+    _insert(Doctor, {
+        'id': doc_ids,
+        'user_id': doc_user_ids,
+        'department_id': dept_ids[doc_dept],
+        'specialty': [dept_names[d] for d in doc_dept],
+        'qualification': _pick(rng, ['MBBS', 'MBBS, MD', 'MBBS, MS', 'MBBS, DNB'], doctors),
+        'experience': [f'{years} years' for years in rng.integers(2, 35, doctors)],
+        'license_number': [f'GEN-LIC-{i:07d}' for i in range(doctors)],
+        'consultation_fee': _pick(rng, [300, 500, 800, 1000, 1500], doctors, p=[.3, .35, .2, .1, .05]),
+        'is_verified': itertools.repeat(True),
+        'average_time_per_patient': dept_minutes[doc_dept],
+    }, doctors, batch_size)
+    slot_doc, slot_day = np.nonzero(working)
+    _insert(DoctorAvailability, {
+        'doctor_id': doc_ids[slot_doc],
+        'day_of_week': [DAYS[d] for d in slot_day],
+        'start_time': SLOT_TIMES[shift_start[slot_doc] // 10],
+        'end_time': SLOT_TIMES[(shift_start[slot_doc] + shift_slots[slot_doc] * 10) // 10 % len(SLOT_TIMES)],
+        'max_appointments': np.maximum(10, shift_slots[slot_doc] * 10 // dept_minutes[doc_dept[slot_doc]].astype(int)),
+    }, len(slot_doc), batch_size)
+    counts.update(doctors=doctors, availabilities=len(slot_doc))
+    progress(f'{doctors} doctors in {len(spec)} departments')
+
+    # ---- Patients; a few visit often, most rarely
+    patient_ids = np.arange(_next_id(User), _next_id(User) + patients)
+    activity = np.empty(patients)
+    for chunk, first in enumerate(range(0, patients, CHUNK)):
+        rng = _rng(seed, 2, chunk)
+        n = min(CHUNK, patients - first)
+        index = range(first, first + n)
+        activity[first:first + n] = rng.gamma(0.6, 1.0, n)
+        age_days = (rng.gamma(2.2, 14, n).clip(0, 95) * 365.25).astype('timedelta64[D]')
+        _insert(User, {
+            'id': patient_ids[first:first + n],
+            'password': itertools.repeat(password),
+            'email': [f'gen-pat-{i}@{DATASET_EMAIL_DOMAIN}' for i in index],
+            'username': [f'gen-pat-{i}' for i in index],
+            'full_name': [f'{a} {b}' for a, b in zip(_pick(rng, FIRST_NAMES, n), _pick(rng, LAST_NAMES, n))],
+            'phone': [f'+6{i:011d}' for i in index],
+            'date_of_birth': np.datetime64(today, 'D') - age_days,
+            'gender': _pick(rng, ['male', 'female', 'other'], n, p=[.49, .49, .02]),
+            'address': _pick(rng, CITIES, n),
+            'blood_group': _pick(rng, BLOOD_GROUPS, n, p=BLOOD_GROUP_SHARE),
+            'role': itertools.repeat('patient'),
+        }, n, batch_size)
+        progress(f'{first + n}/{patients} patients')
+    counts['patients'] = patients
+    doctor_cdf = np.cumsum(popularity) / popularity.sum()
+    patient_cdf = np.cumsum(activity) / activity.sum()
+
+    # ---- Appointments and what follows from them
+    first_day = np.datetime64(today, 'D') - np.timedelta64(months * 30, 'D')
+    span = months * 30 + 14  # two weeks of bookings ahead
+    appt_ids = np.arange(_next_id(Appointment), _next_id(Appointment) + appointments)
+    # One booking per slot: the k-th booking of a doctor-day gets the k-th slot of
+    # the doctor's own slot order, rotated per day; a full day spills to the next
+    rng = _rng(seed, 4)
+    max_slots = int(shift_slots.max())
+    slot_order = np.zeros((doctors, max_slots), dtype=np.int64)
+    for d in range(doctors):
+        slot_order[d, :shift_slots[d]] = rng.permutation(shift_slots[d])
+    day_offset = rng.integers(0, max_slots, doctors * span)
+    booked = np.zeros(doctors * span, dtype=np.int64)
+    record_id, review_id, notification_id = _next_id(MedicalRecord), _next_id(DoctorReview), _next_id(Notification)
+    rating_sum, rating_count = np.zeros(doctors), np.zeros(doctors)
+    minutes_sum, minutes_count = np.zeros(doctors), np.zeros(doctors)
+    counts.update(appointments=0, records=0, reviews=0, notifications=0)
+
+    for chunk, first in enumerate(range(0, appointments, CHUNK)):
+        rng = _rng(seed, 3, chunk)
+        n = min(CHUNK, appointments - first)
+        ids = appt_ids[first:first + n]
+        doc = np.minimum(np.searchsorted(doctor_cdf, rng.random(n)), doctors - 1)
+        patient = patient_ids[np.minimum(np.searchsorted(patient_cdf, rng.random(n)), patients - 1)]
+        days = _next_working_day(first_day + rng.integers(0, span, n).astype('timedelta64[D]'), doc, working)
+
+        taken = np.full(n, -1)
+        pending = np.arange(n)
+        for _ in range(MAX_SPILL_DAYS):
+            pending = pending[days[pending] < first_day + span]
+            if not len(pending):
+                break
+            day_index = (days[pending] - first_day).astype(np.int64)
+            rank = _take_slots(doc[pending] * span + day_index, booked)
+            fits = rank < shift_slots[doc[pending]]
+            taken[pending[fits]] = rank[fits]
+            pending = pending[~fits]
+            days[pending] = _next_working_day(days[pending] + np.timedelta64(1, 'D'), doc[pending], working)
+        # Bookings that found no free slot in the span are dropped
+        keep = taken >= 0
+        ids, doc, patient, days, taken = ids[keep], doc[keep], patient[keep], days[keep], taken[keep]
+        n = len(ids)
+        day_index = (days - first_day).astype(np.int64)
+        slot_index = slot_order[doc, (taken + day_offset[doc * span + day_index]) % shift_slots[doc]]
+        slot_minute = shift_start[doc] + slot_index * 10
+
+        sigma = 0.45
+        duration = rng.lognormal(np.log(dept_minutes[doc_dept[doc]]) - sigma ** 2 / 2, sigma).clip(2, 120)
+        r = rng.random(n)
+        past = np.select([r < .80, r < .91], [COMPLETED, CANCELLED], NO_SHOW)
+        ahead = np.select([r < .65, r < .95], [SCHEDULED, CONFIRMED], CANCELLED)
+        on_today = np.where(
+            slot_minute + duration < now_minute, COMPLETED,
+            np.where(slot_minute < now_minute, IN_PROGRESS, ahead),
+        )
+        today_np = np.datetime64(today, 'D')
+        status = np.where(days < today_np, past, np.where(days == today_np, on_today, ahead))
+
+        slot_utc = _utc(days, slot_minute, tz)
+        late = rng.gamma(2.0, 4.0, n) * 60  # queue drift in seconds
+        started = slot_utc + late.astype('timedelta64[s]')
+        ended = started + (duration * 60).astype('timedelta64[s]')
+        completed = status == COMPLETED
+        seen = completed | (status == IN_PROGRESS)
+        booked = np.minimum(slot_utc - (rng.exponential(4 * 86400, n) + 1800).astype('timedelta64[s]'), now_utc)
+        nat = np.datetime64('NaT', 's')
+        for_self = rng.random(n) < 0.9
+        tokens = [f'GEN-{i:012d}' for i in ids.tolist()]
+
+        _insert(Appointment, {
+            'id': ids,
+            'patient_id': patient,
+            'doctor_id': doc_ids[doc],
+            'department_id': dept_ids[doc_dept[doc]],
+            'appointment_date': days,
+            'time_slot': SLOT_TIMES[slot_minute // 10],
+            'status': STATUSES[status],
+            'token_number': tokens,
+            'queue_position': slot_index + 1,
+            'reason': [CONDITIONS[c][1] for c in rng.integers(0, len(CONDITIONS), n)],
+            'booking_type': np.where(rng.random(n) < 0.4, 'disease', 'doctor'),
+            'is_for_self': for_self,
+            'patient_relation': np.where(for_self, '', _pick(rng, ['Child', 'Parent', 'Spouse'], n)),
+            'consultation_started_at': np.where(seen, started, nat),
+            'consultation_ended_at': np.where(completed, ended, nat),
+            'created_at': booked,
+            'updated_at': np.where(completed, ended, booked),
+        }, n, batch_size)
+        np.add.at(minutes_sum, doc[completed], duration[completed])
+        np.add.at(minutes_count, doc[completed], 1)
+        counts['appointments'] += n
+
+        # Medical records for most completed consultations
+        rec = np.flatnonzero(completed & (rng.random(n) < record_rate))
+        if len(rec):
+            condition = rng.integers(0, len(CONDITIONS), len(rec))
+            follow_up = rng.random(len(rec)) < 0.2
+            follow_up_date = days[rec] + rng.integers(7, 31, len(rec)).astype('timedelta64[D]')
+            _insert(MedicalRecord, {
+                'id': np.arange(record_id, record_id + len(rec)),
+                'patient_id': patient[rec],
+                'doctor_id': doc_ids[doc[rec]],
+                'appointment_id': ids[rec],
+                'diagnosis': [CONDITIONS[c][0] for c in condition],
+                'symptoms': [CONDITIONS[c][1] for c in condition],
+                'treatment_plan': [CONDITIONS[c][2] for c in condition],
+                'prescriptions': _pick(rng, PRESCRIPTIONS, len(rec)),
+                'vitals': [
+                    f'{{"bp": "{s}/{d}", "pulse": {p}, "temperature": {t:.1f}}}'
+                    for s, d, p, t in zip(
+                        rng.normal(124, 14, len(rec)).astype(int).tolist(),
+                        rng.normal(80, 9, len(rec)).astype(int).tolist(),
+                        rng.normal(78, 10, len(rec)).astype(int).tolist(),
+                        rng.normal(98.6, 0.7, len(rec)).tolist(),
+                    )
+                ],
+                'follow_up_required': follow_up,
+                'follow_up_date': np.where(follow_up, follow_up_date, np.datetime64('NaT', 'D')),
+                'visit_date': ended[rec],
+                'created_at': ended[rec],
+            }, len(rec), batch_size)
+            record_id += len(rec)
+            counts['records'] += len(rec)
+
+        # A few patients leave a review; better doctors get better ones
+        rev = np.flatnonzero(completed & (rng.random(n) < review_rate))
+        if len(rev):
+            rating = np.rint(rng.normal(4.1 + quality[doc[rev]], 0.9)).clip(1, 5).astype(int)
+            _insert(DoctorReview, {
+                'id': np.arange(review_id, review_id + len(rev)),
+                'doctor_id': doc_ids[doc[rev]],
+                'patient_id': patient[rev],
+                'appointment_id': ids[rev],
+                'rating': rating,
+                'comment': _pick(rng, REVIEW_COMMENTS, len(rev)),
+                'created_at': ended[rev] + (rng.exponential(8 * 3600, len(rev))).astype('timedelta64[s]'),
+            }, len(rev), batch_size)
+            np.add.at(rating_sum, doc[rev], rating)
+            np.add.at(rating_count, doc[rev], 1)
+            review_id += len(rev)
+            counts['reviews'] += len(rev)
+
+        # Booking confirmations; older ones have mostly been read
+        note = np.flatnonzero(rng.random(n) < notification_rate)
+        if len(note):
+            age_days = (now_utc - booked[note]) / np.timedelta64(1, 'D')
+            read_at = booked[note] + rng.exponential(6 * 3600, len(note)).astype('timedelta64[s]')
+            read = (rng.random(len(note)) < np.where(age_days > 2, 0.85, 0.4)) & (read_at <= now_utc)
+            _insert(Notification, {
+                'id': np.arange(notification_id, notification_id + len(note)),
+                'user_id': patient[note],
+                'appointment_id': ids[note],
+                'title': itertools.repeat('Appointment Confirmed'),
+                'message': [f'Your appointment is booked. Token: {tokens[i]}' for i in note.tolist()],
+                'category': itertools.repeat('appointment'),
+                'data': [
+                    f'{{"appointment_id": {ids[i]}, "token_number": "{tokens[i]}"}}' for i in note.tolist()
+                ],
+                'is_read': read,
+                'created_at': booked[note],
+                'read_at': np.where(read, read_at, nat),
+            }, len(note), batch_size)
+            notification_id += len(note)
+            counts['notifications'] += len(note)
+        progress(f'{first + n}/{appointments} appointments')
+
+    # ---- Doctor aggregates the app keeps denormalised
+    rated = rating_count > 0
+    timed = minutes_count > 0
+    profiles = list(Doctor.objects.filter(id__in=doc_ids.tolist()).order_by('id'))
+    for i, profile in enumerate(profiles):
+        if rated[i]:
+            profile.rating = round(rating_sum[i] / rating_count[i], 2)
+        if timed[i]:
+            profile.average_time_per_patient = round(minutes_sum[i] / minutes_count[i], 1)
+    Doctor.objects.bulk_update(profiles, ['rating', 'average_time_per_patient'], batch_size=batch_size)
+
+    # Explicit ids leave PostgreSQL sequences behind; MySQL/SQLite need nothing
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [
+            User, Doctor, DoctorAvailability, Appointment, MedicalRecord, DoctorReview, Notification,
+        ]):
+            cursor.execute(sql)
+
+    counts['seconds'] = round(time.perf_counter() - began, 1)
+    logger.info(f"Generated dataset: {counts}")
+    return counts
+
+
+def flush_dataset():
+    """Delete every generated user and the rows that reference them, without loading them."""
+    users = User.objects.filter(email__endswith=f'@{DATASET_EMAIL_DOMAIN}')
+    doctors = Doctor.objects.filter(user__in=users)
+    appointments = Appointment.objects.filter(Q(doctor__in=doctors) | Q(patient__in=users))
+    owned = Q(doctor__in=doctors) | Q(patient__in=users)
+
+    RequestProfile.objects.filter(user__in=users).update(user=None)
+    OutstandingToken.objects.filter(user__in=users).update(user=None)
+    deleted = {}
+    for name, qs in [
+        ('notifications', Notification.objects.filter(Q(user__in=users) | Q(appointment__in=appointments))),
+        ('reviews', DoctorReview.objects.filter(owned | Q(appointment__in=appointments))),
+        ('records', MedicalRecord.objects.filter(owned | Q(appointment__in=appointments))),
+        ('archived', ArchivedAppointment.objects.filter(owned)),
+        ('appointments', appointments),
+        ('queue_statuses', QueueStatus.objects.filter(doctor__in=doctors)),
+        ('availabilities', DoctorAvailability.objects.filter(doctor__in=doctors)),
+        ('family_members', FamilyMember.objects.filter(user__in=users)),
+        ('doctors', doctors),
+        ('users', users),
+    ]:
+        # Children are deleted first, so skip the collector and its per-row cascade queries
+        deleted[name] = qs._raw_delete(qs.db)
+    return deleted
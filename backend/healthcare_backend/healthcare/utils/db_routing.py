@@ -0,0 +1,100 @@
+# healthcare/utils/db_routing.py
+"""
+Read-replica routing.
+
+Reads go to the `replica` alias only when the current request's view opted
+in (`replica_actions` on a viewset, or @read_replica on a function view)
+or a command wrapped its work in `use_replica()`. Any write, or an open
+transaction on the primary, pins the rest of the request to `default` so
+callers always read their own writes. Without a `replica` entry in
+DATABASES everything stays on `default`.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+PRIMARY_ALIAS = 'default'
+REPLICA_ALIAS = 'replica'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_use_replica = ContextVar('use_replica', default=False)
+_pinned_to_primary = ContextVar('pinned_to_primary', default=False)
+
+
+def replica_configured():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+class ReplicaRouter:
+    """Database router sending opted-in reads to the replica"""
+
+    def db_for_read(self, model, **hints):
+        if (
+            _use_replica.get()
+            and not _pinned_to_primary.get()
+            and not connections[PRIMARY_ALIAS].in_atomic_block
+            and replica_configured()
+        ):
+            return REPLICA_ALIAS
+        return PRIMARY_ALIAS
+
+    def db_for_write(self, model, **hints):
+        _pinned_to_primary.set(True)
+        return PRIMARY_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY_ALIAS
+
+
+@contextmanager
+def use_replica():
+    """Route reads inside the block to the replica (for reporting commands)."""
+    replica_token = _use_replica.set(True)
+    pinned_token = _pinned_to_primary.set(False)
+    try:
+        yield
+    finally:
+        _pinned_to_primary.reset(pinned_token)
+        _use_replica.reset(replica_token)
+
+
+def read_replica(view_func):
+    """Mark a function view as safe to serve from the replica (put it above @api_view)."""
+    view_func.use_read_replica = True
+    return view_func
+
+
+def _view_opted_in(view_func, method):
+    if getattr(view_func, 'use_read_replica', False):
+        return True
+    # DRF viewsets expose the viewset class and the method -> action mapping
+    cls = getattr(view_func, 'cls', None)
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(method.lower())
+    return bool(cls and action and action in getattr(cls, 'replica_actions', ()))
+
+
+class ReplicaRoutingMiddleware:
+    """Scope replica routing to one request and reset it afterwards"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        replica_token = _use_replica.set(False)
+        pinned_token = _pinned_to_primary.set(False)
+        try:
+            return self.get_response(request)
+        finally:
+            _pinned_to_primary.reset(pinned_token)
+            _use_replica.reset(replica_token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method in SAFE_METHODS and _view_opted_in(view_func, request.method):
+            _use_replica.set(True)
+        return None
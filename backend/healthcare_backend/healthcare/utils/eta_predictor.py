@@ -0,0 +1,278 @@
+# healthcare/utils/eta_predictor.py
+"""
+Statistical queue ETAs: p50/p90 waits from each doctor's own consultation
+times instead of one flat average per patient.
+
+Per doctor we keep a duration profile: a one-minute histogram of
+consultation times for every hour of the day (sparse hours borrow from the
+doctor's overall histogram, doctors without history from a lognormal
+around average_time_per_patient) and a no-show rate. Profiles are built
+in one query for any number of doctors and cached for ETA_PROFILE_TTL;
+building one also refreshes the doctor's average_time_per_patient from the
+same history.
+
+A waiting patient's wait is the rest of the consultation in progress
+(its duration conditioned on the time already spent) plus the
+consultations of the patients ahead, each in the hour it is expected to
+start, each weighted by the chance that patient turns up: scheduled and
+confirmed patients may not show, checked-in ('waiting') ones will. Nobody
+who hasn't checked in is expected before their slot, and a queue that
+runs ahead of its slots waits for them. Today's
+finished consultations give the doctor's live pace, a ratio to the profile
+that scales every remaining duration. The sums are walked with
+queue_eta.queue_offsets(), so they follow the same queue rules as the flat
+ETA, and the quantiles come from a lognormal with the summed mean and
+variance. Everything is evaluated for a batch of queues in a few array
+operations.
+"""
+import logging
+from datetime import datetime, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from healthcare.models import Appointment, Doctor
+from .queue_eta import IN_PROGRESS, OTHER, WAITING, WAITING_STATUSES, queue_offsets
+
+logger = logging.getLogger(__name__)
+
+# Histogram bins are minutes 0..MAX_MINUTES-1; longer consultations land in the last one
+MAX_MINUTES = 120
+BIN_CENTRES = np.arange(MAX_MINUTES) + 0.5
+HOURS = 24
+# Pseudo-consultations of the overall histogram mixed into every hour, and
+# of the fallback distribution mixed into the overall one
+HOUR_PRIOR = 10
+DOCTOR_PRIOR = 5
+DEFAULT_MINUTES = 10
+DEFAULT_CV = 0.5
+DEFAULT_NO_SHOW_RATE = 0.1
+NO_SHOW_PRIOR = 20
+# Today's consultations count against this many expected ones when estimating pace
+PACE_PRIOR = 3
+PACE_LIMITS = (0.5, 2.0)
+# Rest of a consultation that has outlasted every recorded one
+OVERRUN_MINUTES = 2.0
+Z90 = 1.2816
+
+
+def _profile_key(doctor_id):
+    return f'eta:profile:{doctor_id}'
+
+
+def _lognormal_pdf(mean):
+    sigma2 = np.log1p(DEFAULT_CV ** 2)
+    mu = np.log(mean) - sigma2 / 2
+    x = BIN_CENTRES
+    pdf = np.exp(-(np.log(x) - mu) ** 2 / (2 * sigma2)) / x
+    return pdf / pdf.sum()
+
+
+def build_profiles(doctor_ids):
+    """
+    Duration profiles of these doctors from the last ETA_HISTORY_DAYS, in
+    three queries, plus one updating the averages of doctors whose mean moved.
+    """
+    doctor_ids = list(doctor_ids)
+    index = {doctor_id: i for i, doctor_id in enumerate(doctor_ids)}
+    since = timezone.now() - timedelta(days=getattr(settings, 'ETA_HISTORY_DAYS', 90))
+
+    # Hour of day in Python: ExtractHour in TIME_ZONE needs MySQL's time-zone tables (NULL without them)
+    rows = list(
+        Appointment.objects.filter(
+            doctor_id__in=doctor_ids, status='completed',
+            consultation_started_at__gte=since, consultation_ended_at__isnull=False,
+        ).values_list('doctor_id', 'consultation_started_at', 'consultation_ended_at').iterator()
+    )
+    counts = np.zeros(len(doctor_ids) * HOURS * MAX_MINUTES)
+    minutes_sum = np.zeros(len(doctor_ids))
+    if rows:
+        which = np.array([index[doctor_id] for doctor_id, _, _ in rows])
+        hours = np.array([timezone.localtime(started).hour for _, started, _ in rows])
+        minutes = np.array([(ended - started).total_seconds() / 60 for _, started, ended in rows])
+        cell = (which * HOURS + hours) * MAX_MINUTES + np.clip(minutes, 0, MAX_MINUTES - 1).astype(int)
+        counts = np.bincount(cell, minlength=len(counts)).astype(np.float64)
+        minutes_sum = np.bincount(which, weights=minutes, minlength=len(doctor_ids))
+    counts = counts.reshape(len(doctor_ids), HOURS, MAX_MINUTES)
+
+    outcomes = {
+        row['doctor_id']: row for row in
+        Appointment.objects.filter(doctor_id__in=doctor_ids, appointment_date__gte=since.date())
+        .values('doctor_id').annotate(
+            no_shows=Count('id', filter=Q(status='no_show')), seen=Count('id', filter=Q(status='completed')),
+        )
+    }
+    averages = dict(Doctor.objects.filter(id__in=doctor_ids).values_list('id', 'average_time_per_patient'))
+    # The doctor's average (shown on the queue board and the flat ETA's fallback) follows the history
+    samples = counts.sum(axis=(1, 2))
+    moved = []
+    for doctor_id, i in index.items():
+        if samples[i]:
+            average = round(minutes_sum[i] / samples[i], 1)
+            if averages.get(doctor_id) != average:
+                averages[doctor_id] = average
+                moved.append(Doctor(id=doctor_id, average_time_per_patient=average))
+    if moved:
+        Doctor.objects.bulk_update(moved, ['average_time_per_patient'])
+
+    profiles = {}
+    for doctor_id, i in index.items():
+        overall = counts[i].sum(axis=0)
+        prior = _lognormal_pdf(averages.get(doctor_id) or DEFAULT_MINUTES)
+        overall = (overall + DOCTOR_PRIOR * prior) / (overall.sum() + DOCTOR_PRIOR)
+        hourly = counts[i] + HOUR_PRIOR * overall
+        hourly /= hourly.sum(axis=1, keepdims=True)
+        mean = hourly @ BIN_CENTRES
+        outcome = outcomes.get(doctor_id, {'no_shows': 0, 'seen': 0})
+        profiles[doctor_id] = {
+            'pdf': hourly.astype(np.float32),
+            'mean': mean,
+            'var': hourly @ BIN_CENTRES ** 2 - mean ** 2,
+            'no_show_rate': (outcome['no_shows'] + NO_SHOW_PRIOR * DEFAULT_NO_SHOW_RATE)
+            / (outcome['no_shows'] + outcome['seen'] + NO_SHOW_PRIOR),
+            'samples': int(counts[i].sum()),
+        }
+    return profiles
+
+
+def duration_profiles(doctor_ids):
+    """{doctor_id: profile}, from the cache where possible and built in one go otherwise."""
+    doctor_ids = set(doctor_ids)
+    found = cache.get_many([_profile_key(d) for d in doctor_ids])
+    profiles = {d: found[_profile_key(d)] for d in doctor_ids if _profile_key(d) in found}
+    missing = doctor_ids - set(profiles)
+    if missing:
+        built = build_profiles(sorted(missing))
+        cache.set_many(
+            {_profile_key(d): p for d, p in built.items()}, getattr(settings, 'ETA_PROFILE_TTL', 21600)
+        )
+        profiles.update(built)
+    return profiles
+
+
+def lognormal_quantile(mean, var, z):
+    """Quantile z (in standard deviations) of the lognormal with this mean and variance; 0 where mean is 0."""
+    mean = np.asarray(mean, dtype=np.float64)
+    positive = mean > 0
+    safe = np.where(positive, mean, 1.0)
+    sigma2 = np.log1p(np.maximum(var, 0.0) / safe ** 2)
+    return np.where(positive, np.exp(np.log(safe) - sigma2 / 2 + z * np.sqrt(sigma2)), 0.0)
+
+
+def wait_quantiles(codes, mean, var, show, current_mean, current_var, earliest=None):
+    """
+    (p50, p90) waits for every position of a batch of queues (2-d codes).
+    mean/var are the duration moments of each position's consultation, show
+    the chance that patient turns up, current_* the moments of the rest of
+    each queue's consultation in progress. earliest (optional) is the soonest
+    each patient can be seen, in minutes from now (-inf for no limit).
+    """
+    codes = np.asarray(codes)
+    expected = queue_offsets(codes, show * mean, current_mean)
+    spread = queue_offsets(codes, show * var + show * (1 - show) * mean ** 2, current_var)
+    if earliest is not None:
+        # A patient who can't be seen yet holds up everyone behind them by the
+        # same amount (only the stretch after the last consultation in progress
+        # counts). The spread is left alone: patients arrive early or late, so
+        # the hold-up is no more certain than the consultations it replaces.
+        waiting = codes == WAITING
+        in_progress = codes == IN_PROGRESS
+        after_last = np.cumsum(in_progress[..., ::-1], axis=-1)[..., ::-1] - in_progress == 0
+        slack = np.where(waiting & after_last, earliest - expected, -np.inf)
+        gap = np.maximum.accumulate(slack, axis=-1)
+        expected = np.where(waiting & (gap > 0), expected + gap, expected)
+    return lognormal_quantile(expected, spread, 0.0), lognormal_quantile(expected, spread, Z90)
+
+
+def _remaining(pdf, elapsed):
+    """Mean and variance of the rest of a consultation that has lasted `elapsed` minutes."""
+    tail = np.where(BIN_CENTRES > elapsed, pdf, 0.0)
+    weight = tail.sum()
+    if weight <= 0:
+        return OVERRUN_MINUTES, OVERRUN_MINUTES ** 2
+    rest = BIN_CENTRES - elapsed
+    mean = tail @ rest / weight
+    return mean, max(tail @ rest ** 2 / weight - mean ** 2, 0.0)
+
+
+def _minute_of_day(moment):
+    moment = timezone.localtime(moment)
+    return moment.hour * 60 + moment.minute + moment.second / 60
+
+
+def predict_queues(queues, now=None):
+    """
+    queues: [(doctor_id, appointments in queue order)], appointments being
+    model instances (status, appointment_date, time_slot and the consultation
+    timestamps are read).
+    Returns one (p50, p90) pair of integer-minute arrays per queue, aligned
+    with its appointments; positions that aren't waiting get 0.
+    """
+    if not queues:
+        return []
+    now = now or timezone.now()
+    profiles = duration_profiles(doctor_id for doctor_id, _ in queues)
+    length = max(1, max(len(appointments) for _, appointments in queues))
+    count = len(queues)
+    codes = np.full((count, length), OTHER, dtype=np.int8)
+    show = np.ones((count, length))
+    earliest = np.full((count, length), -np.inf)
+    pace = np.ones(count)
+    current = np.zeros((count, 2))
+    pdf = np.stack([profiles[doctor_id]['pdf'] for doctor_id, _ in queues]).astype(np.float64)
+    mean = np.stack([profiles[doctor_id]['mean'] for doctor_id, _ in queues])
+    var = np.stack([profiles[doctor_id]['var'] for doctor_id, _ in queues])
+    minute = _minute_of_day(now)
+    hour = min(int(minute // 60), HOURS - 1)
+
+    for q, (doctor_id, appointments) in enumerate(queues):
+        no_show = profiles[doctor_id]['no_show_rate']
+        observed = expected = 0.0
+        in_progress = None
+        for j, appt in enumerate(appointments):
+            status = (appt.status or '').lower()
+            if status == 'in_progress':
+                codes[q, j] = IN_PROGRESS
+                in_progress = appt
+            elif status in WAITING_STATUSES:
+                codes[q, j] = WAITING
+                if status != 'waiting':
+                    # Not checked in: may not come, and won't be seen before the slot
+                    show[q, j] = 1 - no_show
+                    slot = timezone.make_aware(datetime.combine(appt.appointment_date, appt.time_slot))
+                    earliest[q, j] = (slot - now).total_seconds() / 60
+            elif status == 'completed' and appt.consultation_started_at and appt.consultation_ended_at:
+                started = timezone.localtime(appt.consultation_started_at)
+                observed += (appt.consultation_ended_at - appt.consultation_started_at).total_seconds() / 60
+                expected += mean[q, started.hour]
+        # Live pace: today's consultations against what the profile expected of them
+        prior = PACE_PRIOR * mean[q, hour]
+        pace[q] = np.clip((observed + prior) / (expected + prior), *PACE_LIMITS)
+        if in_progress is not None:
+            started = in_progress.consultation_started_at or now
+            elapsed = max((now - started).total_seconds() / 60, 0.0)
+            at = min(int(_minute_of_day(started) // 60), HOURS - 1)
+            rest, spread = _remaining(pdf[q, at], elapsed / pace[q])
+            current[q] = rest * pace[q], spread * pace[q] ** 2
+
+    # Price each consultation in the hour it is expected to start: once at
+    # this hour to place everyone, then again with their own hours
+    rows = np.arange(count)[:, None]
+    at = np.full((count, length), hour)
+    for _ in range(2):
+        step_mean = mean[rows, at] * pace[:, None]
+        step_var = var[rows, at] * pace[:, None] ** 2
+        p50, p90 = wait_quantiles(codes, step_mean, step_var, show, current[:, 0], current[:, 1], earliest)
+        at = np.clip(((minute + p50) // 60).astype(int), 0, HOURS - 1)
+
+    p50, p90 = np.rint(p50).astype(int), np.rint(p90).astype(int)
+    return [(p50[q, :len(a)], p90[q, :len(a)]) for q, (_, a) in enumerate(queues)]
+
+
+def predict_queue(doctor_id, appointments, now=None):
+    """(p50, p90) lists of whole minutes for one doctor-day queue."""
+    p50, p90 = predict_queues([(doctor_id, appointments)], now)[0]
+    return p50.tolist(), p90.tolist()
@@ -0,0 +1,156 @@
+# healthcare/utils/eta_refresh.py
+"""
+Time-driven ETA refresh: re-quote every active queue of the day as the
+clock moves, not only when someone books, starts or ends a consultation.
+
+_update_queue quotes waits when a queue changes; between changes the
+quotes go stale (a consultation that overruns leaves every waiting patient
+with a time in the past). refresh_etas() runs one tick over all of today's
+active queues (doctors with anyone waiting or in consultation): it loads
+their appointments in one query, prices them in one batched pass
+(utils/eta_predictor.py, or the flat average with ETA_PREDICTOR off),
+bulk-updates the waiting patients whose quoted time moved and publishes a
+queue delta for each doctor touched. A tick only reads today's appointments of active
+doctors, so its cost follows the number of live queues, not the size of
+the appointments table.
+
+Queue positions and statuses are left to _update_queue; a tick that races
+a queue change writes ETAs that the change itself recomputes right after.
+"""
+import logging
+import time
+from datetime import timedelta
+from itertools import groupby
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from healthcare.models import Appointment, QueueStatus, Doctor
+from .eta_predictor import predict_queues
+from .metrics import ETA_REFRESH_SECONDS, ETA_REFRESH_ROWS
+from .queue_eta import WAITING_STATUSES, eta_minutes, queue_waits, status_codes
+from .queue_feed import publish_queue_change
+
+logger = logging.getLogger(__name__)
+
+LOCK_KEY = 'eta-refresh:lock'
+ACTIVE_STATUSES = WAITING_STATUSES + ('in_progress',)
+QUEUE_FIELDS = (
+    'id', 'doctor_id', 'appointment_date', 'time_slot', 'status', 'queue_position', 'created_at',
+    'estimated_wait_minutes', 'estimated_wait_p90_minutes', 'estimated_time',
+    'consultation_started_at', 'consultation_ended_at',
+)
+ETA_FIELDS = ['estimated_wait_minutes', 'estimated_wait_p90_minutes', 'estimated_time']
+
+
+def _flat_waits(queues, day):
+    """The flat quote for each queue, at the average _update_queue last recorded for it."""
+    doctor_ids = [doctor_id for doctor_id, _ in queues]
+    recorded = dict(
+        QueueStatus.objects.filter(doctor_id__in=doctor_ids, appointment_date=day)
+        .exclude(average_time_per_patient=None).values_list('doctor_id', 'average_time_per_patient')
+    )
+    profile = dict(Doctor.objects.filter(id__in=doctor_ids).values_list('id', 'average_time_per_patient'))
+    length = max(len(appointments) for _, appointments in queues)
+    codes = np.zeros((len(queues), length), dtype=np.int8)
+    averages = np.empty(len(queues))
+    for q, (doctor_id, appointments) in enumerate(queues):
+        codes[q, :len(appointments)] = status_codes(a.status for a in appointments)
+        averages[q] = eta_minutes(recorded.get(doctor_id) or timedelta(minutes=profile.get(doctor_id) or 10))
+    waits = queue_waits(codes, averages).astype(int)
+    return [(waits[q, :len(a)], waits[q, :len(a)]) for q, (_, a) in enumerate(queues)]
+
+
+def refresh_etas(day=None, now=None, publish=True):
+    """
+    One tick over today's active queues. Returns
+    {"queues": n, "appointments": n, "updated": n, "published": n, "seconds": s}.
+    """
+    began = time.perf_counter()
+    now = timezone.localtime(now)
+    day = day or now.date()
+
+    active = list(
+        Appointment.objects.filter(appointment_date=day, status__in=ACTIVE_STATUSES)
+        .order_by().values_list('doctor_id', flat=True).distinct()
+    )
+    result = {'queues': len(active), 'appointments': 0, 'updated': 0, 'published': 0}
+    if active:
+        # Same order as _update_queue, grouped by doctor
+        rows = (
+            Appointment.objects.filter(appointment_date=day, doctor_id__in=active)
+            .only(*QUEUE_FIELDS).order_by('doctor_id', 'queue_position', 'time_slot', 'created_at')
+        )
+        queues = [(doctor_id, list(group)) for doctor_id, group in groupby(rows, key=lambda a: a.doctor_id)]
+        if getattr(settings, 'ETA_PREDICTOR', True):
+            quotes = predict_queues(queues, now)
+        else:
+            quotes = _flat_waits(queues, day)
+
+        # A quote changes when the time it promises moves, to the minute it is
+        # shown at; the minutes-from-now are rewritten along with it
+        minute = now.replace(second=0, microsecond=0)
+        changed, touched = [], []
+        for (doctor_id, appointments), (waits, waits_p90) in zip(queues, quotes):
+            before = len(changed)
+            for appt, wait, wait_p90 in zip(appointments, waits.tolist(), waits_p90.tolist()):
+                if appt.status not in WAITING_STATUSES:
+                    continue
+                estimated_time = (minute + timedelta(minutes=wait)).time()
+                shown = appt.estimated_time.replace(second=0, microsecond=0) if appt.estimated_time else None
+                if (shown, appt.estimated_wait_p90_minutes - appt.estimated_wait_minutes) == (
+                    estimated_time, wait_p90 - wait
+                ):
+                    continue
+                appt.estimated_wait_minutes = wait
+                appt.estimated_wait_p90_minutes = wait_p90
+                appt.estimated_time = estimated_time
+                changed.append(appt)
+            if len(changed) > before:
+                touched.append(doctor_id)
+            result['appointments'] += len(appointments)
+
+        if changed:
+            with transaction.atomic():
+                Appointment.objects.bulk_update(changed, ETA_FIELDS, batch_size=500)
+        result['updated'] = len(changed)
+        ETA_REFRESH_ROWS.inc(len(changed), result='updated')
+        ETA_REFRESH_ROWS.inc(result['appointments'] - len(changed), result='unchanged')
+
+        if publish:
+            for doctor_id in touched:
+                try:
+                    if publish_queue_change(doctor_id, day) is not None:
+                        result['published'] += 1
+                except Exception:
+                    # Subscribers still get these ETAs with the next change or resync
+                    logger.warning(f"Could not publish refreshed ETAs of doctor {doctor_id}", exc_info=True)
+
+    result['seconds'] = round(time.perf_counter() - began, 3)
+    ETA_REFRESH_SECONDS.observe(result['seconds'])
+    return result
+
+
+def run_refresh_loop(interval=None, max_ticks=None, stdout=None):
+    """
+    Tick every `interval` seconds (ETA_REFRESH_INTERVAL). Any number of
+    workers may run this; a cache lock lets one of them tick per interval.
+    """
+    interval = interval or getattr(settings, 'ETA_REFRESH_INTERVAL', 30)
+    ticks = 0
+    while max_ticks is None or ticks < max_ticks:
+        started = time.monotonic()
+        if cache.add(LOCK_KEY, 1, max(1, int(interval) - 1)):
+            try:
+                result = refresh_etas()
+                logger.info(f"ETA refresh: {result}")
+                if stdout is not None:
+                    stdout.write(str(result))
+            except Exception:
+                logger.exception("ETA refresh tick failed")
+        ticks += 1
+        if max_ticks is None or ticks < max_ticks:
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
@@ -0,0 +1,221 @@
+# healthcare/utils/jwt_claims.py
+"""
+Claims-based authentication: role, doctor_id and the verified flag ride in
+the JWT so an authenticated request doesn't have to load its User row.
+
+Tokens issued by login/register and /api/token/ carry
+    role, doctor_id, verified, claims_at
+and refreshing re-reads them from the database, so a role change is
+picked up within one access-token lifetime. Inside that window a change
+marks the user's claims stale (mark_claims_stale(), from signals.py) and
+requests with tokens stamped before the change authenticate the old way.
+
+ClaimsJWTAuthentication hands views a ClaimsUser: it answers id, role,
+is_verified, doctor_profile (itself lazy) and the auth flags from the
+token and loads the row only when anything else is read. It is off by
+default (JWT_CLAIMS_AUTH): the stale marker is a cache entry set by the
+post_save signal, so a user deactivated or re-roled with queryset.update(),
+or whose marker was evicted, keeps the old access until the access token
+expires. Without it the user is loaded on every request as simplejwt does.
+"""
+import time
+from functools import partial
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, models
+from django.db.models.base import ModelState
+from django.utils.functional import SimpleLazyObject, empty
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import (
+    TokenBlacklistSerializer, TokenObtainPairSerializer, TokenRefreshSerializer
+)
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .cache import cache
+from .token_blacklist import is_blacklisted
+
+
+# ------------------------------------------------------------
+#  Tokens
+# ------------------------------------------------------------
+
+def stamp_claims(token, user):
+    """Copy the user's role, doctor id and verified flag into the token."""
+    from healthcare.models import Doctor
+
+    token['role'] = user.role
+    token['doctor_id'] = (
+        Doctor.objects.filter(user_id=user.pk).values_list('id', flat=True).first()
+        if user.role == 'doctor' else None
+    )
+    token['verified'] = user.is_verified
+    token['claims_at'] = time.time()
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """Refresh token (and access tokens made from it) carrying the role claims"""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        stamp_claims(token, user)
+        return token
+
+    @property
+    def access_token(self):
+        if self.token is not None:
+            # A presented refresh token: re-read the claims, they may be a week old
+            from healthcare.models import User
+
+            user = User.objects.filter(pk=self.payload.get(api_settings.USER_ID_CLAIM)).first()
+            if user is None or not user.is_active:
+                raise TokenError('User not found or inactive')
+            stamp_claims(self, user)
+        return super().access_token
+
+    def check_blacklist(self):
+        # Bloom filter first; only a possible hit (or a token too young for
+        # other workers' filters to have caught up) queries token_blacklist
+        if is_blacklisted(self.payload[api_settings.JTI_CLAIM], self.payload.get('iat')):
+            raise TokenError('Token is blacklisted')
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = ClaimsRefreshToken
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = ClaimsRefreshToken
+
+
+class ClaimsTokenBlacklistSerializer(TokenBlacklistSerializer):
+    token_class = ClaimsRefreshToken
+
+
+# ------------------------------------------------------------
+#  Staleness
+# ------------------------------------------------------------
+
+def _stale_key(user_id):
+    return f'auth:claims-stale:{user_id}'
+
+
+def mark_claims_stale(user_id):
+    """Claims stamped before now no longer describe this user."""
+    lifetime = int(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds())
+    # Writes aren't broadcast; the delete drops older copies from other processes' tier 1
+    cache.delete(_stale_key(user_id))
+    cache.set(_stale_key(user_id), time.time(), lifetime)
+
+
+def claims_stale(token):
+    changed_at = cache.get(_stale_key(token[api_settings.USER_ID_CLAIM]))
+    return changed_at is not None and token.get('claims_at', 0) < changed_at
+
+
+# ------------------------------------------------------------
+#  Lazy users
+# ------------------------------------------------------------
+
+def _load(model, pk):
+    return model._base_manager.get(pk=pk)
+
+
+class LazyModel(SimpleLazyObject):
+    """
+    A model instance that is only fetched when needed. Until then it answers
+    its pk and the attributes in `known`, and passes isinstance() checks,
+    comparisons and use in filters/foreign keys without a query.
+    """
+
+    def __init__(self, model, pk, known=None):
+        state = ModelState()
+        state.db, state.adding = DEFAULT_DB_ALIAS, False
+        self.__dict__['_known'] = {
+            'pk': pk, model._meta.pk.attname: pk, '_meta': model._meta, '_state': state,
+            **(known or {}),
+        }
+        self.__dict__['_model'] = model
+        super().__init__(partial(_load, model, pk))
+
+    @property
+    def __class__(self):
+        if self._wrapped is empty:
+            return self.__dict__['_model']
+        return type(self._wrapped)
+
+    def __getattr__(self, name):
+        if self._wrapped is empty:
+            if name in self.__dict__['_known']:
+                return self.__dict__['_known'][name]
+            if not hasattr(self.__dict__['_model'], name):
+                # Not a field, method or property (hasattr() probes from the ORM): no need to load
+                raise AttributeError(name)
+        return super().__getattr__(name)
+
+    def __eq__(self, other):
+        if not isinstance(other, models.Model):
+            return NotImplemented
+        return other._meta.concrete_model is self._meta.concrete_model and other.pk == self.pk
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __hash__(self):
+        return hash(self.pk)
+
+    def __bool__(self):
+        return True
+
+
+class ClaimsUser(LazyModel):
+    """request.user built from a token's claims; loads the User row on first other access"""
+
+    def __init__(self, token):
+        from healthcare.models import User
+
+        super().__init__(User, token[api_settings.USER_ID_CLAIM], {
+            'role': token['role'],
+            'is_verified': token.get('verified', False),
+            'is_active': True,
+            'is_authenticated': True,
+            'is_anonymous': False,
+        })
+        self.__dict__['doctor_id'] = token.get('doctor_id')
+
+    @property
+    def doctor_profile(self):
+        if self._wrapped is not empty:
+            return self._wrapped.doctor_profile
+        from healthcare.models import Doctor, User
+
+        if self.__dict__['doctor_id'] is None:
+            raise User.doctor_profile.RelatedObjectDoesNotExist('User has no doctor_profile.')
+        if '_doctor' not in self.__dict__:
+            self.__dict__['_doctor'] = LazyModel(Doctor, self.__dict__['doctor_id'], {'user_id': self.pk})
+        return self.__dict__['_doctor']
+
+    def is_patient(self):
+        return self.role == 'patient'
+
+    def is_doctor(self):
+        return self.role == 'doctor'
+
+    def is_admin(self):
+        return self.role == 'admin'
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that trusts the role claims instead of loading the user"""
+
+    def get_user(self, validated_token):
+        if (
+            not getattr(settings, 'JWT_CLAIMS_AUTH', False)
+            or 'role' not in validated_token
+            or claims_stale(validated_token)
+        ):
+            return super().get_user(validated_token)
+        return ClaimsUser(validated_token)
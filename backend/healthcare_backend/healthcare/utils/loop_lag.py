@@ -0,0 +1,35 @@
+# healthcare/utils/loop_lag.py
+"""
+Event-loop lag monitor for the ASGI workers.
+
+A task on each running loop sleeps for LOOP_LAG_INTERVAL and records how
+much later than requested it woke up. Sustained lag means callbacks (socket
+writes, channel-layer receives) are queueing behind blocking work.
+"""
+import asyncio
+
+from django.conf import settings
+
+from .metrics import EVENT_LOOP_LAG_SECONDS, EVENT_LOOP_LAG_LAST
+
+_monitored = set()
+
+
+async def _watch(interval):
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - start - interval)
+        EVENT_LOOP_LAG_SECONDS.observe(lag)
+        EVENT_LOOP_LAG_LAST.set(lag)
+
+
+def ensure_loop_monitor():
+    """Start the monitor on the current loop once; call from async code."""
+    loop = asyncio.get_running_loop()
+    if loop in _monitored:
+        return
+    _monitored.add(loop)
+    task = loop.create_task(_watch(getattr(settings, 'LOOP_LAG_INTERVAL', 0.5)))
+    task.add_done_callback(lambda _: _monitored.discard(loop))
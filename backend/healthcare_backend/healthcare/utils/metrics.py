@@ -0,0 +1,387 @@
+# healthcare/utils/metrics.py
+"""
+Small in-process metrics registry with a Prometheus text exposition.
+
+Every worker process (daphne, gunicorn, management commands) records into
+plain dicts guarded by one uncontended lock per metric. A daemon thread
+dumps the process-local values into METRICS_DIR/<pid>.json every
+METRICS_FLUSH_INTERVAL seconds, and the scrape endpoint merges all files:
+counters and histograms are summed over every file, gauges only over
+processes that are still alive. No external service is needed.
+"""
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ContextDecorator
+
+from django.conf import settings
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SLOW_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+_registry = {}
+_registry_lock = threading.Lock()
+_flusher = None
+
+
+def _metrics_dir():
+    return getattr(
+        settings, 'METRICS_DIR',
+        os.path.join(tempfile.gettempdir(), 'healthcare_metrics')
+    )
+
+
+def _flush_interval():
+    return getattr(settings, 'METRICS_FLUSH_INTERVAL', 5)
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry[name] = self
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        _ensure_flusher()
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def samples(self):
+        with self._lock:
+            return [[list(k), v] for k, v in self._values.items()]
+
+
+class Counter(_Metric):
+    """Monotonic counter, summed across processes."""
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Current value, summed across live processes only."""
+    kind = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            value = self._values.get(key, 0) + amount
+            if value:
+                self._values[key] = value
+            else:
+                # Drop zeroed label sets so per-group gauges don't grow forever
+                self._values.pop(key, None)
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class _Timer(ContextDecorator):
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def _recreate_cm(self):
+        # Each decorated call times itself; the default shares this instance (and start) across threads
+        return _Timer(self.histogram, self.labels)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram of observed values (seconds by convention)."""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            # [per-bucket counts..., +Inf count, sum]
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            row[idx] += 1
+            row[-1] += value
+
+    def time(self, **labels):
+        """Context manager / decorator observing the wrapped block's duration."""
+        return _Timer(self, labels)
+
+
+# ------------------------------------------------------------
+#  Per-process snapshot files
+# ------------------------------------------------------------
+
+def _snapshot():
+    with _registry_lock:
+        metrics = list(_registry.values())
+    return {
+        m.name: {
+            'kind': m.kind,
+            'help': m.documentation,
+            'labelnames': list(m.labelnames),
+            'buckets': list(getattr(m, 'buckets', ())),
+            'samples': m.samples(),
+        }
+        for m in metrics
+    }
+
+
+def flush():
+    """Write this process's values to its snapshot file (atomic rename)."""
+    directory = _metrics_dir()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{os.getpid()}.json')
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as fh:
+        json.dump(_snapshot(), fh)
+    os.replace(tmp, path)
+
+
+def _flush_loop():
+    while True:
+        time.sleep(_flush_interval())
+        try:
+            flush()
+        except OSError:
+            pass
+
+
+def _ensure_flusher():
+    global _flusher
+    if _flusher is not None:
+        return
+    with _registry_lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_loop, name='metrics-flush', daemon=True)
+            _flusher.start()
+            atexit.register(flush)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def collect():
+    """Merge the snapshot files of every worker into one metric family dict."""
+    flush()
+    merged = {}
+    directory = _metrics_dir()
+    for filename in os.listdir(directory):
+        if not filename.endswith('.json'):
+            continue
+        try:
+            pid = int(filename[:-5])
+            with open(os.path.join(directory, filename)) as fh:
+                families = json.load(fh)
+        except (ValueError, OSError):
+            continue
+        alive = _pid_alive(pid)
+
+        for name, family in families.items():
+            if family['kind'] == 'gauge' and not alive:
+                continue
+            target = merged.setdefault(name, {**family, 'samples': {}})
+            for labels, value in family['samples']:
+                key = tuple(labels)
+                if family['kind'] == 'histogram':
+                    current = target['samples'].get(key)
+                    target['samples'][key] = (
+                        [a + b for a, b in zip(current, value)] if current else list(value)
+                    )
+                else:
+                    target['samples'][key] = target['samples'].get(key, 0) + value
+    return merged
+
+
+def _format_labels(labelnames, labels, extra=None):
+    pairs = list(zip(labelnames, labels))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    body = ','.join(
+        '{}="{}"'.format(k, str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for k, v in pairs
+    )
+    return '{' + body + '}'
+
+
+def render_text():
+    """Render merged metrics in the Prometheus text exposition format (0.0.4)."""
+    lines = []
+    for name, family in sorted(collect().items()):
+        lines.append(f"# HELP {name} {family['help']}")
+        lines.append(f"# TYPE {name} {family['kind']}")
+        labelnames = family['labelnames']
+        for labels, value in sorted(family['samples'].items()):
+            if family['kind'] != 'histogram':
+                lines.append(f"{name}{_format_labels(labelnames, labels)} {value}")
+                continue
+            cumulative = 0
+            for bound, count in zip(family['buckets'] + ['+Inf'], value[:-1]):
+                cumulative += count
+                le = ('le', bound if bound == '+Inf' else repr(float(bound)))
+                lines.append(f"{name}_bucket{_format_labels(labelnames, labels, le)} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labelnames, labels)} {value[-1]}")
+            lines.append(f"{name}_count{_format_labels(labelnames, labels)} {cumulative}")
+    return '\n'.join(lines) + '\n'
+
+
+# ------------------------------------------------------------
+#  Application metrics
+# ------------------------------------------------------------
+
+QUEUE_UPDATE_SECONDS = Histogram(
+    'healthcare_queue_update_seconds',
+    'Time spent recalculating a doctor-day queue in _update_queue.'
+)
+BOOKING_SECONDS = Histogram(
+    'healthcare_booking_seconds',
+    'End-to-end latency of appointment booking requests.'
+)
+AVAILABLE_SLOTS_SECONDS = Histogram(
+    'healthcare_available_slots_seconds',
+    'Latency of the available_slots lookup.'
+)
+RESCHEDULER_SECONDS = Histogram(
+    'healthcare_rescheduler_run_seconds',
+    'Duration of one automatic rescheduler run.',
+    buckets=SLOW_BUCKETS
+)
+WS_CONNECTIONS = Gauge(
+    'healthcare_ws_connections',
+    'Open WebSocket connections per consumer and group.',
+    labelnames=('consumer', 'group')
+)
+WS_MESSAGES_SENT = Counter(
+    'healthcare_ws_messages_sent_total',
+    'WebSocket frames sent to clients.',
+    labelnames=('consumer',)
+)
+NOTIFICATIONS_WRITTEN = Counter(
+    'healthcare_notifications_written_total',
+    'In-app notifications written to the database.',
+    labelnames=('category',)
+)
+TOKEN_CONFLICTS = Counter(
+    'healthcare_token_allocation_conflicts_total',
+    'Generated appointment tokens that were already taken and had to be re-allocated.'
+)
+CACHE_REQUESTS = Counter(
+    'healthcare_cache_requests_total',
+    'Reference-data cache lookups by namespace and result (hit, stale, miss).',
+    labelnames=('namespace', 'result')
+)
+LOCAL_CACHE_REQUESTS = Counter(
+    'healthcare_two_tier_cache_requests_total',
+    'Two-tier cache reads by the tier that answered (local, backend, miss).',
+    labelnames=('tier',)
+)
+CONDITIONAL_REQUESTS = Counter(
+    'healthcare_conditional_requests_total',
+    'Conditional-GET endpoint requests by result (full, not_modified).',
+    labelnames=('endpoint', 'result')
+)
+CONDITIONAL_BYTES_SAVED = Counter(
+    'healthcare_conditional_bytes_saved_total',
+    'Response body bytes not sent because a 304 was answered instead.',
+    labelnames=('endpoint',)
+)
+SSE_STREAMS = Gauge(
+    'healthcare_sse_streams',
+    'Open Server-Sent Events streams per kind (doctor, department).',
+    labelnames=('kind',)
+)
+SSE_UPSTREAM_SUBSCRIPTIONS = Gauge(
+    'healthcare_sse_upstream_subscriptions',
+    'Channel-layer groups this process is subscribed to on behalf of SSE streams.'
+)
+WS_SEND_OVERFLOWS = Counter(
+    'healthcare_ws_send_overflows_total',
+    'Times a connection\'s outbound queue was full and its pending frames were coalesced.',
+    labelnames=('consumer',)
+)
+WS_EVICTIONS = Counter(
+    'healthcare_ws_evictions_total',
+    'Connections closed for reading too slowly.',
+    labelnames=('consumer', 'reason')
+)
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    'healthcare_event_loop_lag_seconds',
+    'How late the ASGI event loop woke up from a timed sleep.',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+EVENT_LOOP_LAG_LAST = Gauge(
+    'healthcare_event_loop_lag_last_seconds',
+    'Most recent event loop lag sample per worker.'
+)
+PRESENCE_SUBSCRIBERS = Gauge(
+    'healthcare_presence_subscribers',
+    'Subscribers registered for presence per group kind (queue, appointments, department).',
+    labelnames=('kind',)
+)
+PRESENCE_GROUPS = Gauge(
+    'healthcare_presence_groups',
+    'Groups with at least one local subscriber per kind, per worker.',
+    labelnames=('kind',)
+)
+FEED_BROADCASTS = Counter(
+    'healthcare_feed_broadcasts_total',
+    'Live-feed events by group kind and result (sent, buffered only, skipped because nobody listens).',
+    labelnames=('kind', 'result')
+)
+WS_AUTH_REQUESTS = Counter(
+    'healthcare_ws_auth_requests_total',
+    'WebSocket handshake token checks by result (cached, verified, invalid, inactive).',
+    labelnames=('result',)
+)
+TOKEN_BLACKLIST_CHECKS = Counter(
+    'healthcare_token_blacklist_checks_total',
+    'Refresh-token blacklist checks by result (filtered without a query, blacklisted, false_positive, recent).',
+    labelnames=('result',)
+)
+ETA_REFRESH_SECONDS = Histogram(
+    'healthcare_eta_refresh_seconds',
+    'Time spent on one refresh_etas tick over every active queue.'
+)
+ETA_REFRESH_ROWS = Counter(
+    'healthcare_eta_refresh_rows_total',
+    'Appointments looked at by refresh_etas ticks, by result (unchanged, updated).',
+    labelnames=('result',)
+)
@@ -0,0 +1,198 @@
+# healthcare/utils/onboarding.py
+"""
+Bulk doctor onboarding: validate a file of doctor records, hash their
+passwords in a process pool and insert users and doctor profiles with
+bulk_create, reporting the outcome of every row.
+
+Password hashing (PBKDF2 at Django's default iteration count) dominates
+the cost of registering a doctor, so it is spread over
+ONBOARDING_HASH_WORKERS processes and throughput scales with cores.
+Validation runs DoctorRegistrationSerializer's rules per row but checks
+departments and the unique fields (email, phone, Aadhaar, license number)
+against the database in one query each, and against the rest of the file.
+"""
+import csv
+import io
+import json
+import logging
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+
+from healthcare.models import User, Doctor, Department
+from .cache import bump_version
+
+logger = logging.getLogger(__name__)
+
+# (file field, model, model field) checked for clashes before inserting
+UNIQUE_FIELDS = [
+    ('email', User, 'email'),
+    ('phone', User, 'phone'),
+    ('aadhaar_number', User, 'aadhaar_number'),
+    ('license_number', Doctor, 'license_number'),
+]
+DOCTOR_FIELDS = [
+    'specialty', 'department', 'qualification', 'experience',
+    'license_number', 'consultation_fee', 'bio',
+]
+
+
+def read_records(fh, filename=''):
+    """Doctor records from a JSON array (or {"doctors": [...]}) or a CSV with a header row."""
+    data = fh.read()
+    if isinstance(data, bytes):
+        data = data.decode('utf-8-sig')
+    if filename.lower().endswith('.json') or data.lstrip()[:1] in ('[', '{'):
+        records = json.loads(data)
+        return records['doctors'] if isinstance(records, dict) else records
+    return [
+        {key: value for key, value in row.items() if value not in ('', None)}
+        for row in csv.DictReader(io.StringIO(data))
+    ]
+
+
+# ------------------------------------------------------------
+#  Password hashing
+# ------------------------------------------------------------
+
+def hash_passwords(passwords, workers=None):
+    """make_password() for each password, in a pool of `workers` processes."""
+    workers = workers or getattr(settings, 'ONBOARDING_HASH_WORKERS', None) or os.cpu_count() or 1
+    if workers <= 1 or len(passwords) <= 1:
+        return [make_password(p) for p in passwords]
+    # spawn, not fork: forking a threaded ASGI/WSGI worker can copy held locks.
+    # Spawned workers inherit DJANGO_SETTINGS_MODULE and set Django up first.
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(passwords)),
+        mp_context=get_context('spawn'),
+        initializer=django.setup,
+    ) as pool:
+        return list(pool.map(make_password, passwords, chunksize=max(1, len(passwords) // (workers * 4))))
+
+
+# ------------------------------------------------------------
+#  Onboarding
+# ------------------------------------------------------------
+
+def _validate(records):
+    """Per-row validated data or errors, including clashes with the database and the file."""
+    from healthcare.serializers import DoctorOnboardingRowSerializer
+
+    context = {'departments': Department.objects.in_bulk()}
+    rows = []
+    for index, record in enumerate(records):
+        serializer = DoctorOnboardingRowSerializer(data=record, context=context)
+        if serializer.is_valid():
+            data = dict(serializer.validated_data)
+            data['email'] = User.objects.normalize_email(data['email'])
+            rows.append({'row': index, 'data': data, 'errors': {}})
+        else:
+            rows.append({'row': index, 'data': None, 'errors': serializer.errors})
+
+    valid = [row for row in rows if row['data'] is not None]
+    for field, model, model_field in UNIQUE_FIELDS:
+        values = [row['data'][field] for row in valid if row['data'].get(field)]
+        taken = set(
+            model.objects.filter(**{f'{model_field}__in': values}).values_list(model_field, flat=True)
+        ) if values else set()
+        seen = set()
+        for row in valid:
+            value = row['data'].get(field)
+            if not value:
+                continue
+            if value in taken:
+                row['errors'][field] = [f'A record with this {field} already exists.']
+            elif value in seen:
+                row['errors'][field] = [f'Duplicate {field} earlier in the file.']
+            seen.add(value)
+    return rows
+
+
+def _build(row, registered_by):
+    data = dict(row['data'])
+    password = data.pop('password')
+    doctor_data = {field: data.pop(field, '') for field in DOCTOR_FIELDS}
+    user = User(
+        role='doctor',
+        username=data['email'].split('@')[0] + str(uuid.uuid4())[:8],  # as User.save() would
+        password=password,
+        **data,
+    )
+    return user, Doctor(registered_by=registered_by, **doctor_data)
+
+
+def _insert(pairs):
+    # MySQL's bulk_create doesn't return primary keys: read them back by the unique email and user
+    with transaction.atomic():
+        User.objects.bulk_create([user for user, _ in pairs])
+        user_ids = dict(
+            User.objects.filter(email__in=[user.email for user, _ in pairs]).values_list('email', 'id')
+        )
+        for user, doctor in pairs:
+            user.id = user_ids[user.email]
+            doctor.user_id = user.id
+        Doctor.objects.bulk_create([doctor for _, doctor in pairs])
+        doctor_ids = dict(
+            Doctor.objects.filter(user_id__in=user_ids.values()).values_list('user_id', 'id')
+        )
+        for user, doctor in pairs:
+            doctor.id = doctor_ids[user.id]
+
+
+def onboard_doctors(records, registered_by=None, batch_size=None, workers=None):
+    """
+    Validate, hash and insert doctor records. Returns
+    {"created": n, "failed": n, "rows": [{"row", "status", "email", ...}]},
+    one entry per record in input order; status is created, invalid or failed.
+    """
+    batch_size = batch_size or getattr(settings, 'ONBOARDING_BATCH_SIZE', 200)
+    rows = _validate(records)
+    ready = [row for row in rows if not row['errors']]
+
+    hashes = hash_passwords([row['data']['password'] for row in ready], workers=workers)
+    for row, hashed in zip(ready, hashes):
+        row['data']['password'] = hashed
+
+    for start in range(0, len(ready), batch_size):
+        batch = ready[start:start + batch_size]
+        pairs = [_build(row, registered_by) for row in batch]
+        try:
+            _insert(pairs)
+            done = list(zip(batch, pairs))
+        except IntegrityError:
+            # Someone registered a clashing user meanwhile: find it row by row
+            logger.warning(f"Onboarding batch at row {batch[0]['row']} clashed, retrying rows singly")
+            done = []
+            for row in batch:
+                pair = _build(row, registered_by)
+                try:
+                    _insert([pair])
+                    done.append((row, pair))
+                except IntegrityError as exc:
+                    row['errors']['non_field_errors'] = [str(exc)]
+        for row, (user, doctor) in done:
+            row['user_id'], row['doctor_id'] = user.id, doctor.id
+
+    if ready:
+        # bulk_create skips the post_save receivers
+        bump_version('doctors')
+        bump_version('departments')
+
+    report = []
+    for row in rows:
+        source = row['data'] or records[row['row']]
+        entry = {'row': row['row'], 'email': source.get('email') if isinstance(source, dict) else None}
+        if 'doctor_id' in row:
+            entry.update(status='created', user_id=row['user_id'], doctor_id=row['doctor_id'])
+        else:
+            entry.update(status='failed' if row['data'] is not None and 'non_field_errors' in row['errors']
+                         else 'invalid', errors=row['errors'])
+        report.append(entry)
+    created = sum(entry['status'] == 'created' for entry in report)
+    return {'created': created, 'failed': len(report) - created, 'rows': report}
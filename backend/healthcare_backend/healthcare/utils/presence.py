@@ -0,0 +1,185 @@
+# healthcare/utils/presence.py
+"""
+Who is listening on which channel-layer group, across all workers.
+
+Each worker counts its own subscribers per group (WebSocket consumers and
+GroupFanout upstream subscriptions join and leave explicitly) and adds them
+to a shared counter per group and epoch, `presence:{group}:{epoch}`, an
+epoch being PRESENCE_TTL / 3 seconds. A worker adds its whole count the
+first time it touches a group in an epoch (on a join, leave or its
+heartbeat, which beats twice an epoch) and +1 / -1 after that, all with
+atomic cache.incr, so joins and leaves take no lock and one or two round
+trips. The broadcast path (queue_feed.publish) reads this epoch's and the
+previous epoch's counter and a `presence:{group}:left` marker per event:
+  LISTENING  either counter is positive: buffer and send as usual
+  RECENT     the last subscriber of some worker left less than
+             PRESENCE_RESUME_WINDOW ago: buffer for a resuming client, but
+             don't send
+  ABSENT     neither: skip building, buffering and sending the event
+
+The previous epoch's counter misses the leaves that came after it, so a
+group can read LISTENING for up to an epoch after its last subscriber left;
+a worker that crashes stops adding itself, so its subscribers drop out
+within two epochs. A stale count only costs a
+wasted group_send; a missing one would lose a live update, so any doubt (a
+cache error on the way in or out) counts as present, and a count that
+could not be written is added again on the next heartbeat.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .metrics import PRESENCE_SUBSCRIBERS, PRESENCE_GROUPS
+
+logger = logging.getLogger(__name__)
+
+LISTENING, RECENT, ABSENT = 'listening', 'recent', 'absent'
+
+
+def _ttl():
+    return getattr(settings, 'PRESENCE_TTL', 60)
+
+
+def _resume_window():
+    return getattr(settings, 'PRESENCE_RESUME_WINDOW', 120)
+
+
+def _epoch_seconds():
+    return max(_ttl() / 3, 1)
+
+
+def _epoch():
+    return int(time.time() // _epoch_seconds())
+
+
+def _count_key(group, epoch):
+    return f'presence:{group}:{epoch}'
+
+
+def _left_key(group):
+    return f'presence:{group}:left'
+
+
+def group_kind(group):
+    """'queue', 'appointments', 'department', ... (metric label for a group name)"""
+    return group.rsplit('_', 1)[0]
+
+
+class Presence:
+    """This worker's subscriber counts, added into the shared per-epoch counters"""
+
+    def __init__(self):
+        self.counts = {}
+        # group -> epoch whose counter already holds this worker's count
+        self.added = {}
+        self._lock = threading.Lock()
+        self._heartbeat = None
+
+    def join(self, group):
+        with self._lock:
+            count = self.counts[group] = self.counts.get(group, 0) + 1
+            epoch, amount = self._claim(group, count, 1)
+        PRESENCE_SUBSCRIBERS.inc(kind=group_kind(group))
+        if count == 1:
+            PRESENCE_GROUPS.inc(kind=group_kind(group))
+        self._ensure_heartbeat()
+        self._add(group, epoch, amount)
+
+    def leave(self, group):
+        with self._lock:
+            count = self.counts.get(group, 0) - 1
+            if count < 0:
+                return
+            if count:
+                self.counts[group] = count
+            else:
+                del self.counts[group]
+            epoch, amount = self._claim(group, count, -1)
+        PRESENCE_SUBSCRIBERS.dec(kind=group_kind(group))
+        if not count:
+            PRESENCE_GROUPS.dec(kind=group_kind(group))
+            try:
+                # Keep buffering events for clients that reconnect
+                cache.set(_left_key(group), 1, _resume_window())
+            except Exception:
+                logger.warning(f"Could not mark {group} as recently left", exc_info=True)
+        self._add(group, epoch, amount)
+
+    def status(self, group):
+        """LISTENING, RECENT or ABSENT (see the module docstring)."""
+        if self.counts.get(group):
+            return LISTENING
+        epoch = _epoch()
+        keys = [_count_key(group, epoch), _count_key(group, epoch - 1), _left_key(group)]
+        try:
+            found = cache.get_many(keys)
+        except Exception:
+            logger.warning(f"Presence lookup for {group} failed", exc_info=True)
+            return LISTENING
+        if max(found.get(keys[0], 0), found.get(keys[1], 0)) > 0:
+            return LISTENING
+        return RECENT if keys[2] in found else ABSENT
+
+    def subscriber_count(self, group):
+        """Subscribers in the group over all workers, as of the last epoch that all of them reported in."""
+        epoch = _epoch()
+        found = cache.get_many([_count_key(group, epoch), _count_key(group, epoch - 1)])
+        return max(list(found.values()) or [0])
+
+    def _claim(self, group, count, delta):
+        """(epoch, amount) to add for a change of `delta`; call with the lock held."""
+        epoch = _epoch()
+        if self.added.get(group) == epoch:
+            return epoch, delta
+        if not count:
+            self.added.pop(group, None)
+            return epoch, 0
+        self.added[group] = epoch
+        return epoch, count
+
+    def _add(self, group, epoch, amount):
+        if not amount:
+            return
+        key = _count_key(group, epoch)
+        try:
+            try:
+                cache.incr(key, amount)
+            except ValueError:
+                if amount < 0:
+                    # Our count of this epoch is gone (evicted): never leave a negative one behind
+                    raise
+                # First count of the epoch; another worker may have created it meanwhile
+                if not cache.add(key, amount, _ttl()):
+                    cache.incr(key, amount)
+        except Exception as exc:
+            if not isinstance(exc, ValueError):
+                logger.warning(f"Could not update presence for {group}", exc_info=True)
+            with self._lock:
+                # Add the whole count again on the next heartbeat
+                if self.added.get(group) == epoch:
+                    del self.added[group]
+
+    def _ensure_heartbeat(self):
+        if self._heartbeat is not None:
+            return
+        with self._lock:
+            if self._heartbeat is None:
+                self._heartbeat = threading.Thread(target=self._beat, name='presence-heartbeat', daemon=True)
+                self._heartbeat.start()
+
+    def _beat(self):
+        while True:
+            time.sleep(_epoch_seconds() / 2)
+            try:
+                with self._lock:
+                    claims = [(group, *self._claim(group, count, 0)) for group, count in self.counts.items()]
+                for group, epoch, amount in claims:
+                    self._add(group, epoch, amount)
+            except Exception:
+                logger.warning("Presence heartbeat failed", exc_info=True)
+
+
+presence = Presence()
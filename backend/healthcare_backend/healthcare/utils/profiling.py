@@ -0,0 +1,158 @@
+# healthcare/utils/profiling.py
+"""
+On-demand cProfile capture of individual API requests.
+
+A request is profiled when it carries a signed token (issued to admins by
+/api/admin/profiling_token/) in the X-Profile-Token header or the _profile
+query parameter, or when it falls into the PROFILING_SAMPLE_RATE fraction
+of traffic. Everything else pays for one header lookup and, with sampling
+enabled, one random() call.
+"""
+import cProfile
+import logging
+import marshal
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core import signing
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile-Token'
+PROFILE_PARAM = '_profile'
+_SALT = 'healthcare.profiling'
+
+
+def issue_profile_token(user):
+    """Return a signed, time-limited token that switches profiling on."""
+    return signing.TimestampSigner(salt=_SALT).sign(str(user.pk))
+
+
+def _token_is_valid(token):
+    try:
+        signing.TimestampSigner(salt=_SALT).unsign(
+            token, max_age=getattr(settings, 'PROFILING_TOKEN_MAX_AGE', 3600)
+        )
+    except signing.BadSignature:
+        return False
+    return True
+
+
+class _QueryCounter:
+    """execute_wrapper that counts queries and time spent in the database"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - start
+
+
+class ProfilingMiddleware:
+    """Wrap selected requests in cProfile and store the result as a RequestProfile"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+        self.path_prefix = getattr(settings, 'PROFILING_PATH_PREFIX', '/api/')
+
+    def __call__(self, request):
+        trigger = self._trigger(request)
+        if trigger is None:
+            return self.get_response(request)
+        return self._profile(request, trigger)
+
+    def _trigger(self, request):
+        token = request.headers.get(PROFILE_HEADER) or request.GET.get(PROFILE_PARAM)
+        if token:
+            return 'token' if _token_is_valid(token) else None
+        if self.sample_rate and random.random() < self.sample_rate:
+            if request.path.startswith(self.path_prefix):
+                return 'sampled'
+        return None
+
+    def _profile(self, request, trigger):
+        counter = _QueryCounter()
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(counter))
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiler is already active on this thread
+                return self.get_response(request)
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        duration = time.perf_counter() - start
+
+        try:
+            self._store(request, response, trigger, profiler, counter, duration)
+        except Exception:
+            logger.exception("Could not store request profile for %s", request.path)
+        return response
+
+    def _store(self, request, response, trigger, profiler, counter, duration):
+        from healthcare.models import RequestProfile
+
+        profiler.create_stats()
+        match = request.resolver_match
+        endpoint = (match.view_name or match.route) if match else request.path
+        # DRF authenticates inside the view and writes the user back onto the Django request
+        user = getattr(request, 'user', None)
+        if user is not None and not user.is_authenticated:
+            user = None
+
+        RequestProfile.objects.create(
+            endpoint=endpoint[:200],
+            path=request.path[:255],
+            method=request.method,
+            status_code=response.status_code,
+            user=user,
+            user_role=getattr(user, 'role', '') or '',
+            trigger=trigger,
+            duration_ms=round(duration * 1000, 3),
+            query_count=counter.count,
+            query_time_ms=round(counter.seconds * 1000, 3),
+            stats=marshal.dumps(profiler.stats),
+        )
+        self._prune()
+
+    @staticmethod
+    def _prune():
+        from healthcare.models import RequestProfile
+
+        keep = getattr(settings, 'PROFILING_MAX_STORED', 500)
+        stale_ids = list(
+            RequestProfile.objects.order_by('-created_at')
+            .values_list('id', flat=True)[keep:keep + 100]
+        )
+        if stale_ids:
+            RequestProfile.objects.filter(id__in=stale_ids).delete()
+
+
+def top_functions(stats_blob, limit=20):
+    """Summarise a stored profile by cumulative time (for quick looks in the API)."""
+    stats = marshal.loads(stats_blob)
+    rows = []
+    for (filename, line, func), (cc, nc, tt, ct, _callers) in stats.items():
+        rows.append({
+            'function': f"{filename}:{line}({func})",
+            'calls': nc,
+            'total_ms': round(tt * 1000, 3),
+            'cumulative_ms': round(ct * 1000, 3),
+        })
+    rows.sort(key=lambda r: r['cumulative_ms'], reverse=True)
+    return rows[:limit]
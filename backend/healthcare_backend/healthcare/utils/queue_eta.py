@@ -0,0 +1,64 @@
+# healthcare/utils/queue_eta.py
+"""
+Queue ETA arithmetic shared by _update_queue and the queue simulator.
+
+The rule: walking the queue in order, the patient in consultation resets
+the running offset to one average consultation, and every waiting patient
+is quoted the running offset and then adds one average to it; finished,
+cancelled and no-show appointments quote zero and don't move the offset.
+queue_offsets() evaluates that walk for a whole matrix of queues at once
+(one row per queue state) with cumulative sums instead of a Python loop;
+queue_waits() is the flat-average case, and the statistical predictor
+(utils/eta_predictor.py) walks the same queue with per-patient moments.
+"""
+import numpy as np
+
+WAITING_STATUSES = ('scheduled', 'confirmed', 'waiting')
+# Status codes for queue_offsets(); anything else (finished, or padding) is OTHER
+OTHER, WAITING, IN_PROGRESS = 0, 1, 2
+MIN_ETA_MINUTES = 5
+
+
+def status_codes(statuses):
+    """Appointment statuses in queue order -> queue_waits() codes."""
+    return np.array([
+        IN_PROGRESS if status == 'in_progress' else WAITING if status in WAITING_STATUSES else OTHER
+        for status in ((s or '').lower() for s in statuses)
+    ], dtype=np.int8)
+
+
+def eta_minutes(avg_duration):
+    """Whole minutes per patient quoted for an average consultation (a timedelta), floored."""
+    return max(int(avg_duration.total_seconds() // 60), MIN_ETA_MINUTES)
+
+
+def queue_offsets(codes, cost, current):
+    """
+    The queue walk with per-patient amounts: every waiting position gets the
+    `cost` of the waiting patients ahead of it since the last consultation in
+    progress, plus that consultation's `current` amount (or the cost from the
+    head of the queue when none is in progress). codes is one queue (1-d) or
+    one queue per row (2-d); cost is per position, current per row.
+    """
+    codes = np.asarray(codes)
+    waiting = codes == WAITING
+    cost = np.where(waiting, np.broadcast_to(np.asarray(cost, dtype=np.float64), codes.shape), 0.0)
+    current = np.asarray(current, dtype=np.float64)
+    if codes.ndim == 2 and current.ndim == 1:
+        current = current[:, None]
+    positions = np.broadcast_to(np.arange(codes.shape[-1]), codes.shape)
+    # Cost waiting strictly before each position, and the last consultation before it
+    ahead = np.cumsum(cost, axis=-1) - cost
+    last = np.maximum.accumulate(np.where(codes == IN_PROGRESS, positions, -1), axis=-1)
+    since = ahead - np.take_along_axis(ahead, np.maximum(last, 0), axis=-1)
+    return np.where(waiting, np.where(last >= 0, since + current, ahead), 0.0)
+
+
+def queue_waits(codes, avg_minutes):
+    """
+    Quoted wait in minutes for every position of one queue (1-d codes) or
+    many (2-d, one queue per row), at avg_minutes per patient (a scalar or
+    one value per row).
+    """
+    avg = np.asarray(avg_minutes, dtype=np.float64)
+    return queue_offsets(codes, avg[:, None] if avg.ndim == 1 else avg, avg)
@@ -0,0 +1,429 @@
+# healthcare/utils/queue_feed.py
+"""
+Live queue feed shared by the SSE streams and the WebSocket consumers.
+
+After a doctor's queue is recalculated, publish_queue_change() rebuilds the
+doctor-day snapshot (three queries, no per-row lookups), diffs it against
+the previous cached snapshot and publishes only the delta to the doctor's
+group `queue_{doctor_id}`. The department's group `department_{id}` gets
+the doctor's compact display-board row instead, and only when it changed.
+
+Every group is a stream with its own sequence number. The last
+QUEUE_FEED_BUFFER_SIZE events of a stream are kept in the cache, one key
+per sequence number, so a reconnecting client asks for "everything after
+seq N" and gets a handful of deltas instead of a fresh database read. When
+the gap is larger than the buffer, it gets the cached snapshot.
+
+Groups nobody subscribes to (see utils/presence.py) get no group_send.
+Their events are still buffered for PRESENCE_RESUME_WINDOW after the last
+subscriber left; after that only the seq advances, and a client resuming
+across such an event gets the snapshot.
+"""
+import logging
+import time
+from datetime import date
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .cache import cached, bump_version
+from .metrics import FEED_BROADCASTS
+from .presence import presence, group_kind, RECENT, ABSENT
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = ('completed', 'cancelled', 'no_show')
+WAITING_STATUSES = ('scheduled', 'confirmed', 'waiting')
+HEADER_FIELDS = ('current_token', 'total_tokens', 'completed_tokens')
+BOARD_NEXT_TOKENS = 3
+LOCK_TIMEOUT = 5
+LOCK_WAIT = 2
+
+
+def _buffer_size():
+    return getattr(settings, 'QUEUE_FEED_BUFFER_SIZE', 200)
+
+
+def _event_ttl():
+    return getattr(settings, 'QUEUE_FEED_EVENT_TTL', 3600)
+
+
+def doctor_group(doctor_id):
+    return f'queue_{doctor_id}'
+
+
+def department_group(department_id):
+    return f'department_{department_id}'
+
+
+def appointment_group(user_id):
+    return f'appointments_{user_id}'
+
+
+# ------------------------------------------------------------
+#  Sequence-numbered ring buffer per stream
+# ------------------------------------------------------------
+
+def _seq_key(stream):
+    return f'feed:{stream}:seq'
+
+
+def _event_key(stream, seq):
+    return f'feed:{stream}:ev:{seq}'
+
+
+def current_seq(stream):
+    return cache.get(_seq_key(stream)) or 0
+
+
+def _next_seq(stream):
+    try:
+        return cache.incr(_seq_key(stream))
+    except ValueError:
+        cache.add(_seq_key(stream), 0, None)
+        return cache.incr(_seq_key(stream))
+
+
+def append_event(stream, event, data):
+    """Store an event in the stream's buffer and return its sequence number."""
+    seq = _next_seq(stream)
+    # Older keys simply expire; readers never look further back than the buffer
+    cache.set(_event_key(stream, seq), {'seq': seq, 'event': event, 'data': data}, _event_ttl())
+    return seq
+
+
+def events_since(stream, last_seq):
+    """
+    Events after last_seq in order, or None when they can't all be replayed
+    (gap larger than the buffer, expired keys, or a reset in between).
+    """
+    head = current_seq(stream)
+    if last_seq > head:
+        return None  # the counter was reset (cache flush); resync
+    if head - last_seq > _buffer_size():
+        return None
+    keys = [_event_key(stream, seq) for seq in range(last_seq + 1, head + 1)]
+    found = cache.get_many(keys)
+    if len(found) != len(keys):
+        return None
+    events = [found[k] for k in keys]
+    if any(ev['event'].endswith('_reset') for ev in events):
+        return None
+    return events
+
+
+def publish(stream, event, data):
+    """
+    Append to the stream's buffer and push to the group of the same name.
+    `data` may be a callable so the payload is only built when someone listens.
+    """
+    status = presence.status(stream)
+    if status == ABSENT:
+        # Still advance the seq so a resuming client sees the gap
+        FEED_BROADCASTS.inc(kind=group_kind(stream), result='skipped')
+        return _next_seq(stream)
+    if callable(data):
+        data = data()
+    seq = append_event(stream, event, data)
+    if status == RECENT:
+        FEED_BROADCASTS.inc(kind=group_kind(stream), result='buffered')
+        return seq
+    FEED_BROADCASTS.inc(kind=group_kind(stream), result='sent')
+    message = {'type': 'feed.event', 'stream': stream, 'seq': seq, 'event': event, 'data': data}
+    try:
+        async_to_sync(get_channel_layer().group_send)(stream, message)
+    except Exception:
+        # Buffered clients catch up on their next resume
+        logger.warning(f"Could not push {event} to {stream}", exc_info=True)
+    return seq
+
+
+# ------------------------------------------------------------
+#  Doctor-day snapshots
+# ------------------------------------------------------------
+
+def _snapshot_key(doctor_id, day):
+    return f'feed:snapshot:{doctor_id}:{day.isoformat()}'
+
+
+def build_snapshot(doctor_id, day):
+    """Current queue of one doctor for one day, straight from the database."""
+    from healthcare.models import Doctor, Appointment, QueueStatus
+
+    doctor = (
+        Doctor.objects.select_related('user')
+        .only('id', 'department_id', 'user__full_name')
+        .filter(id=doctor_id).first()
+    )
+    if doctor is None:
+        return None
+    header = QueueStatus.objects.filter(
+        doctor_id=doctor_id, appointment_date=day
+    ).values(*HEADER_FIELDS).first() or {'current_token': '', 'total_tokens': 0, 'completed_tokens': 0}
+
+    rows = Appointment.objects.filter(
+        doctor_id=doctor_id, appointment_date=day
+    ).exclude(status__in=FINISHED_STATUSES).order_by('queue_position').values_list(
+        'token_number', 'patient__full_name', 'status', 'queue_position',
+        'estimated_wait_minutes', 'estimated_wait_p90_minutes', 'estimated_time'
+    )
+    return {
+        'doctor_id': doctor.id,
+        'doctor_name': doctor.full_name,
+        'department_id': doctor.department_id,
+        'date': day.isoformat(),
+        **header,
+        'queue': [
+            {
+                'token_number': token,
+                'patient_name': name,
+                'status': status,
+                'queue_position': position,
+                'eta_minutes': eta,
+                'eta_p90_minutes': eta_p90,
+                'estimated_time': at.strftime('%H:%M') if at else None,
+            }
+            for token, name, status, position, eta, eta_p90, at in rows
+        ],
+    }
+
+
+def doctor_snapshot(doctor_id, day=None):
+    """Cached snapshot with the stream seq it is current up to."""
+    day = day or timezone.localdate()
+    snapshot = cache.get(_snapshot_key(doctor_id, day))
+    if snapshot is not None:
+        return snapshot
+
+    # Cold key: one worker builds it while reconnecting clients wait on the lock
+    lock_key = f'feed:lock:{doctor_id}'
+    locked = _acquire(lock_key)
+    try:
+        snapshot = cache.get(_snapshot_key(doctor_id, day))
+        if snapshot is None:
+            seq = current_seq(doctor_group(doctor_id))
+            snapshot = build_snapshot(doctor_id, day)
+            if snapshot is None:
+                return None
+            snapshot['seq'] = seq
+            cache.add(_snapshot_key(doctor_id, day), snapshot, 86400)
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    return snapshot
+
+
+def diff_snapshots(old, new):
+    """Header fields that changed, entries added or changed, and tokens removed."""
+    delta = {
+        'doctor_id': new['doctor_id'],
+        'department_id': new['department_id'],
+        'date': new['date'],
+    }
+    header = {f: new[f] for f in HEADER_FIELDS if old.get(f) != new[f]}
+    if header:
+        delta['header'] = header
+
+    before = {e['token_number']: e for e in old['queue']}
+    after = {e['token_number']: e for e in new['queue']}
+    upsert = [e for token, e in after.items() if before.get(token) != e]
+    remove = [token for token in before if token not in after]
+    if upsert:
+        delta['upsert'] = upsert
+    if remove:
+        delta['remove'] = remove
+    return delta
+
+
+def _acquire(lock_key):
+    deadline = time.monotonic() + LOCK_WAIT
+    while not cache.add(lock_key, 1, LOCK_TIMEOUT):
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def publish_queue_change(doctor_id, day):
+    """
+    Rebuild the doctor's snapshot for `day` and publish what changed.
+    Only today's queue is live; other days just drop their cached snapshot.
+    """
+    if isinstance(day, str):
+        day = date.fromisoformat(day)
+    if day != timezone.localdate():
+        cache.delete(_snapshot_key(doctor_id, day))
+        return None
+
+    # Serialize per doctor so every delta is taken against the snapshot
+    # the previous delta produced
+    lock_key = f'feed:lock:{doctor_id}'
+    locked = _acquire(lock_key)
+    try:
+        old = cache.get(_snapshot_key(doctor_id, day))
+        new = build_snapshot(doctor_id, day)
+        if new is None:
+            return None
+
+        stream = doctor_group(doctor_id)
+        if old is None:
+            # Nothing to diff against (first change today or evicted): subscribers resync
+            delta = None
+            new['seq'] = publish(stream, 'queue_reset', {'doctor_id': doctor_id, 'date': new['date']})
+        else:
+            delta = diff_snapshots(old, new)
+            if not {'header', 'upsert', 'remove'} & set(delta):
+                return None
+            new['seq'] = publish(stream, 'queue_delta', delta)
+        cache.set(_snapshot_key(doctor_id, day), new, 86400)
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    # Aggregates built from the snapshots (live_queue) are only current from here
+    bump_version('queue')
+
+    row = board_row(new)
+    if new['department_id'] and (old is None or board_row(old) != row):
+        publish(department_group(new['department_id']), 'board_row', row)
+    return new
+
+
+# ------------------------------------------------------------
+#  Department display boards
+# ------------------------------------------------------------
+
+def board_row(snapshot):
+    """What a waiting-area screen shows for one doctor: now serving and the next few."""
+    waiting = [e['token_number'] for e in snapshot['queue'] if e['status'] in WAITING_STATUSES]
+    return {
+        'doctor_id': snapshot['doctor_id'],
+        'doctor_name': snapshot['doctor_name'],
+        'current_token': snapshot['current_token'],
+        'next_tokens': waiting[:BOARD_NEXT_TOKENS],
+        'waiting': len(waiting),
+    }
+
+
+def department_board(department_id, day=None):
+    """Board rows of every available doctor in a department, with the department stream seq."""
+    from healthcare.models import Doctor
+
+    seq = current_seq(department_group(department_id))
+    doctor_ids = Doctor.objects.filter(
+        department_id=department_id, is_verified=True, is_available=True
+    ).order_by('id').values_list('id', flat=True)
+    snapshots = [doctor_snapshot(doctor_id, day) for doctor_id in doctor_ids]
+    return {
+        'department_id': department_id,
+        'seq': seq,
+        'rows': [board_row(s) for s in snapshots if s is not None],
+    }
+
+
+# ------------------------------------------------------------
+#  Hospital-wide live queue
+# ------------------------------------------------------------
+
+def _summary(snapshot):
+    serving = next((e['token_number'] for e in snapshot['queue'] if e['status'] == 'in_progress'), None)
+    waiting = [e for e in snapshot['queue'] if e['status'] in WAITING_STATUSES]
+    return {
+        'doctor_id': snapshot['doctor_id'],
+        'doctor_name': snapshot['doctor_name'],
+        'department_id': snapshot['department_id'],
+        'current_token': snapshot['current_token'],
+        'serving_token': serving,
+        'next_token': waiting[0]['token_number'] if waiting else None,
+        'waiting': len(waiting),
+        'total_tokens': snapshot['total_tokens'],
+        'completed_tokens': snapshot['completed_tokens'],
+    }
+
+
+def _build_live_queue(day):
+    from healthcare.models import Appointment
+
+    doctor_ids = sorted(set(
+        Appointment.objects.filter(appointment_date=day).order_by()
+        .values_list('doctor_id', flat=True).distinct()
+    ))
+    keys = {_snapshot_key(doctor_id, day): doctor_id for doctor_id in doctor_ids}
+    found = cache.get_many(list(keys))
+    snapshots = [found.get(key) or doctor_snapshot(doctor_id, day) for key, doctor_id in keys.items()]
+
+    pending, by_doctor, by_department, token_doctor = [], {}, {}, {}
+    doctors = []
+    for snapshot in filter(None, snapshots):
+        doctors.append(_summary(snapshot))
+        doctor_pending = by_doctor[snapshot['doctor_id']] = []
+        for e in snapshot['queue']:
+            token_doctor[e['token_number']] = snapshot['doctor_id']
+            if e['status'] not in WAITING_STATUSES:
+                continue
+            entry = {
+                'token_number': e['token_number'],
+                'patient_name': e['patient_name'],
+                'eta_minutes': e['eta_minutes'],
+                'eta_p90_minutes': e.get('eta_p90_minutes'),
+                'estimated_time': e['estimated_time'],
+                'doctor': snapshot['doctor_name'],
+                'doctor_id': snapshot['doctor_id'],
+                'department_id': snapshot['department_id'],
+                'status': e['status'],
+            }
+            doctor_pending.append(entry)
+            pending.append(entry)
+
+    token_order = lambda e: e['token_number']  # noqa: E731
+    pending.sort(key=token_order)
+    for entry in pending:
+        by_department.setdefault(entry['department_id'], []).append(entry)
+    return {
+        'date': day.isoformat(),
+        'doctors': doctors,
+        'pending': pending,
+        'by_doctor': {k: sorted(v, key=token_order) for k, v in by_doctor.items()},
+        'by_department': by_department,
+        'token_doctor': token_doctor,
+    }
+
+
+def live_queue(day=None):
+    """
+    Precomputed hospital-wide queue for a day: per-doctor summaries and
+    pending tokens sorted by token, pre-split per doctor and per department
+    so a request only slices a list. Rebuilt from the per-doctor snapshots
+    once per 'queue' version, i.e. after each published queue change.
+    """
+    day = day or timezone.localdate()
+    return cached('queue', f'live:{day.isoformat()}', lambda: _build_live_queue(day))
+
+
+# ------------------------------------------------------------
+#  Per-user pushes
+# ------------------------------------------------------------
+
+def notification_payload(notification):
+    return {
+        'id': notification.id,
+        'title': notification.title,
+        'message': notification.message,
+        'category': notification.category,
+        'appointment': notification.appointment_id,
+        'archived_appointment': notification.archived_appointment_id,
+        'appointment_token': (
+            notification.appointment.token_number if notification.appointment_id
+            else notification.archived_appointment.token_number if notification.archived_appointment_id
+            else None
+        ),
+        'data': notification.data,
+        'created_at': notification.created_at.isoformat(),
+    }
+
+
+def publish_notification(notification):
+    """Push a notification to its user's open AppointmentConsumer sockets (buffered for resume)."""
+    publish(appointment_group(notification.user_id), 'notification', lambda: notification_payload(notification))
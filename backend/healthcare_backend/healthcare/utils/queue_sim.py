@@ -0,0 +1,271 @@
+# healthcare/utils/queue_sim.py
+"""
+Discrete-event simulation of doctor-day queues for capacity planning and
+for checking the waits _update_queue quotes.
+
+A clinic day is one row of a matrix: bookings are drawn per doctor, each
+patient holds a slot, arrives around it (or never, for a no-show) and takes
+a lognormal consultation. The doctor sees patients in token order, so the
+start of each consultation is max(previous end, arrival); that recurrence
+is walked once per queue position over all clinic-days at once.
+
+Every consultation start is a queue mutation. At each one the queue state
+of the day is rebuilt (earlier patients finished, this one in progress,
+later ones waiting, no-shows included, since nobody knows yet) and priced
+the way _update_queue prices it: queue_eta.queue_waits() for the flat
+average, or eta_predictor.wait_quantiles() for the statistical ETA. The
+quoted start (now + wait) is compared with the simulated start of every
+patient still waiting. Waits and errors go into one-minute histograms so a year of
+a large hospital fits in memory.
+"""
+import logging
+import math
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from healthcare.models import Appointment, Doctor
+from .eta_predictor import wait_quantiles
+from .queue_eta import OTHER, WAITING, IN_PROGRESS, eta_minutes, queue_waits
+
+logger = logging.getLogger(__name__)
+
+# Histogram range in minutes; anything beyond lands in the end bins
+MAX_MINUTES = 720
+# Cells of the (day, event, position) matrix priced per chunk
+CHUNK_CELLS = 4_000_000
+
+
+def doctor_parameters(count, bookings_per_day=25, mean_minutes=10.0, cv=0.5, no_show_rate=0.1,
+                      eta_average=None):
+    """Parameters for `count` identical doctors (arrays keyed like fit_parameters())."""
+    quoted = eta_average if eta_average is not None else mean_minutes
+    return {
+        'doctor_id': np.arange(1, count + 1),
+        'bookings_per_day': np.full(count, float(bookings_per_day)),
+        'mean_minutes': np.full(count, float(mean_minutes)),
+        'cv': np.full(count, float(cv)),
+        'no_show_rate': np.full(count, float(no_show_rate)),
+        'eta_minutes': np.full(count, float(eta_minutes(timedelta(minutes=quoted)))),
+    }
+
+
+def fit_parameters(doctor_ids=None, days=180, default_cv=0.5):
+    """
+    Per-doctor bookings per working day, no-show rate and consultation-duration
+    mean and spread from the last `days` of appointments, plus the average
+    _update_queue would quote them (history, else average_time_per_patient).
+    """
+    since = timezone.localdate() - timedelta(days=days)
+    doctors = Doctor.objects.order_by('id')
+    if doctor_ids:
+        doctors = doctors.filter(id__in=doctor_ids)
+    ids = np.array(list(doctors.values_list('id', flat=True)))
+    if not len(ids):
+        raise ValueError("No doctors to fit")
+    fallback = dict(doctors.values_list('id', 'average_time_per_patient'))
+    index = {doctor_id: i for i, doctor_id in enumerate(ids.tolist())}
+
+    recent = Appointment.objects.filter(doctor_id__in=ids.tolist(), appointment_date__gte=since)
+    booked = np.zeros(len(ids))
+    working_days = np.zeros(len(ids))
+    no_shows = np.zeros(len(ids))
+    seen = np.zeros(len(ids))
+    for row in recent.values('doctor_id').annotate(
+        booked=Count('id', filter=~Q(status='cancelled')),
+        working_days=Count('appointment_date', distinct=True),
+        no_shows=Count('id', filter=Q(status='no_show')),
+        seen=Count('id', filter=Q(status='completed')),
+    ):
+        i = index[row['doctor_id']]
+        booked[i], working_days[i] = row['booked'], row['working_days']
+        no_shows[i], seen[i] = row['no_shows'], row['seen']
+
+    # Durations come back as timestamps: group them in NumPy (no StdDev on every backend)
+    rows = recent.filter(
+        status='completed', consultation_started_at__isnull=False, consultation_ended_at__isnull=False,
+    ).values_list('doctor_id', 'consultation_started_at', 'consultation_ended_at')
+    durations = np.array([(index[d], (end - start).total_seconds() / 60) for d, start, end in rows.iterator()])
+    count = total = squares = np.zeros(len(ids))
+    if len(durations):
+        which, minutes = durations[:, 0].astype(int), durations[:, 1]
+        count = np.bincount(which, minlength=len(ids))
+        total = np.bincount(which, minutes, minlength=len(ids))
+        squares = np.bincount(which, minutes ** 2, minlength=len(ids))
+
+    default_mean = np.array([float(fallback[d] or 10) for d in ids.tolist()])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(count > 0, total / count, default_mean)
+        spread = np.sqrt(np.maximum(squares / count - mean ** 2, 0)) / mean
+    return {
+        'doctor_id': ids,
+        'bookings_per_day': np.where(working_days > 0, booked / np.maximum(working_days, 1), 0.0),
+        'mean_minutes': mean,
+        'cv': np.where(count > 1, spread, default_cv),
+        'no_show_rate': np.where(no_shows + seen > 0, no_shows / np.maximum(no_shows + seen, 1), 0.0),
+        'eta_minutes': np.array([float(eta_minutes(timedelta(minutes=m))) for m in mean]),
+    }
+
+
+def _histogram(values):
+    return np.bincount(
+        np.clip(np.rint(values), -MAX_MINUTES, MAX_MINUTES).astype(np.int64) + MAX_MINUTES,
+        minlength=2 * MAX_MINUTES + 1,
+    )
+
+
+def _quantile(hist, q, origin=MAX_MINUTES):
+    total = hist.sum()
+    if not total:
+        return 0.0
+    return float(np.searchsorted(np.cumsum(hist), q * total) - origin)
+
+
+def _distribution(hist):
+    minutes = np.arange(-MAX_MINUTES, MAX_MINUTES + 1)
+    total = hist.sum()
+    return {
+        'n': int(total),
+        'mean': round(float(hist @ minutes / total), 1) if total else 0.0,
+        'p50': _quantile(hist, 0.5),
+        'p90': _quantile(hist, 0.9),
+        'p99': _quantile(hist, 0.99),
+    }
+
+
+def _queue_states(positions):
+    """
+    Status codes [bookings, event, position]: the queue of a day with that
+    many bookings when consultation `event` starts (earlier tokens done,
+    later ones waiting). The state only depends on the booking count.
+    """
+    column = np.arange(positions)
+    later = column[None, :] > column[:, None]
+    booked = column[None, :] < np.arange(positions + 1)[:, None]
+    codes = np.where(later[None] & booked[:, None, :], WAITING, OTHER).astype(np.int8)
+    codes[:, column, column] = IN_PROGRESS
+    return codes
+
+
+def _simulate_chunk(rng, params, doctor, slot_minutes, arrival_early, arrival_sd):
+    """Draw and run one block of clinic-days (row i is a day of doctor[i])."""
+    rows = len(doctor)
+    positions = params['positions']
+    n = np.minimum(rng.poisson(params['bookings_per_day'][doctor]), positions)
+    column = np.arange(positions)
+    booked = column < n[:, None]
+    slot = column * float(slot_minutes)
+    arrival = slot - arrival_early + rng.normal(0.0, arrival_sd, (rows, positions))
+    present = booked & (rng.random((rows, positions)) >= params['no_show_rate'][doctor][:, None])
+    sigma2 = np.log1p(params['cv'][doctor] ** 2)
+    mu = np.log(params['mean_minutes'][doctor]) - sigma2 / 2
+    duration = rng.lognormal(mu[:, None], np.sqrt(sigma2)[:, None], (rows, positions))
+
+    start = np.full((rows, positions), np.nan)
+    free = np.zeros(rows)
+    for i in range(positions):
+        here = present[:, i]
+        start[:, i] = np.where(here, np.maximum(free, arrival[:, i]), np.nan)
+        free = np.where(here, start[:, i] + duration[:, i], free)
+
+    # Queue state at every consultation start, priced as _update_queue would
+    later = column[None, :] > column[:, None]
+    if params['eta_model'] == 'predicted':
+        # The predictor knows each doctor's usual times (before any duration_scale),
+        # no-show rate and slots, and who has checked in by the time of the quote
+        mean = np.repeat(params['learned_minutes'][doctor], positions)[:, None]
+        var = (mean * np.repeat(params['cv'][doctor], positions)[:, None]) ** 2
+        arrived = arrival[:, None, :] <= start[:, :, None]
+        show = np.where(arrived, 1.0, 1 - params['no_show_rate'][doctor][:, None, None])
+        earliest = np.where(arrived, -np.inf, slot[None, None, :] - start[:, :, None])
+        p50, p90 = wait_quantiles(
+            params['states'][n].reshape(rows * positions, positions),
+            mean, var, show.reshape(rows * positions, positions), mean[:, 0], var[:, 0],
+            earliest.reshape(rows * positions, positions),
+        )
+        quoted = start[:, :, None] + p50.reshape(rows, positions, positions)
+        quoted_p90 = start[:, :, None] + p90.reshape(rows, positions, positions)
+    else:
+        quoted = quoted_p90 = start[:, :, None] + params['waits'][n] * params['eta_minutes'][doctor][:, None, None]
+    pairs = present[:, :, None] & present[:, None, :] & later[None]
+    error = (quoted - start[:, None, :])[pairs]
+    # The patient next in line at each start
+    following = np.where(pairs, column[None, None, :], positions).min(axis=2)
+    has_next = present & (following < positions)
+    next_error = (
+        np.take_along_axis(quoted, np.minimum(following, positions - 1)[..., None], axis=2)[..., 0]
+        - np.take_along_axis(start, np.minimum(following, positions - 1), axis=1)
+    )[has_next]
+
+    return {
+        'clinic_days': rows,
+        'booked': int(booked.sum()),
+        'seen': int(present.sum()),
+        'wait': _histogram((start - arrival)[present]),
+        'delay': _histogram((start - slot)[present]),
+        'overtime': _histogram(np.maximum(free - n * float(slot_minutes), 0.0)[n > 0]),
+        'eta_error': _histogram(error),
+        'next_error': _histogram(next_error),
+        'within_10': int((np.abs(error) <= 10).sum()),
+        'within_p90': int((start[:, None, :] <= quoted_p90)[pairs].sum()),
+    }
+
+
+def simulate(params, days=365, seed=42, slot_minutes=10, arrival_early=10.0, arrival_sd=10.0,
+             duration_scale=1.0, eta_model='flat'):
+    """
+    Simulate `days` clinic-days of every doctor in `params` (see
+    doctor_parameters()/fit_parameters()). duration_scale stretches true
+    consultation times without changing the quoted average, e.g. 1.4 for a
+    doctor whose 10-minute average becomes 14. Returns distributions in minutes:
+    time from arrival to consultation, start relative to slot, overtime per day, and the error
+    of every quoted start against the simulated one (positive = quoted too late).
+    eta_model is 'flat' (average times position, ETA_PREDICTOR off) or
+    'predicted' (eta_predictor.wait_quantiles with the doctor's profile).
+    """
+    began = time.perf_counter()
+    params = dict(params, eta_model=eta_model, learned_minutes=params['mean_minutes'])
+    params['mean_minutes'] = params['mean_minutes'] * duration_scale
+    busiest = float(params['bookings_per_day'].max())
+    params['positions'] = max(1, int(math.ceil(busiest + 4 * math.sqrt(busiest))))
+    rng = np.random.default_rng(seed)
+
+    positions = params['positions']
+    params['states'] = _queue_states(positions)
+    # Flat quotes scale with the average, so price every state once per minute of it
+    params['waits'] = queue_waits(params['states'].reshape(-1, positions), 1.0).reshape(params['states'].shape)
+
+    doctors = np.repeat(np.arange(len(params['doctor_id'])), days)
+    chunk = max(1, CHUNK_CELLS // params['positions'] ** 2)
+    totals = {}
+    for start in range(0, len(doctors), chunk):
+        part = _simulate_chunk(rng, params, doctors[start:start + chunk], slot_minutes, arrival_early, arrival_sd)
+        for key, value in part.items():
+            totals[key] = totals[key] + value if key in totals else value
+
+    quotes = int(totals['eta_error'].sum())
+    abs_error = totals['eta_error'][MAX_MINUTES:].copy()
+    abs_error[1:] += totals['eta_error'][:MAX_MINUTES][::-1]
+    seconds = time.perf_counter() - began
+    logger.info(f"Simulated {totals['clinic_days']} clinic-days in {seconds:.1f}s")
+    return {
+        'clinic_days': totals['clinic_days'],
+        'booked': totals['booked'],
+        'no_shows': totals['booked'] - totals['seen'],
+        'wait': _distribution(totals['wait']),
+        'delay': _distribution(totals['delay']),
+        'overtime': _distribution(totals['overtime']),
+        'eta_error': _distribution(totals['eta_error']),
+        'eta_abs_error': {
+            'p50': _quantile(abs_error, 0.5, origin=0),
+            'p90': _quantile(abs_error, 0.9, origin=0),
+            'within_10_min': round(totals['within_10'] / quotes, 3) if quotes else 0.0,
+            # Share of patients seen no later than the quoted p90
+            'p90_coverage': round(totals['within_p90'] / quotes, 3) if quotes else 0.0,
+        },
+        'next_in_line_error': _distribution(totals['next_error']),
+        'seconds': round(seconds, 2),
+    }
@@ -1,5 +1,6 @@
 # appointments/utils/rescheduler.py
 from datetime import timedelta, datetime, time
+from functools import partial
 from django.db import transaction
 from django.utils import timezone
 from django.db.models import Q
@@ -11,6 +12,9 @@ from healthcare.models import (
     QueueStatus,
     Notification
 )
+from healthcare.utils.metrics import RESCHEDULER_SECONDS, NOTIFICATIONS_WRITTEN
+from healthcare.utils.cache import bump_version
+from healthcare.utils.queue_feed import publish_queue_change, publish_notification
 
 DEFAULT_SLOT_MINUTES = 10
 MAX_SEARCH_DAYS = 30  # safety limit — don't search infinitely
@@ -79,6 +83,7 @@ def find_next_available_slot(doctor: Doctor, start_date):
     return (None, None)
 
 
+@RESCHEDULER_SECONDS.time()
 def reschedule_yesterday_appointments(send_notification=True):
     """
     Find appointments for yesterday (or appointments with appointment_date < today)
@@ -127,13 +132,15 @@ def reschedule_yesterday_appointments(send_notification=True):
                 try:
                     # Recalculate or touch QueueStatus for both old and new dates.
                     QueueStatus.objects.filter(doctor=doctor, appointment_date=new_date).update(last_updated=timezone.now())
+                    bump_version('queue')
+                    transaction.on_commit(partial(publish_queue_change, doctor.id, new_date))
                 except Exception:
                     # not fatal — the existing _update_queue() should be invoked elsewhere in your code
                     pass
 
                 # create a Notification for patient
                 if send_notification:
-                    Notification.objects.create(
+                    notification = Notification.objects.create(
                         user=appt.patient,
                         appointment=appt,
                         title="Appointment rescheduled",
@@ -145,6 +152,8 @@ def reschedule_yesterday_appointments(send_notification=True):
                             "new_time": new_time.strftime('%H:%M')
                         }
                     )
+                    NOTIFICATIONS_WRITTEN.inc(category='appointment')
+                    transaction.on_commit(partial(publish_notification, notification))
                 moved.append({
                     "appointment_id": appt.id,
                     "new_date": new_date.isoformat(),
@@ -0,0 +1,100 @@
+# healthcare/utils/sse.py
+"""
+Server-Sent Events plumbing for the live queue streams.
+
+GroupFanout keeps one channel-layer subscription per group per process and
+copies every message into the bounded queues of the local listeners, so a
+hundred TV boards watching one department cost one upstream subscription.
+A listener that falls too far behind is marked for resync instead of
+blocking the others.
+"""
+import asyncio
+import json
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+
+from .metrics import SSE_UPSTREAM_SUBSCRIPTIONS
+from .presence import presence
+
+logger = logging.getLogger(__name__)
+
+LISTENER_QUEUE_SIZE = 100
+RESYNC = object()
+
+
+def format_event(event, data, event_id=None):
+    """One SSE frame."""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data, separators=(",", ":"))}')
+    return '\n'.join(lines) + '\n\n'
+
+
+class GroupFanout:
+    """Shares one upstream channel-layer subscription per group among local listeners"""
+
+    def __init__(self):
+        self.listeners = {}
+        self.pumps = {}
+        self._lock = asyncio.Lock()
+
+    async def subscribe(self, group):
+        listener = asyncio.Queue(maxsize=LISTENER_QUEUE_SIZE)
+        async with self._lock:
+            self.listeners.setdefault(group, set()).add(listener)
+            if group not in self.pumps:
+                layer = get_channel_layer()
+                channel = await layer.new_channel()
+                await layer.group_add(group, channel)
+                self.pumps[group] = (asyncio.ensure_future(self._pump(group, channel)), channel)
+                SSE_UPSTREAM_SUBSCRIPTIONS.inc()
+                await sync_to_async(presence.join, thread_sensitive=False)(group)
+        return listener
+
+    async def unsubscribe(self, group, listener):
+        async with self._lock:
+            listeners = self.listeners.get(group, set())
+            listeners.discard(listener)
+            if listeners:
+                return
+            self.listeners.pop(group, None)
+            task, channel = self.pumps.pop(group, (None, None))
+            if task is None:
+                return
+            task.cancel()
+            SSE_UPSTREAM_SUBSCRIPTIONS.dec()
+            await get_channel_layer().group_discard(group, channel)
+            await sync_to_async(presence.leave, thread_sensitive=False)(group)
+
+    async def _pump(self, group, channel):
+        layer = get_channel_layer()
+        refresh_every = getattr(layer, 'group_expiry', 86400) / 2
+        joined_at = time.monotonic()
+        while True:
+            try:
+                if time.monotonic() - joined_at > refresh_every:
+                    await layer.group_add(group, channel)
+                    joined_at = time.monotonic()
+                message = await layer.receive(channel)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning(f"SSE upstream for {group} failed", exc_info=True)
+                await asyncio.sleep(1)
+                continue
+            for listener in list(self.listeners.get(group, ())):
+                try:
+                    listener.put_nowait(message)
+                except asyncio.QueueFull:
+                    # Too slow to keep up: drop its backlog, it resyncs from a snapshot
+                    while not listener.empty():
+                        listener.get_nowait()
+                    listener.put_nowait(RESYNC)
+
+
+hub = GroupFanout()
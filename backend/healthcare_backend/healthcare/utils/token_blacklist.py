@@ -0,0 +1,247 @@
+# healthcare/utils/token_blacklist.py
+"""
+Refresh-token blacklist: a Bloom filter in front of the membership check,
+and batched purging of expired rows.
+
+With ROTATE_REFRESH_TOKENS and BLACKLIST_AFTER_ROTATION every refresh
+blacklists the presented token, so `token_blacklist_blacklistedtoken`
+grows without bound and every refresh used to look itself up in it.
+Each worker now keeps a Bloom filter of the JTIs of unexpired blacklisted
+tokens, built on first use and extended on every insert. A JTI the filter
+has never seen is definitely not blacklisted and skips the database; a
+"maybe" (a real hit, or a false positive at TOKEN_BLACKLIST_FILTER_ERROR_RATE)
+is confirmed with the usual query.
+
+Other workers' inserts reach a filter through the cache, read with one
+round trip per check: `inserts` numbers each blacklisting and the JTI is
+stored under its number once the row commits, so a worker that sees the
+counter move replays the JTIs from the cache. If any have been evicted it
+reads the rows past the last id it has seen from the table instead (with
+an overlap for ids that committed out of order), and it does the same
+every TOKEN_BLACKLIST_SYNC_INTERVAL as a safety net. `generation` is
+bumped after a purge so workers rebuild without the purged JTIs.
+
+The JTI is published in transaction.on_commit, so between the commit and
+the publish (and for up to TOKEN_BLACKLIST_SYNC_INTERVAL if the publish is
+lost to a cache outage) other workers' filters can still rule a freshly
+blacklisted token out. Tokens issued within that interval, the ones a
+login-then-logout or a rotation race blacklists young, are therefore
+looked up in the table whatever the filter says; for older ones the sync
+interval is the bound on how long a blacklisting takes to reach every
+worker.
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .metrics import TOKEN_BLACKLIST_CHECKS
+
+logger = logging.getLogger(__name__)
+
+INSERTS_KEY = 'token-blacklist:inserts'
+GENERATION_KEY = 'token-blacklist:generation'
+JTI_KEY = 'token-blacklist:jti:{}'
+# Longest run of inserts replayed from the cache before reading the table instead
+REPLAY_LIMIT = 1000
+# Ids may commit out of order; re-read this many below the highest one seen
+CATCH_UP_OVERLAP = 1000
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (double hashing of one blake2b digest)"""
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class BlacklistFilter:
+    """This worker's Bloom filter of blacklisted JTIs, kept in step with the table"""
+
+    def __init__(self):
+        self.bloom = None
+        self.last_id = 0
+        self.seen = None
+        self.synced_at = 0.0
+        self._lock = threading.Lock()
+
+    def might_contain(self, jti):
+        self._sync()
+        return jti in self.bloom
+
+    def add(self, jti):
+        with self._lock:
+            if self.bloom is not None:
+                self.bloom.add(jti)
+
+    def published(self, number):
+        """This worker's own insert got `number`; it is already in the filter."""
+        with self._lock:
+            if self.seen is not None and number == self.seen[0] + 1:
+                self.seen = (number, self.seen[1])
+
+    def _sync(self):
+        state = cache.get_many([INSERTS_KEY, GENERATION_KEY])
+        state = (state.get(INSERTS_KEY, 0), state.get(GENERATION_KEY, 0))
+        stale = time.monotonic() - self.synced_at >= _setting('TOKEN_BLACKLIST_SYNC_INTERVAL', 60)
+        if self.bloom is not None and state == self.seen and not stale:
+            return
+        with self._lock:
+            if (
+                self.bloom is None
+                or self.seen is None
+                or state[1] != self.seen[1]
+                or self.bloom.count > self.bloom.capacity
+            ):
+                self._rebuild()
+                self.synced_at = time.monotonic()
+            elif stale or not self._replay(self.seen[0], state[0]):
+                self._catch_up()
+                self.synced_at = time.monotonic()
+            self.seen = state
+
+    def _replay(self, seen, current):
+        if not 0 <= current - seen <= REPLAY_LIMIT:
+            return False
+        keys = [JTI_KEY.format(n) for n in range(seen + 1, current + 1)]
+        jtis = cache.get_many(keys) if keys else {}
+        if len(jtis) != len(keys):
+            return False
+        for jti in jtis.values():
+            self.bloom.add(jti)
+        return True
+
+    def _rows(self, after_id):
+        from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+        return (
+            BlacklistedToken.objects.filter(id__gt=after_id, token__expires_at__gt=timezone.now())
+            .order_by('id').values_list('id', 'token__jti').iterator(chunk_size=10000)
+        )
+
+    def _rebuild(self):
+        from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+        started = time.perf_counter()
+        live = BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now()).count()
+        capacity = max(_setting('TOKEN_BLACKLIST_FILTER_CAPACITY', 1_000_000), live * 2)
+        bloom = BloomFilter(capacity, _setting('TOKEN_BLACKLIST_FILTER_ERROR_RATE', 0.001))
+        last_id = 0
+        for row_id, jti in self._rows(0):
+            bloom.add(jti)
+            last_id = row_id
+        self.bloom, self.last_id = bloom, last_id
+        logger.info(
+            f"Token blacklist filter rebuilt: {bloom.count} JTIs, {len(bloom.bits) // 1024} KiB, "
+            f"{time.perf_counter() - started:.2f}s"
+        )
+
+    def _catch_up(self):
+        for row_id, jti in self._rows(max(0, self.last_id - CATCH_UP_OVERLAP)):
+            self.bloom.add(jti)
+            self.last_id = max(self.last_id, row_id)
+
+
+blacklist_filter = BlacklistFilter()
+
+
+def is_blacklisted(jti, issued_at=None):
+    """
+    Membership check that only queries when the filter can't rule the JTI
+    out, or when the token (issued at the `issued_at` timestamp) is younger
+    than TOKEN_BLACKLIST_SYNC_INTERVAL.
+    """
+    from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+    maybe = blacklist_filter.might_contain(jti)
+    if not maybe and (issued_at is None or time.time() - issued_at >= _setting('TOKEN_BLACKLIST_SYNC_INTERVAL', 60)):
+        TOKEN_BLACKLIST_CHECKS.inc(result='filtered')
+        return False
+    found = BlacklistedToken.objects.filter(token__jti=jti).exists()
+    TOKEN_BLACKLIST_CHECKS.inc(result='blacklisted' if found else 'false_positive' if maybe else 'recent')
+    return found
+
+
+def _bump(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        return cache.incr(key)
+
+
+def _publish(jti):
+    number = _bump(INSERTS_KEY)
+    cache.set(JTI_KEY.format(number), jti, _setting('TOKEN_BLACKLIST_SYNC_INTERVAL', 60) * 10)
+    blacklist_filter.published(number)
+
+
+def token_blacklisted(jti):
+    """Called for every new BlacklistedToken row (see signals.py)."""
+    blacklist_filter.add(jti)
+    # Published once the row commits, so a worker falling back to the table finds it
+    transaction.on_commit(lambda: _publish(jti))
+
+
+# ------------------------------------------------------------
+#  Purging
+# ------------------------------------------------------------
+
+def purge_expired_tokens(batch_size=None, max_batches=None, pause=0.0):
+    """
+    Delete outstanding tokens past their expiry, and their blacklist rows,
+    in primary-key order and one short transaction per batch. Returns
+    {"outstanding": n, "blacklisted": n, "batches": n}.
+    """
+    from rest_framework_simplejwt.token_blacklist.models import OutstandingToken, BlacklistedToken
+
+    batch_size = batch_size or _setting('TOKEN_PURGE_BATCH_SIZE', 1000)
+    candidates = OutstandingToken.objects.filter(expires_at__lt=timezone.now()).order_by('id')
+
+    outstanding = blacklisted = batches = 0
+    last_id = 0
+    while max_batches is None or batches < max_batches:
+        ids = list(candidates.filter(id__gt=last_id).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        with transaction.atomic():
+            blacklisted += BlacklistedToken.objects.filter(token_id__in=ids).delete()[0]
+            outstanding += OutstandingToken.objects.filter(id__in=ids).delete()[0]
+        batches += 1
+        last_id = ids[-1]
+        logger.debug(f"Purged token batch {batches}: {len(ids)} outstanding tokens (up to id {last_id})")
+        if pause:
+            time.sleep(pause)
+
+    if blacklisted:
+        # Workers rebuild their filters without the purged JTIs
+        _bump(GENERATION_KEY)
+    return {"outstanding": outstanding, "blacklisted": blacklisted, "batches": batches}
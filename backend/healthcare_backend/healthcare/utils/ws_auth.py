@@ -0,0 +1,139 @@
+# healthcare/utils/ws_auth.py
+"""
+JWT authentication for WebSocket connections.
+
+Browsers can't set headers on a WebSocket handshake, so the simplejwt access
+token comes as `?token=<access>` (an `Authorization: Bearer` header is
+accepted too). JWTAuthMiddleware puts a SocketUser (id and role only) or an
+AnonymousUser into scope['user']; consumers decide what they require.
+
+A reconnect storm presents the same tokens over and over, so both steps are
+cached in the two-tier cache:
+  ws-token:{sha256}  verified claims, until the token's exp
+  ws-user:{id}       role and is_active, for ACCESS_TOKEN_LIFETIME
+                     (dropped when the User row is saved, see signals.py)
+A cached connect therefore costs neither a signature check nor a query.
+"""
+import hashlib
+import time
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .cache import cache
+from .metrics import WS_AUTH_REQUESTS
+
+
+class SocketUser:
+    """The authenticated user of a socket, as far as the token and its cached role tell"""
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, id, role, claims=None):
+        self.id = self.pk = id
+        self.role = role
+        self.claims = claims or {}
+
+    @property
+    def is_patient(self):
+        return self.role == 'patient'
+
+    @property
+    def is_doctor(self):
+        return self.role == 'doctor'
+
+    @property
+    def is_admin(self):
+        return self.role == 'admin'
+
+    def __repr__(self):
+        return f'<SocketUser {self.id} ({self.role})>'
+
+
+def _token_key(raw):
+    return f'ws-token:{hashlib.sha256(raw.encode()).hexdigest()}'
+
+
+def _user_key(user_id):
+    return f'ws-user:{user_id}'
+
+
+def raw_token(scope):
+    """Access token from ?token= or an Authorization: Bearer header, or None."""
+    values = parse_qs(scope.get('query_string', b'').decode()).get('token')
+    if values:
+        return values[0]
+    for name, value in scope.get('headers', ()):
+        if name == b'authorization':
+            value = value.decode()
+            if value.startswith('Bearer '):
+                return value[7:]
+    return None
+
+
+def verified_claims(raw):
+    """Claims of a valid, unexpired access token (cached until exp), else None."""
+    key = _token_key(raw)
+    claims = cache.get(key)
+    if claims is not None:
+        if claims['exp'] > time.time():
+            WS_AUTH_REQUESTS.inc(result='cached')
+            return claims
+        cache.delete(key)
+    try:
+        claims = dict(AccessToken(raw).payload)
+    except TokenError:
+        WS_AUTH_REQUESTS.inc(result='invalid')
+        return None
+    WS_AUTH_REQUESTS.inc(result='verified')
+    cache.set(key, claims, max(1, int(claims['exp'] - time.time())))
+    return claims
+
+
+def user_info(user_id):
+    """{'role', 'is_active'} of a user, or None if there is no such user."""
+    from healthcare.models import User
+
+    key = _user_key(user_id)
+    info = cache.get(key)
+    if info is None:
+        row = User.objects.filter(id=user_id).values('role', 'is_active').first()
+        info = row or {'role': None, 'is_active': False}
+        cache.set(key, info, int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()))
+    return info if info['role'] is not None else None
+
+
+def forget_user(user_id):
+    """Drop the cached role of a user whose row changed."""
+    cache.delete(_user_key(user_id))
+
+
+def authenticate(raw):
+    """SocketUser for an access token, or AnonymousUser."""
+    claims = verified_claims(raw) if raw else None
+    if claims is None:
+        return AnonymousUser()
+    user_id = claims.get(api_settings.USER_ID_CLAIM)
+    info = user_info(user_id) if user_id is not None else None
+    if info is None or not info['is_active']:
+        WS_AUTH_REQUESTS.inc(result='inactive')
+        return AnonymousUser()
+    return SocketUser(user_id, info['role'], claims)
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """Populates scope['user'] from a simplejwt access token"""
+
+    async def __call__(self, scope, receive, send):
+        scope = dict(scope)
+        scope['user'] = await database_sync_to_async(authenticate)(raw_token(scope))
+        return await super().__call__(scope, receive, send)
+
+
+def JWTAuthMiddlewareStack(inner):
+    return JWTAuthMiddleware(inner)
@@ -0,0 +1,97 @@
+# healthcare/utils/ws_loadtest.py
+"""
+Simulated WebSocket clients for the loadtest_* management commands.
+
+Each SimulatedClient drives one consumer instance directly through the
+ASGI interface (no sockets, no daphne), so a single process can hold
+thousands of them and measure what the consumers and the channel layer
+cost per connection. The commands run inside isolated_backends(), so the
+synthetic events they publish on real doctor and patient streams never
+reach a production channel layer, sequence counter or event buffer.
+"""
+import asyncio
+import os
+import resource
+import time
+from contextlib import nullcontext
+
+from django.test.utils import override_settings
+
+IN_MEMORY_CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+LOCAL_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'ws-loadtest'},
+}
+
+
+def isolated_backends(force=False):
+    """
+    In-memory channel layer and local-memory cache for the duration of a
+    load test (the channel layers and caches are rebuilt on the settings
+    change). force=True keeps the configured backends, e.g. to measure Redis,
+    and publishes on the live streams.
+    """
+    if force:
+        return nullcontext()
+    return override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, CACHES=LOCAL_CACHES)
+
+
+def rss_mb():
+    """Resident set size of this process (Linux /proc, else the peak from getrusage)."""
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class SimulatedClient:
+    """
+    Drives one consumer through the ASGI interface. Slow clients take `delay`
+    per frame; `on_frame(client, message, received_at)` sees every frame sent.
+    """
+
+    def __init__(self, app, path, delay=0.0, query_string=b'', on_frame=None):
+        self.app = app
+        self.path = path
+        self.delay = delay
+        self.query_string = query_string
+        self.on_frame = on_frame
+        self.frames = 0
+        self.close_code = None
+        self.accepted = asyncio.Event()
+        self._inbox = asyncio.Queue()
+        self._inbox.put_nowait({'type': 'websocket.connect'})
+
+    async def run(self):
+        scope = {
+            'type': 'websocket', 'path': self.path, 'query_string': self.query_string, 'headers': [],
+            'subprotocols': [], 'client': ('127.0.0.1', 0), 'server': ('loadtest', 80),
+        }
+        await self.app(scope, self._inbox.get, self._send)
+
+    async def _send(self, message):
+        if message['type'] == 'websocket.accept':
+            self.accepted.set()
+        elif message['type'] == 'websocket.send':
+            if self.delay:
+                # Stands in for a socket whose kernel buffer is full
+                await asyncio.sleep(self.delay)
+            self.frames += 1
+            if self.on_frame is not None:
+                self.on_frame(self, message, time.perf_counter())
+        elif message['type'] == 'websocket.close':
+            self.close_code = message.get('code')
+            self.accepted.set()
+            self._inbox.put_nowait({'type': 'websocket.disconnect', 'code': self.close_code})
+
+    def disconnect(self):
+        self._inbox.put_nowait({'type': 'websocket.disconnect', 'code': 1000})
+
+
+async def watch_lag(samples, interval=0.05):
+    """Append how late each `interval` sleep woke up (seconds) until cancelled."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - start - interval))
@@ -1,27 +1,54 @@
 from rest_framework import viewsets, status, permissions, mixins
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.pagination import PageNumberPagination
+from rest_framework_simplejwt.tokens import AccessToken
+from rest_framework_simplejwt.exceptions import TokenError
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.utils.crypto import constant_time_compare
+from django.db import transaction
 from django.db.models import Count, Avg, F, ExpressionWrapper, DurationField
 from datetime import datetime, timedelta, date, time
+from functools import partial
+import asyncio
 
 from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from asgiref.sync import async_to_sync, sync_to_async
 from rest_framework.permissions import IsAuthenticated
 from .models import (
-    User, Doctor, Department, Appointment, MedicalRecord, DoctorReview,
-    FamilyMember, DoctorAvailability, QueueStatus, Notification
+    User, Doctor, Department, Appointment, ArchivedAppointment, MedicalRecord, DoctorReview,
+    FamilyMember, DoctorAvailability, QueueStatus, Notification, RequestProfile
 )
 from .serializers import *
 from .permissions import IsPatient, IsDoctor, IsAdmin
+from .utils.metrics import (
+    QUEUE_UPDATE_SECONDS, BOOKING_SECONDS, AVAILABLE_SLOTS_SECONDS,
+    NOTIFICATIONS_WRITTEN, SSE_STREAMS, render_text
+)
+from .utils.profiling import PROFILE_HEADER, issue_profile_token, top_functions
+from .utils.archiver import appointment_history, count_across_tiers
+from .utils.db_routing import read_replica
+from .utils.cache import cached, doctor_availability, bump_version
+from .utils.conditional import conditional, user_scope
+from .utils.jwt_claims import ClaimsRefreshToken
+from .utils.eta_predictor import predict_queue
+from .utils.onboarding import onboard_doctors, read_records
+from .utils.queue_eta import WAITING_STATUSES, eta_minutes, queue_waits, status_codes
+from .utils.queue_feed import (
+    doctor_group, department_group, doctor_snapshot, department_board,
+    events_since, publish_queue_change, live_queue, publish_notification
+)
+from .utils.sse import hub, format_event, RESYNC
 
 
 def _send_notification(user, title, message, *, category='general', appointment=None, data=None):
     """Utility helper to create in-app notifications safely."""
     if not user:
         return
-    Notification.objects.create(
+    notification = Notification.objects.create(
         user=user,
         appointment=appointment,
         title=title,
@@ -29,6 +56,8 @@ def _send_notification(user, title, message, *, category='general', appointment=
         category=category,
         data=data or {}
     )
+    NOTIFICATIONS_WRITTEN.inc(category=category)
+    transaction.on_commit(partial(publish_notification, notification))
 
 # ============================================================
 #                       AUTHENTICATION
@@ -42,7 +71,7 @@ class AuthViewSet(viewsets.ViewSet):
         serializer = UserRegistrationSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.save()
-            refresh = RefreshToken.for_user(user)
+            refresh = ClaimsRefreshToken.for_user(user)
             return Response({
                 'user': UserProfileSerializer(user).data,
                 'refresh': str(refresh),
@@ -56,7 +85,7 @@ class AuthViewSet(viewsets.ViewSet):
         serializer = LoginSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
             user = serializer.validated_data['user']
-            refresh = RefreshToken.for_user(user)
+            refresh = ClaimsRefreshToken.for_user(user)
 
             dashboard_urls = {
                 'patient': '/patient/dashboard',
@@ -83,6 +112,7 @@ class AuthViewSet(viewsets.ViewSet):
 class PatientViewSet(viewsets.GenericViewSet):
     serializer_class = UserProfileSerializer
     permission_classes = [permissions.IsAuthenticated, IsPatient]
+    replica_actions = {'history'}
 
     def get_queryset(self):
         return User.objects.filter(id=self.request.user.id)
@@ -106,10 +136,16 @@ class PatientViewSet(viewsets.GenericViewSet):
             "profile": UserProfileSerializer(user).data,
             "upcoming_appointments": AppointmentSerializer(upcoming, many=True).data,
             "recent_records": MedicalRecordSerializer(recent_records, many=True).data,
-            "total_appointments": Appointment.objects.filter(patient=user).count(),
+            "total_appointments": count_across_tiers(patient=user),
             "pending_appointments": upcoming.count(),
         })
 
+    @action(detail=False, methods=['get'])
+    def history(self, request):
+        """All appointments of the patient, including archived ones."""
+        page = self.paginate_queryset(appointment_history(patient=request.user))
+        return self.get_paginated_response(page)
+
     @action(detail=False, methods=['get'])
     def profile(self, request):
         return Response(UserProfileSerializer(request.user).data)
@@ -130,6 +166,7 @@ class PatientViewSet(viewsets.GenericViewSet):
 class DoctorViewSet(viewsets.ModelViewSet):
     serializer_class = DoctorSerializer
     permission_classes = [permissions.IsAuthenticated]
+    replica_actions = {'list', 'retrieve', 'history'}
 
     def get_queryset(self):
         user = self.request.user
@@ -139,6 +176,18 @@ class DoctorViewSet(viewsets.ModelViewSet):
             return Doctor.objects.all()
         return Doctor.objects.filter(is_verified=True, is_available=True)
 
+    @method_decorator(conditional('doctors', ['doctors'], scope=user_scope))
+    def list(self, request, *args, **kwargs):
+        # Patients all see the same directory; doctors/admins get live data
+        if request.user.role in ('doctor', 'admin'):
+            return super().list(request, *args, **kwargs)
+        data = cached(
+            'doctors',
+            f'list:{request.build_absolute_uri()}',
+            lambda: super(DoctorViewSet, self).list(request, *args, **kwargs).data
+        )
+        return Response(data)
+
     @action(detail=False, methods=['get'], permission_classes=[IsDoctor])
     def dashboard(self, request):
         doctor = request.user.doctor_profile
@@ -155,7 +204,9 @@ class DoctorViewSet(viewsets.ModelViewSet):
         return Response({
             "profile": DoctorSerializer(doctor).data,
             "today_appointments": AppointmentSerializer(today_appointments, many=True).data,
-            "total_patients": Appointment.objects.filter(doctor=doctor).values('patient').distinct().count(),
+            "total_patients": Appointment.objects.filter(doctor=doctor).order_by().values('patient').union(
+                ArchivedAppointment.objects.filter(doctor=doctor).order_by().values('patient')
+            ).count(),
             "completed_today": today_appointments.filter(status="completed").count(),
             "current_queue": QueueStatusSerializer(queue_status).data if queue_status else None,
         })
@@ -172,6 +223,12 @@ class DoctorViewSet(viewsets.ModelViewSet):
 
         return Response(AppointmentSerializer(appointments, many=True).data)
 
+    @action(detail=False, methods=['get'], permission_classes=[IsDoctor])
+    def history(self, request):
+        """All appointments of the doctor, including archived ones."""
+        page = self.paginate_queryset(appointment_history(doctor=request.user.doctor_profile))
+        return self.get_paginated_response(page)
+
     @action(detail=False, methods=['get', 'post'], permission_classes=[IsDoctor])
     def availability(self, request):
         doctor = request.user.doctor_profile
@@ -208,6 +265,7 @@ class DoctorViewSet(viewsets.ModelViewSet):
 
 class AdminViewSet(viewsets.ViewSet):
     permission_classes = [permissions.IsAuthenticated, IsAdmin]
+    replica_actions = {'dashboard', 'profiles', 'profile_detail', 'profile_download'}
 
     @action(detail=False, methods=['get'])
     def dashboard(self, request):
@@ -218,7 +276,7 @@ class AdminViewSet(viewsets.ViewSet):
             "total_patients": User.objects.filter(role="patient").count(),
             "total_doctors": Doctor.objects.count(),
             "total_departments": Department.objects.filter(is_active=True).count(),
-            "total_appointments": Appointment.objects.count(),
+            "total_appointments": Appointment.objects.count() + ArchivedAppointment.objects.count(),
             "today_appointments": Appointment.objects.filter(appointment_date=today).count(),
             "pending_verifications": Doctor.objects.filter(is_verified=False).count(),
             "recent_registrations": UserProfileSerializer(
@@ -236,6 +294,62 @@ class AdminViewSet(viewsets.ViewSet):
         except Doctor.DoesNotExist:
             return Response({"error": "Doctor not found"}, status=404)
 
+    @action(detail=False, methods=['post'])
+    def onboard_doctors(self, request):
+        """Register many doctors from an uploaded CSV/JSON `file` or a `doctors` list."""
+        upload = request.FILES.get('file')
+        try:
+            records = read_records(upload, upload.name) if upload else request.data.get('doctors')
+        except (ValueError, KeyError) as exc:
+            return Response({"error": f"Unreadable file: {exc}"}, status=400)
+        if not isinstance(records, list) or not records:
+            return Response({"error": "Send a `file` or a non-empty `doctors` list"}, status=400)
+        max_rows = getattr(settings, 'ONBOARDING_MAX_ROWS', 1000)
+        if len(records) > max_rows:
+            return Response({"error": f"At most {max_rows} doctors per request"}, status=400)
+
+        report = onboard_doctors(records, registered_by=request.user)
+        return Response(report, status=201 if report['created'] else 400)
+
+    # ---------------- Request Profiling ----------------
+    @action(detail=False, methods=['post'])
+    def profiling_token(self, request):
+        """Issue a signed token that profiles any request carrying it."""
+        return Response({
+            "token": issue_profile_token(request.user),
+            "header": PROFILE_HEADER,
+            "expires_in": getattr(settings, 'PROFILING_TOKEN_MAX_AGE', 3600),
+        })
+
+    @action(detail=False, methods=['get'])
+    def profiles(self, request):
+        qs = RequestProfile.objects.all()
+        endpoint = request.query_params.get('endpoint')
+        if endpoint:
+            qs = qs.filter(endpoint=endpoint)
+        return Response(RequestProfileSerializer(qs[:100], many=True).data)
+
+    @action(detail=False, methods=['get'], url_path=r'profiles/(?P<profile_id>\d+)')
+    def profile_detail(self, request, profile_id=None):
+        try:
+            profile = RequestProfile.objects.get(pk=profile_id)
+        except RequestProfile.DoesNotExist:
+            return Response({"error": "Profile not found"}, status=404)
+        data = RequestProfileSerializer(profile).data
+        data["top_functions"] = top_functions(profile.stats)
+        return Response(data)
+
+    @action(detail=False, methods=['get'], url_path=r'profiles/(?P<profile_id>\d+)/download')
+    def profile_download(self, request, profile_id=None):
+        """Raw pstats file, loadable with pstats.Stats() or snakeviz."""
+        try:
+            profile = RequestProfile.objects.get(pk=profile_id)
+        except RequestProfile.DoesNotExist:
+            return Response({"error": "Profile not found"}, status=404)
+        response = HttpResponse(bytes(profile.stats), content_type='application/octet-stream')
+        response['Content-Disposition'] = f'attachment; filename="profile-{profile.id}.prof"'
+        return response
+
 
 # ============================================================
 #                     APPOINTMENTS  
@@ -258,6 +372,10 @@ class AppointmentViewSet(viewsets.ModelViewSet):
     def get_serializer_class(self):
         return AppointmentCreateSerializer if self.action == "create" else AppointmentSerializer
 
+    @BOOKING_SECONDS.time()
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         appointment = serializer.save(patient=self.request.user)
         self._update_queue(appointment.doctor, appointment.appointment_date)
@@ -434,6 +552,7 @@ class AppointmentViewSet(viewsets.ModelViewSet):
 
     # ---------------- Available Slots ----------------
     @action(detail=False, methods=['get'], url_path='available_slots')
+    @AVAILABLE_SLOTS_SECONDS.time()
     def available_slots(self, request):
         doctor_id = request.query_params.get("doctor_id")
         date_str = request.query_params.get("date")
@@ -452,14 +571,12 @@ class AppointmentViewSet(viewsets.ModelViewSet):
             return Response({"error": "Invalid date"}, status=400)
 
         day = appt_date.strftime("%A").lower()
-        availability = DoctorAvailability.objects.filter(
-            doctor=doctor, day_of_week=day, is_available=True
-        ).first()
+        availability = doctor_availability(doctor.id, day)
 
         if not availability:
             start_t, end_t = time(9, 0), time(17, 0)
         else:
-            start_t, end_t = availability.start_time, availability.end_time or time(23, 59)
+            start_t, end_t = availability['start_time'], availability['end_time'] or time(23, 59)
 
         start_dt = datetime.combine(appt_date, start_t)
         end_dt = datetime.combine(appt_date, end_t)
@@ -493,6 +610,7 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         })
 
     # ---------------- Queue Logic ----------------
+    @QUEUE_UPDATE_SECONDS.time()
     def _update_queue(self, doctor, appt_date):
         """Recalculate queue ordering, ETA and aggregate stats for a doctor."""
         if not doctor or not appt_date:
@@ -510,38 +628,48 @@ class AppointmentViewSet(viewsets.ModelViewSet):
             appointment_date=appt_date
         )
 
-        # Determine consultation averages from historical data (fallback 10 mins)
-        duration_qs = Appointment.objects.filter(
-            doctor=doctor,
-            status='completed',
-            consultation_started_at__isnull=False,
-            consultation_ended_at__isnull=False
-        ).annotate(
-            duration=ExpressionWrapper(
-                F('consultation_ended_at') - F('consultation_started_at'),
-                output_field=DurationField()
+        # Recalculate queue positions + ETA (utils/eta_predictor.py, or the flat
+        # average of utils/queue_eta.py with ETA_PREDICTOR off)
+        now = timezone.localtime()
+        if getattr(settings, 'ETA_PREDICTOR', True):
+            # The profile build keeps doctor.average_time_per_patient current
+            waits, waits_p90 = predict_queue(doctor.id, appointments, now)
+            avg_duration = timedelta(minutes=doctor.average_time_per_patient or 10)
+        else:
+            # Determine consultation averages from historical data (fallback 10 mins)
+            duration_qs = Appointment.objects.filter(
+                doctor=doctor,
+                status='completed',
+                consultation_started_at__isnull=False,
+                consultation_ended_at__isnull=False
+            ).annotate(
+                duration=ExpressionWrapper(
+                    F('consultation_ended_at') - F('consultation_started_at'),
+                    output_field=DurationField()
+                )
             )
-        )
 
-        avg_duration = duration_qs.aggregate(avg=Avg('duration'))['avg']
-        if not avg_duration:
-            fallback_minutes = doctor.average_time_per_patient or 10
-            avg_duration = timedelta(minutes=fallback_minutes)
-        else:
-            # keep doctor profile aligned in minutes
-            doctor.average_time_per_patient = round(avg_duration.total_seconds() / 60, 1)
-            doctor.save(update_fields=['average_time_per_patient'])
+            avg_duration = duration_qs.aggregate(avg=Avg('duration'))['avg']
+            if not avg_duration:
+                fallback_minutes = doctor.average_time_per_patient or 10
+                avg_duration = timedelta(minutes=fallback_minutes)
+            else:
+                # keep doctor profile aligned in minutes
+                doctor.average_time_per_patient = round(avg_duration.total_seconds() / 60, 1)
+                doctor.save(update_fields=['average_time_per_patient'])
 
-        avg_minutes = max(int(avg_duration.total_seconds() // 60), 5)
+            waits = queue_waits(
+                status_codes(a.status for a in appointments), eta_minutes(avg_duration)
+            ).astype(int).tolist()
+            waits_p90 = waits
 
         # Queue aggregates
-        waiting_statuses = ['scheduled', 'confirmed', 'waiting']
         active_appt = next(
             (a for a in appointments if a.status == 'in_progress'),
             None
         )
         next_in_line = next(
-            (a for a in appointments if a.status in waiting_statuses),
+            (a for a in appointments if a.status in WAITING_STATUSES),
             None
         )
 
@@ -557,35 +685,22 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         qs.average_time_per_patient = avg_duration
         qs.save()
 
-        # Recalculate queue positions + ETA
         updates = []
-        running_offset = 0
-        now = timezone.localtime()
-
-        for idx, appt in enumerate(appointments, start=1):
+        for idx, (appt, wait_minutes, wait_p90) in enumerate(zip(appointments, waits, waits_p90), start=1):
             fields_to_update = []
 
             if appt.queue_position != idx:
                 appt.queue_position = idx
                 fields_to_update.append('queue_position')
 
-            status = (appt.status or '').lower()
-
-            if status in ['completed', 'cancelled', 'no_show']:
-                wait_minutes = 0
-            elif appt == active_appt or status == 'in_progress':
-                wait_minutes = 0
-                running_offset = avg_minutes
-            elif status in waiting_statuses:
-                wait_minutes = max(running_offset, 0)
-                running_offset += avg_minutes
-            else:
-                wait_minutes = 0
-
             if appt.estimated_wait_minutes != wait_minutes:
                 appt.estimated_wait_minutes = wait_minutes
                 fields_to_update.append('estimated_wait_minutes')
 
+            if appt.estimated_wait_p90_minutes != wait_p90:
+                appt.estimated_wait_p90_minutes = wait_p90
+                fields_to_update.append('estimated_wait_p90_minutes')
+
             estimated_dt = now + timedelta(minutes=wait_minutes)
             estimated_time = estimated_dt.time()
             if appt.estimated_time != estimated_time:
@@ -598,45 +713,186 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         if updates:
             Appointment.objects.bulk_update(
                 updates,
-                ['queue_position', 'estimated_wait_minutes', 'estimated_time']
+                ['queue_position', 'estimated_wait_minutes', 'estimated_wait_p90_minutes', 'estimated_time']
             )
+            bump_version('queue')  # bulk_update sends no post_save
+
+        # Push the change to live subscribers once it is visible to them
+        transaction.on_commit(partial(publish_queue_change, doctor.id, appt_date))
 
 
 # ============================================================
 #                  LIVE QUEUE STATUS (GLOBAL)
 # ============================================================
 
+def _queue_day(request):
+    return timezone.localdate()
+
+
+@api_view(["GET"])
+@conditional('queue_board', ['queue'], scope=_queue_day)
+def department_board_status(request, department_id):
+    """Display board of a department: each doctor's current token and next few tokens."""
+    return Response(department_board(department_id))
+
+
+class LiveQueuePagination(PageNumberPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
 @api_view(["GET"])
+@conditional('queue_live', ['queue'], scope=_queue_day)
 def live_queue_status(request):
-    today = date.today()
-    appts = Appointment.objects.filter(appointment_date=today).order_by("token_number")
-
-    current = ""
-    pending = []
-
-    for a in appts:
-        s = (a.status or "").lower()
-
-        if s in ["in_progress", "ongoing"]:
-            current = a.token_number
-
-        if s in ["waiting", "scheduled", "confirmed"]:
-            pending.append({
-                "token_number": a.token_number,
-                "patient_name": a.patient.full_name,
-                "eta_minutes": a.estimated_wait_minutes,
-                "estimated_time": a.estimated_time.strftime("%H:%M") if a.estimated_time else None,
-                "doctor": a.doctor.full_name,
-                "status": a.status
-            })
+    """
+    Today's live queue from the precomputed snapshot (utils/queue_feed.py).
+    Filters: ?department=, ?doctor=, ?token= (the doctor queue holding that token).
+    """
+    board = live_queue()
+    params = request.query_params
+    try:
+        doctor_id = int(params['doctor']) if params.get('doctor') else None
+        department_id = int(params['department']) if params.get('department') else None
+    except ValueError:
+        return Response({"error": "doctor and department must be ids"}, status=400)
+
+    token = params.get('token')
+    if token:
+        doctor_id = board['token_doctor'].get(token, -1)
+
+    doctors = board['doctors']
+    if doctor_id is not None:
+        doctors = [d for d in doctors if d['doctor_id'] == doctor_id]
+        pending = board['by_doctor'].get(doctor_id, [])
+        if token:
+            pending = [e for e in pending if e['token_number'] == token]
+    elif department_id is not None:
+        doctors = [d for d in doctors if d['department_id'] == department_id]
+        pending = board['by_department'].get(department_id, [])
+    else:
+        pending = board['pending']
+
+    paginator = LiveQueuePagination()
+    page = paginator.paginate_queryset(pending, request)
+    serving = [d['serving_token'] for d in doctors if d['serving_token']]
 
     return Response({
-        "current_token": current,
-        "pending_tokens": pending,
-        "total": len(appts)
+        "date": board['date'],
+        "current_token": max(serving) if serving else "",
+        "doctors": doctors,
+        "pending_tokens": page,
+        "count": len(pending),
+        "next": paginator.get_next_link(),
+        "previous": paginator.get_previous_link(),
+        "total": sum(d['total_tokens'] for d in doctors),
     })
 
 
+# ============================================================
+#            LIVE QUEUE STREAM (SERVER-SENT EVENTS)
+# ============================================================
+
+def _stream_authorized(request):
+    # EventSource can't set headers, so the access token may come as ?token=
+    header = request.headers.get('Authorization', '')
+    raw = header[7:] if header.startswith('Bearer ') else request.GET.get('token')
+    if not raw:
+        return False
+    try:
+        AccessToken(raw)
+    except TokenError:
+        return False
+    return True
+
+
+async def _queue_events(kind, group, load_snapshot, snapshot_event, last_seq):
+    """Resume or snapshot, then live events until the stream's lifetime ends."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.SSE_MAX_STREAM_SECONDS
+    SSE_STREAMS.inc(kind=kind)
+    listener = await hub.subscribe(group)
+    try:
+        # Subscribed first, so nothing published from here on can be missed
+        yield f'retry: {settings.SSE_RETRY_MS}\n\n'
+        backlog = None
+        if last_seq is not None:
+            backlog = await sync_to_async(events_since)(group, last_seq)
+        if backlog is None:
+            snapshot = await sync_to_async(load_snapshot)()
+            if snapshot is None:
+                yield format_event('error', {'message': 'Not found'})
+                return
+            sent = snapshot['seq']
+            yield format_event(snapshot_event, snapshot, sent)
+        else:
+            for ev in backlog:
+                yield format_event(ev['event'], ev['data'], ev['seq'])
+            sent = backlog[-1]['seq'] if backlog else last_seq
+
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                message = await asyncio.wait_for(
+                    listener.get(), min(settings.SSE_HEARTBEAT_SECONDS, remaining)
+                )
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+
+            if message is not RESYNC and message['seq'] <= sent:
+                continue
+            backlog = None
+            if message is not RESYNC and not message['event'].endswith('_reset'):
+                backlog = [message] if message['seq'] == sent + 1 else (
+                    await sync_to_async(events_since)(group, sent)
+                )
+            if backlog is None:
+                snapshot = await sync_to_async(load_snapshot)()
+                if snapshot is None:
+                    # The doctor or department went away mid-stream
+                    yield format_event('error', {'message': 'Not found'})
+                    return
+                sent = snapshot['seq']
+                yield format_event(snapshot_event, snapshot, sent)
+                continue
+            for ev in backlog:
+                yield format_event(ev['event'], ev['data'], ev['seq'])
+                sent = ev['seq']
+    finally:
+        await hub.unsubscribe(group, listener)
+        SSE_STREAMS.dec(kind=kind)
+
+
+async def queue_stream(request, kind, object_id):
+    """
+    text/event-stream of one doctor's live queue (snapshot, then deltas) or
+    one department's display board (board, then changed rows). Reconnects
+    with Last-Event-ID get only the missed events.
+    """
+    if not _stream_authorized(request):
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    if kind == 'doctor':
+        group, load_snapshot = doctor_group(object_id), partial(doctor_snapshot, object_id)
+        snapshot_event = 'queue_snapshot'
+    else:
+        group, load_snapshot = department_group(object_id), partial(department_board, object_id)
+        snapshot_event = 'board_snapshot'
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    last_seq = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+
+    # The stream ends after SSE_MAX_STREAM_SECONDS; EventSource reconnects with
+    # Last-Event-ID, which also frees streams whose client silently went away
+    response = StreamingHttpResponse(
+        _queue_events(kind, group, load_snapshot, snapshot_event, last_seq),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 # ============================================================
 #                  DEPARTMENTS
 # ============================================================
@@ -644,6 +900,16 @@ def live_queue_status(request):
 class DepartmentViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Department.objects.filter(is_active=True)
     serializer_class = DepartmentSerializer
+    replica_actions = {'list', 'retrieve'}
+
+    @method_decorator(conditional('departments', ['departments']))
+    def list(self, request, *args, **kwargs):
+        data = cached(
+            'departments',
+            f'list:{request.build_absolute_uri()}',
+            lambda: super(DepartmentViewSet, self).list(request, *args, **kwargs).data
+        )
+        return Response(data)
 
 
 # ============================================================
@@ -656,12 +922,13 @@ class MedicalRecordViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         u = self.request.user
+        records = MedicalRecord.objects.select_related('appointment', 'archived_appointment')
         if u.role == "patient":
-            return MedicalRecord.objects.filter(patient=u)
+            return records.filter(patient=u)
         if u.role == "doctor":
-            return MedicalRecord.objects.filter(doctor=u.doctor_profile)
+            return records.filter(doctor=u.doctor_profile)
         if u.role == "admin":
-            return MedicalRecord.objects.all()
+            return records.all()
         return MedicalRecord.objects.none()
 
     def perform_create(self, serializer):
@@ -721,6 +988,7 @@ def add_doctor_review(request, doctor_id):
     return Response(DoctorReviewSerializer(review).data, status=201)
 
 
+@read_replica
 @api_view(["GET"])
 def get_doctor_reviews(request, doctor_id):
     try:
@@ -732,8 +1000,6 @@ def get_doctor_reviews(request, doctor_id):
     return Response(DoctorReviewSerializer(reviews, many=True).data)
 
 
-from rest_framework.pagination import PageNumberPagination
-
 class NoPagination(PageNumberPagination):
     page_size = None
 
@@ -751,6 +1017,10 @@ class QueueStatusViewSet(viewsets.ReadOnlyModelViewSet):
             qs = qs.filter(doctor_id=doctor_id)
         return qs
 
+    @method_decorator(conditional('queue_status', ['queue'], scope=_queue_day))
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
 
 class NotificationViewSet(mixins.ListModelMixin,
                           mixins.UpdateModelMixin,
@@ -759,7 +1029,10 @@ class NotificationViewSet(mixins.ListModelMixin,
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Notification.objects.filter(user=self.request.user).order_by('-created_at')
+        return (
+            Notification.objects.filter(user=self.request.user)
+            .select_related('appointment', 'archived_appointment').order_by('-created_at')
+        )
 
     @action(detail=True, methods=['post'])
     def mark_read(self, request, pk=None):
@@ -774,3 +1047,16 @@ class NotificationViewSet(mixins.ListModelMixin,
         updated.update(is_read=True, read_at=timezone.now())
         return Response({"updated": count})
 
+
+# ============================================================
+#                        METRICS
+# ============================================================
+
+def metrics(request):
+    """Prometheus scrape endpoint merging the metrics of every worker process."""
+    token = getattr(settings, 'METRICS_AUTH_TOKEN', '')
+    if token and not constant_time_compare(
+        request.headers.get('Authorization', ''), f'Bearer {token}'
+    ):
+        return HttpResponse(status=401)
+    return HttpResponse(render_text(), content_type='text/plain; version=0.0.4; charset=utf-8')
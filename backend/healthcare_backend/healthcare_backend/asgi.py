@@ -10,28 +10,23 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 ASGI config for WebSocket support (Live Queue)
 """
 import os
-import django
-from django.core.asgi import get_asgi_application
-from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.security.websocket import AllowedHostsOriginValidator
-from healthcare.routing import websocket_urlpatterns
 
-# Try to dynamically import AuthMiddlewareStack; if channels isn't installed or the
-# module is unavailable, provide a simple passthrough fallback so the file can still run.
-try:
-    auth_mod = importlib.import_module("channels.auth")
-    AuthMiddlewareStack = getattr(auth_mod, "AuthMiddlewareStack")
-except Exception:
-    # Fallback no-op AuthMiddlewareStack so websocket routing still works
-    def AuthMiddlewareStack(inner):
-        return inner
+from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'healthcare_backend.settings')
+# Set up Django before importing anything that touches models
+django_asgi_app = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+from channels.security.websocket import AllowedHostsOriginValidator  # noqa: E402
+from healthcare.routing import websocket_urlpatterns  # noqa: E402
+from healthcare.utils.ws_auth import JWTAuthMiddlewareStack  # noqa: E402
+
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
+    "http": django_asgi_app,
     "websocket": AllowedHostsOriginValidator(
-        AuthMiddlewareStack(
+        JWTAuthMiddlewareStack(
             URLRouter(websocket_urlpatterns)
         )
     ),
-})
\ No newline at end of file
+})
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 from datetime import timedelta
 from decouple import config
@@ -34,17 +35,27 @@ INSTALLED_APPS = [
 CRONJOBS = [
     # Run every day at midnight
     ('0 0 * * *', 'django.core.management.call_command', ['reschedule_appointments']),
+    # Move finished appointments past the horizon into the archive table
+    ('30 1 * * *', 'django.core.management.call_command', ['archive_appointments']),
+    # Drop expired outstanding/blacklisted refresh tokens
+    ('0 2 * * *', 'django.core.management.call_command', ['purge_tokens']),
 ]
 
+# Appointment archive tier
+APPOINTMENT_ARCHIVE_HORIZON_DAYS = config('APPOINTMENT_ARCHIVE_HORIZON_DAYS', default=90, cast=int)
+APPOINTMENT_ARCHIVE_BATCH_SIZE = config('APPOINTMENT_ARCHIVE_BATCH_SIZE', default=1000, cast=int)
+
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'healthcare.utils.db_routing.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'healthcare.utils.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'healthcare_backend.urls'
@@ -86,6 +97,23 @@ DATABASES = {
     }
 }
 
+# Optional read replica. Views opt in through `replica_actions` / @read_replica
+# (see healthcare/utils/db_routing.py); writes always go to `default`.
+# Point DB_REPLICA_HOST/PORT (or just DB_REPLICA_NAME) at a second MySQL
+# instance or database to try it locally.
+if config('DB_REPLICA_HOST', default='') or config('DB_REPLICA_NAME', default=''):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': config('DB_REPLICA_NAME', default=DATABASES['default']['NAME']),
+        'USER': config('DB_REPLICA_USER', default=DATABASES['default']['USER']),
+        'PASSWORD': config('DB_REPLICA_PASSWORD', default=DATABASES['default']['PASSWORD']),
+        'HOST': config('DB_REPLICA_HOST', default=DATABASES['default']['HOST']),
+        'PORT': config('DB_REPLICA_PORT', default=DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['healthcare.utils.db_routing.ReplicaRouter']
+
 # Custom User Model
 AUTH_USER_MODEL = 'healthcare.User'
 
@@ -120,7 +148,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'healthcare.utils.jwt_claims.ClaimsJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -152,7 +180,39 @@ SIMPLE_JWT = {
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
     'JTI_CLAIM': 'jti',
+    'TOKEN_OBTAIN_SERIALIZER': 'healthcare.utils.jwt_claims.ClaimsTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'healthcare.utils.jwt_claims.ClaimsTokenRefreshSerializer',
+    'TOKEN_BLACKLIST_SERIALIZER': 'healthcare.utils.jwt_claims.ClaimsTokenBlacklistSerializer',
 }
+# Opt in to trusting the role/doctor_id/verified claims instead of loading
+# request.user (healthcare/utils/jwt_claims.py). Saves a query per request, but
+# a deactivation or role change made without signals (queryset.update) or whose
+# stale marker was evicted only takes effect when the access token expires.
+JWT_CLAIMS_AUTH = config('JWT_CLAIMS_AUTH', default=False, cast=bool)
+
+# Refresh-token blacklist (healthcare/utils/token_blacklist.py): per-worker
+# Bloom filter sizing and how often it re-reads the table regardless of the
+# cache counters; purge_tokens deletes expired rows this many at a time.
+TOKEN_BLACKLIST_FILTER_CAPACITY = config('TOKEN_BLACKLIST_FILTER_CAPACITY', default=1_000_000, cast=int)
+TOKEN_BLACKLIST_FILTER_ERROR_RATE = config('TOKEN_BLACKLIST_FILTER_ERROR_RATE', default=0.001, cast=float)
+TOKEN_BLACKLIST_SYNC_INTERVAL = config('TOKEN_BLACKLIST_SYNC_INTERVAL', default=60, cast=int)
+TOKEN_PURGE_BATCH_SIZE = config('TOKEN_PURGE_BATCH_SIZE', default=1000, cast=int)
+
+# Bulk doctor onboarding (healthcare/utils/onboarding.py): password-hashing
+# processes (0 = one per core), rows per bulk_create batch, rows per request
+ONBOARDING_HASH_WORKERS = config('ONBOARDING_HASH_WORKERS', default=0, cast=int)
+ONBOARDING_BATCH_SIZE = config('ONBOARDING_BATCH_SIZE', default=200, cast=int)
+ONBOARDING_MAX_ROWS = config('ONBOARDING_MAX_ROWS', default=1000, cast=int)
+
+# Queue ETAs (healthcare/utils/eta_predictor.py): p50/p90 from per-doctor,
+# per-hour duration profiles built from this many days of consultations and
+# cached this long; False falls back to the flat average per patient.
+ETA_PREDICTOR = config('ETA_PREDICTOR', default=True, cast=bool)
+ETA_HISTORY_DAYS = config('ETA_HISTORY_DAYS', default=90, cast=int)
+ETA_PROFILE_TTL = config('ETA_PROFILE_TTL', default=21600, cast=int)
+# refresh_etas re-quotes every active queue this often (seconds) so ETAs
+# move with the clock between queue changes
+ETA_REFRESH_INTERVAL = config('ETA_REFRESH_INTERVAL', default=30, cast=int)
 
 CORS_ALLOW_ALL_ORIGINS = True
 
@@ -178,6 +238,51 @@ CACHES = {
     }
 }
 
+# Reference-data cache (healthcare/utils/cache.py)
+REFERENCE_CACHE_TTL = config('REFERENCE_CACHE_TTL', default=300, cast=int)
+REFERENCE_CACHE_STALE_GRACE = config('REFERENCE_CACHE_STALE_GRACE', default=300, cast=int)
+# In-process tier in front of Redis; other workers' copies are dropped over
+# the channel layer ('channels') or only within this process ('local').
+LOCAL_CACHE_MAX_ENTRIES = config('LOCAL_CACHE_MAX_ENTRIES', default=10000, cast=int)
+LOCAL_CACHE_TTL = config('LOCAL_CACHE_TTL', default=30, cast=int)
+CACHE_INVALIDATION_BUS = config('CACHE_INVALIDATION_BUS', default='channels')
+
+# Live queue feed (healthcare/utils/queue_feed.py) and its SSE streams
+QUEUE_FEED_BUFFER_SIZE = config('QUEUE_FEED_BUFFER_SIZE', default=200, cast=int)
+QUEUE_FEED_EVENT_TTL = config('QUEUE_FEED_EVENT_TTL', default=3600, cast=int)
+SSE_HEARTBEAT_SECONDS = config('SSE_HEARTBEAT_SECONDS', default=15, cast=int)
+SSE_MAX_STREAM_SECONDS = config('SSE_MAX_STREAM_SECONDS', default=300, cast=int)
+SSE_RETRY_MS = config('SSE_RETRY_MS', default=3000, cast=int)
+
+# WebSocket backpressure (healthcare/consumer.py InstrumentedConsumer)
+WS_SEND_QUEUE_SIZE = config('WS_SEND_QUEUE_SIZE', default=64, cast=int)
+WS_SEND_TIMEOUT = config('WS_SEND_TIMEOUT', default=10, cast=int)
+WS_EVICT_OVERFLOWS = config('WS_EVICT_OVERFLOWS', default=3, cast=int)
+WS_EVICT_WINDOW = config('WS_EVICT_WINDOW', default=60, cast=int)
+LOOP_LAG_INTERVAL = config('LOOP_LAG_INTERVAL', default=0.5, cast=float)
+
+# Group presence (healthcare/utils/presence.py); broadcasts to groups nobody
+# listens on are skipped. Counts are kept per PRESENCE_TTL / 3 epoch, so a crashed
+# worker's subscribers drop out within two of them;
+# events are still buffered for resumes this long after the last one left.
+PRESENCE_TTL = config('PRESENCE_TTL', default=60, cast=int)
+PRESENCE_RESUME_WINDOW = config('PRESENCE_RESUME_WINDOW', default=120, cast=int)
+
+# Metrics (scraped from /api/metrics/)
+# Each worker process dumps its counters into METRICS_DIR; clear it on deploy.
+METRICS_DIR = config('METRICS_DIR', default=os.path.join(tempfile.gettempdir(), 'healthcare_metrics'))
+METRICS_FLUSH_INTERVAL = config('METRICS_FLUSH_INTERVAL', default=5, cast=int)
+METRICS_AUTH_TOKEN = config('METRICS_AUTH_TOKEN', default='')
+
+# Request profiling (see healthcare/utils/profiling.py)
+PROFILING_SAMPLE_RATE = config('PROFILING_SAMPLE_RATE', default=0.0, cast=float)
+PROFILING_TOKEN_MAX_AGE = config('PROFILING_TOKEN_MAX_AGE', default=3600, cast=int)
+PROFILING_MAX_STORED = config('PROFILING_MAX_STORED', default=500, cast=int)
+
+# Benchmarks: only on a scratch database may bench_indexes drop indexes and
+# bench_archive seed and archive appointments (without --force)
+BENCHMARK_DATABASE = config('BENCHMARK_DATABASE', default=False, cast=bool)
+
 # Logging Configuration
 LOGGING = {
     'version': 1,
@@ -197,7 +197,10 @@ const HomePage = () => {
 
     const loadQueue = async () => {
       try {
-        const data = await apiService.safeRequest("/queue/live/");
+        // With a token the response is scoped to that token's doctor queue
+        const data = await apiService.safeRequest(
+          myTokenNumber ? `/queue/live/?token=${encodeURIComponent(myTokenNumber)}` : "/queue/live/"
+        );
         console.log("Queue:", data);
         setQueue(data);
 